@@ -0,0 +1,2 @@
+ALTER TABLE public.prior_notification_pdf_documents
+    ADD COLUMN content_hash VARCHAR;
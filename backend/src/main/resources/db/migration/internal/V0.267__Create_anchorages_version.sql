@@ -0,0 +1,21 @@
+CREATE TABLE public.anchorages_version (
+    version INTEGER NOT NULL,
+    updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+);
+
+INSERT INTO public.anchorages_version (version, updated_at) VALUES (1, NOW() AT TIME ZONE 'UTC');
+
+CREATE FUNCTION public.increment_anchorages_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE public.anchorages_version
+        SET
+            version = version + 1,
+            updated_at = NOW() AT TIME ZONE 'UTC';
+        RETURN NULL;
+    END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER increment_anchorages_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.anchorages
+    FOR EACH STATEMENT
+    EXECUTE PROCEDURE public.increment_anchorages_version();
@@ -77,9 +77,69 @@ MAX_FLOW_RUN_MINUTES = 50
 FLOW_STATES_TO_CLEAN = ["Running"]
 LOGBOOK_FILES_GID = os.getenv("LOGBOOK_FILES_GID")
 
+# Database connection pools, shared by all flows run in the same process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() in (
+    "true",
+    "t",
+    "yes",
+    "y",
+)
+
+# Reflected database tables are cached for this duration
+TABLE_REFLECTION_CACHE_TTL_SECONDS = int(
+    os.getenv("TABLE_REFLECTION_CACHE_TTL_SECONDS", 3600)
+)
+
 # Location where ERS xml files can be fetched
 ERS_FILES_LOCATION = Path("/opt2/monitorfish-data/ers")
 
+# Logbook messages are parsed in parallel in this many processes, by chunks of
+# LOGBOOK_PARSING_CHUNK_SIZE messages
+LOGBOOK_PARSING_WORKERS = int(
+    os.getenv("LOGBOOK_PARSING_WORKERS", min(os.cpu_count() or 1, 8))
+)
+LOGBOOK_PARSING_CHUNK_SIZE = int(os.getenv("LOGBOOK_PARSING_CHUNK_SIZE", 250))
+
+# Pdf documents are rendered in parallel in this many processes
+PDF_RENDERING_WORKERS = int(
+    os.getenv("PDF_RENDERING_WORKERS", min(os.cpu_count() or 1, 4))
+)
+
+# Emails, sms and faxes are sent through at most this many simultaneous connections
+# to each SMTP server. Connections left idle for longer than
+# SMTP_CONNECTION_MAX_IDLE_SECONDS are closed rather than reused.
+SMTP_POOL_MAX_CONNECTIONS = int(os.getenv("SMTP_POOL_MAX_CONNECTIONS", 4))
+SMTP_CONNECTION_MAX_IDLE_SECONDS = int(
+    os.getenv("SMTP_CONNECTION_MAX_IDLE_SECONDS", 60)
+)
+
+# Messages that fail to be sent because of a connection or server error are sent
+# again on a new connection, up to SMTP_SEND_MAX_ATTEMPTS times, waiting
+# SMTP_RETRY_BACKOFF_SECONDS before the first retry and twice as long before each
+# following retry.
+SMTP_SEND_MAX_ATTEMPTS = int(os.getenv("SMTP_SEND_MAX_ATTEMPTS", 4))
+SMTP_RETRY_BACKOFF_SECONDS = float(os.getenv("SMTP_RETRY_BACKOFF_SECONDS", 1))
+
+# Batches of requests to the backend API are sent with at most this many requests
+# in flight, each of which times out after BACKEND_API_TIMEOUT_SECONDS
+BACKEND_API_MAX_CONCURRENT_REQUESTS = int(
+    os.getenv("BACKEND_API_MAX_CONCURRENT_REQUESTS", 8)
+)
+BACKEND_API_TIMEOUT_SECONDS = float(os.getenv("BACKEND_API_TIMEOUT_SECONDS", 30))
+
+# Logbook zipfiles are read, parsed and loaded by batches of this many messages
+LOGBOOK_LOADING_BATCH_SIZE = int(os.getenv("LOGBOOK_LOADING_BATCH_SIZE", 5000))
+
+# xml library used to parse FLUX messages, "lxml" or "stdlib" (xml.etree). FLUX
+# messages larger than FLUX_STREAMING_THRESHOLD_BYTES are parsed incrementally.
+FLUX_XML_BACKEND = os.getenv("FLUX_XML_BACKEND", "lxml")
+FLUX_STREAMING_THRESHOLD_BYTES = int(
+    os.getenv("FLUX_STREAMING_THRESHOLD_BYTES", 10000000)
+)
+
 # Proxies for pipeline flows requiring Internet access
 PROXIES = {
     "http": os.environ.get("HTTP_PROXY_"),
@@ -111,9 +171,16 @@ FAO_AREAS_URL = (
 
 # Anchorages config
 ANCHORAGES_H3_CELL_RESOLUTION = 9
+# Positions located in fewer h3 cells than this are tested against anchorages with a
+# database query rather than by loading the h3 cells of all anchorages in memory
+ANCHORAGES_INDEX_MIN_H3_CELLS = 10000
 
 # Last_positions configuration
 CURRENT_POSITION_ESTIMATION_MAX_HOURS = 2.0
+# Ids are assigned to positions at insertion but become visible at commit, so
+# positions with ids below the high-water mark of incremental runs may still appear.
+# This many ids below the mark are scanned again in each incremental run.
+LAST_POSITIONS_INCREMENTAL_ID_OVERLAP = 10000
 
 # Fishing detection configuration
 MIN_FISHING_SPEED_THRESHOLD = 0.025
@@ -1,4 +1,7 @@
 import os
+import threading
+from collections import Counter
+from typing import Hashable
 
 import sqlalchemy as sa
 
@@ -86,18 +89,162 @@ def make_connection_string(db: str) -> str:
     return f"{CLIENT}://{USER}:{PWD}@{HOST}:{PORT}/{SID}"
 
 
+def _freeze(value) -> Hashable:
+    """Converts dicts, lists and sets to hashable equivalents, recursively."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    elif isinstance(value, set):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+class EngineRegistry:
+    """Process-wide registry of sqlalchemy engines.
+
+    Engines are created on the first request for a given database and set of engine
+    arguments, and are then reused, along with their connection pool, for the lifetime
+    of the process : tasks and flows run in the same process share warm connections
+    instead of opening new ones.
+
+    Engines requested with `execution_options` share the connection pool of the
+    engine of the same database created without `execution_options`.
+
+    Pools are configured by `DB_POOL_SIZE`, `DB_POOL_MAX_OVERFLOW`,
+    `DB_POOL_RECYCLE_SECONDS` and `DB_POOL_PRE_PING` (see `config`), unless other
+    values are passed as engine arguments.
+
+    The registry is thread-safe and can be used by the tasks of flows run with
+    `LocalDaskExecutor`. Pools are reset in child processes after a fork, as
+    connections cannot be shared between processes.
+    """
+
+    def __init__(self):
+        self._engines = {}
+        self._metrics = {}
+        self._dbs = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: str, **kwargs) -> sa.engine.Engine:
+        """Returns the engine for designated database, creating it if needed.
+
+        Args:
+            db (str): Database name. Possible values :
+                'ocan', 'fmc', 'monitorfish_remote', 'monistorfish_local',
+                'cacem_local'
+            kwargs: passed to `sqlalchemy.create_engine`
+
+        Returns:
+            sa.engine.Engine: sqlalchemy engine for selected database.
+        """
+        import config
+
+        connection_string = make_connection_string(db)
+        execution_options = kwargs.pop("execution_options", None)
+        engine_kwargs = {
+            "pool_size": config.DB_POOL_SIZE,
+            "max_overflow": config.DB_POOL_MAX_OVERFLOW,
+            "pool_recycle": config.DB_POOL_RECYCLE_SECONDS,
+            "pool_pre_ping": config.DB_POOL_PRE_PING,
+            **kwargs,
+        }
+
+        key = (connection_string, _freeze(engine_kwargs))
+
+        with self._lock:
+            if key not in self._engines:
+                engine = sa.create_engine(connection_string, **engine_kwargs)
+                self._metrics[key] = self._track_pool(engine)
+                self._dbs[key] = db
+                self._engines[key] = engine
+            engine = self._engines[key]
+
+        if execution_options:
+            engine = engine.execution_options(**execution_options)
+
+        return engine
+
+    @staticmethod
+    def _track_pool(engine: sa.engine.Engine) -> Counter:
+        metrics = Counter()
+        lock = threading.Lock()
+
+        def count(event_name):
+            def listener(*args):
+                with lock:
+                    metrics[event_name] += 1
+
+            return listener
+
+        sa.event.listen(engine, "connect", count("connections_created"))
+        sa.event.listen(engine, "checkout", count("checkouts"))
+        sa.event.listen(engine, "checkin", count("checkins"))
+        sa.event.listen(engine, "invalidate", count("invalidations"))
+        return metrics
+
+    def pool_metrics(self) -> list:
+        """Returns, for each engine of the registry, a dict with its database name, the
+        number of connections created, checked out, checked in and invalidated since
+        the engine was created, and the current state of its pool.
+
+        Returns:
+            list: list of dicts, one per engine
+        """
+        with self._lock:
+            items = [
+                (self._dbs[key], engine, self._metrics[key])
+                for key, engine in self._engines.items()
+            ]
+
+        return [
+            {
+                "db": db,
+                "connections_created": metrics["connections_created"],
+                "checkouts": metrics["checkouts"],
+                "checkins": metrics["checkins"],
+                "invalidations": metrics["invalidations"],
+                "pool_status": engine.pool.status(),
+            }
+            for db, engine, metrics in items
+        ]
+
+    def dispose(self, close: bool = True):
+        """Disposes of all engines' connection pools and empties the registry.
+
+        Args:
+            close (bool): if `False`, connections are dereferenced without being
+              closed, which must be done in child processes that inherited the pools
+              of their parent. Defaults to True.
+        """
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose(close=close)
+            self._engines = {}
+            self._metrics = {}
+            self._dbs = {}
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self.dispose(close=False)
+
+
+engines = EngineRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=engines._reset_after_fork)
+
+
 def create_engine(db: str, **kwargs) -> sa.engine.Engine:
-    """Returns sqlalchemy engine for designated database.
+    """Returns sqlalchemy engine for designated database. Engines are shared by all
+    callers in the process, see `EngineRegistry`.
 
     Args:
         db (str): Database name. Possible values :
             'ocan', 'fmc', 'monitorfish_remote', 'monistorfish_local', 'cacem_local'
+        kwargs: passed to `sqlalchemy.create_engine`
 
     Returns:
         sa.engine.Engine: sqlalchemy engine for selected database.
     """
-    connection_string = make_connection_string(db)
-
-    engine = sa.create_engine(connection_string, **kwargs)
-
-    return engine
+    return engines.get(db, **kwargs)
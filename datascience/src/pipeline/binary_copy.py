@@ -0,0 +1,477 @@
+"""
+Serialization of DataFrames to the binary format of Postgresql's `COPY` command.
+
+Each column is encoded in a single vectorized pass according to the type of the
+table column it is loaded into, as reflected by sqlalchemy. Fixed-width values
+(integers, floats, booleans, timestamps, dates, intervals) are written directly
+from numpy buffers in network byte order, without any conversion to strings.
+Variable-width values (text, enums, JSON, arrays, bytea) are encoded to bytes once
+per cell and copied into the output buffer in bulk.
+
+See https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.4 for a
+description of the format.
+"""
+
+import struct
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterable, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import types
+from sqlalchemy.dialects import postgresql
+
+from src.pipeline.processing import to_json
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+
+# Postgresql timestamps and dates are counted from 2000-01-01
+POSTGRES_EPOCH_US = int(
+    (datetime(2000, 1, 1) - datetime(1970, 1, 1)).total_seconds() * 1_000_000
+)
+POSTGRES_EPOCH_DAYS = 10957
+MICROSECONDS_PER_DAY = 86_400_000_000
+
+# Oids of the element types supported in arrays
+TEXT_OID = 25
+VARCHAR_OID = 1043
+BPCHAR_OID = 1042
+BOOL_OID = 16
+INT2_OID = 21
+INT4_OID = 23
+INT8_OID = 20
+FLOAT4_OID = 700
+FLOAT8_OID = 701
+
+
+@dataclass
+class ColumnEncoding:
+    """
+    Binary encoding of a column.
+
+    Args:
+        payload (np.ndarray): 1d `uint8` array, concatenation of the binary
+          representations of the non null values of the column
+        lengths (np.ndarray): 1d `int64` array, size in bytes of the value of each row,
+          -1 for null values
+    """
+
+    payload: np.ndarray
+    lengths: np.ndarray
+
+
+def encode_fixed_width(
+    values: np.ndarray, nulls: np.ndarray, dtype: str
+) -> ColumnEncoding:
+    """
+    Encodes numeric values to a fixed-width big-endian binary representation.
+
+    Args:
+        values (np.ndarray): values to encode. Values at null positions are ignored
+          and may be anything castable to `dtype`.
+        nulls (np.ndarray): boolean array, `True` for null values
+        dtype (str): numpy dtype of the binary representation, like '>i4' or '>f8'
+
+    Returns:
+        ColumnEncoding
+    """
+    dtype = np.dtype(dtype)
+    payload = np.ascontiguousarray(values[~nulls], dtype=dtype).view(np.uint8)
+    lengths = np.where(nulls, -1, dtype.itemsize).astype(np.int64)
+    return ColumnEncoding(payload=payload, lengths=lengths)
+
+
+def encode_bytes(cells: List[Union[bytes, None]]) -> ColumnEncoding:
+    """
+    Encodes a list of `bytes` objects, `None` representing null values.
+
+    Args:
+        cells (List[Union[bytes, None]]): binary representation of each value
+
+    Returns:
+        ColumnEncoding
+    """
+    lengths = np.fromiter(
+        (-1 if c is None else len(c) for c in cells),
+        dtype=np.int64,
+        count=len(cells),
+    )
+    payload = np.frombuffer(b"".join(c for c in cells if c is not None), dtype=np.uint8)
+    return ColumnEncoding(payload=payload, lengths=lengths)
+
+
+def encode_integers(s: pd.Series, dtype: str) -> ColumnEncoding:
+    """
+    Encodes a Series of integers to `smallint`, `integer` or `bigint`. The Series
+    may be of float dtype (if it contains `NaN` values) or of nullable `Int` dtype,
+    in which case non integer values are truncated.
+    """
+    nulls = s.isna().to_numpy()
+    values = np.zeros(len(s), dtype=np.int64)
+    values[~nulls] = s[~nulls].to_numpy().astype(np.int64)
+    return encode_fixed_width(values, nulls, dtype)
+
+
+def encode_floats(s: pd.Series, dtype: str) -> ColumnEncoding:
+    """Encodes a Series of numbers to `real` or `double precision`."""
+    nulls = s.isna().to_numpy()
+    values = s.to_numpy(dtype=np.float64, na_value=np.nan)
+    return encode_fixed_width(values, nulls, dtype)
+
+
+def encode_booleans(s: pd.Series) -> ColumnEncoding:
+    """Encodes a Series of booleans, possibly with null values, to `boolean`."""
+    nulls = s.isna().to_numpy()
+    values = np.zeros(len(s), dtype=bool)
+    values[~nulls] = s[~nulls].to_numpy().astype(bool)
+    return encode_fixed_width(values, nulls, "u1")
+
+
+def encode_timestamps(s: pd.Series, timezone: bool) -> ColumnEncoding:
+    """
+    Encodes a Series of datetimes to `timestamp` or `timestamptz`.
+
+    Timezone-aware datetimes loaded into `timestamp` columns keep their local time,
+    as Postgresql silently ignores the offset of timestamps in text format.
+    Timezone-naive datetimes loaded into `timestamptz` columns are considered UTC.
+    """
+    s = pd.to_datetime(s)
+    if s.dt.tz is not None:
+        if timezone:
+            s = s.dt.tz_convert("UTC")
+        s = s.dt.tz_localize(None)
+    nulls = s.isna().to_numpy()
+    values = s.to_numpy(dtype="datetime64[us]").view(np.int64) - POSTGRES_EPOCH_US
+    return encode_fixed_width(values, nulls, ">i8")
+
+
+def encode_dates(s: pd.Series) -> ColumnEncoding:
+    """Encodes a Series of dates or datetimes to `date`."""
+    s = pd.to_datetime(s)
+    if s.dt.tz is not None:
+        s = s.dt.tz_localize(None)
+    nulls = s.isna().to_numpy()
+    values = s.to_numpy(dtype="datetime64[D]").view(np.int64) - POSTGRES_EPOCH_DAYS
+    return encode_fixed_width(values, nulls, ">i4")
+
+
+def encode_intervals(s: pd.Series) -> ColumnEncoding:
+    """
+    Encodes a Series of timedeltas to `interval`, as a number of days and a time,
+    like Postgresql does with the text representation of timedeltas.
+    """
+    s = pd.to_timedelta(s)
+    nulls = s.isna().to_numpy()
+    microseconds = s.to_numpy(dtype="timedelta64[us]").view(np.int64)
+    days, time = np.divmod(microseconds, MICROSECONDS_PER_DAY)
+
+    values = np.zeros(
+        len(s), dtype=np.dtype([("time", ">i8"), ("days", ">i4"), ("months", ">i4")])
+    )
+    values["time"] = time
+    values["days"] = days
+    return encode_fixed_width(values, nulls, values.dtype)
+
+
+def encode_texts(s: pd.Series) -> ColumnEncoding:
+    """Encodes a Series of strings (or of objects, which are cast to `str`) to
+    `text`, `varchar` or enums."""
+    nulls = s.isna().to_numpy()
+    return encode_bytes(
+        [
+            None if is_null else str(x).encode("utf-8")
+            for x, is_null in zip(s.to_numpy(dtype=object), nulls)
+        ]
+    )
+
+
+def encode_bytea(s: pd.Series) -> ColumnEncoding:
+    """Encodes a Series of `bytes` to `bytea`."""
+    nulls = s.isna().to_numpy()
+    return encode_bytes(
+        [
+            None if is_null else bytes(x)
+            for x, is_null in zip(s.to_numpy(dtype=object), nulls)
+        ]
+    )
+
+
+def encode_json(s: pd.Series, jsonb: bool, serialize: bool) -> ColumnEncoding:
+    """
+    Encodes a Series to `json` or `jsonb`.
+
+    Args:
+        s (pd.Series): values to encode
+        jsonb (bool): if `True`, encodes values to `jsonb`, else to `json`
+        serialize (bool): if `True`, values are python objects serialized with
+          `to_json` and null values are loaded as json `null`, like in
+          `prepare_df_for_loading`. If `False`, values must be json strings and
+          null values are loaded as SQL `NULL`.
+
+    Returns:
+        ColumnEncoding
+    """
+    prefix = b"\x01" if jsonb else b""
+    nulls = s.isna().to_numpy()
+    if serialize:
+        cells = [
+            prefix + (b"null" if is_null else to_json(x).encode("utf-8"))
+            for x, is_null in zip(s.to_numpy(dtype=object), nulls)
+        ]
+    else:
+        cells = [
+            None if is_null else prefix + x.encode("utf-8")
+            for x, is_null in zip(s.to_numpy(dtype=object), nulls)
+        ]
+    return encode_bytes(cells)
+
+
+def _text_array_to_bytes(x: Iterable, element_oid: int) -> bytes:
+    elements = [e.encode("utf-8") for e in map(str.strip, map(str, x)) if e]
+    if not elements:
+        return struct.pack(">iii", 0, 0, element_oid)
+    return struct.pack(">iiiii", 1, 0, element_oid, len(elements), 1) + b"".join(
+        [len(e).to_bytes(4, "big") + e for e in elements]
+    )
+
+
+def _fixed_width_array_to_bytes(x: Iterable, element_oid: int, dtype: str) -> bytes:
+    dtype = np.dtype(dtype)
+    values = np.asarray(list(x))
+    if len(values) == 0:
+        return struct.pack(">iii", 0, 0, element_oid)
+    elements = np.empty(len(values), dtype=[("length", ">i4"), ("value", dtype)])
+    elements["length"] = dtype.itemsize
+    elements["value"] = values
+    return struct.pack(">iiiii", 1, 0, element_oid, len(values), 1) + elements.tobytes()
+
+
+def encode_arrays(
+    s: pd.Series,
+    element_to_bytes: Callable[[Iterable], bytes],
+    empty_array: bytes,
+    handle_errors: bool = True,
+    value_on_error: Union[str, None] = "{}",
+) -> ColumnEncoding:
+    """
+    Encodes a Series of list-likes to a one-dimensional array type. Null values are
+    loaded as empty arrays, like in `prepare_df_for_loading`.
+
+    Args:
+        s (pd.Series): values to encode
+        element_to_bytes (Callable[[Iterable], bytes]): function that returns the
+          binary representation of a list-like
+        empty_array (bytes): binary representation of an empty array of the right
+          type
+        handle_errors (bool): if `True`, values that are not `list`, `set` or
+          `numpy.ndarray` are loaded as empty arrays. If `False`, such values
+          raise `ValueError`. Defaults to `True`.
+        value_on_error (Union[str, None]): `'{}'` or `None`. Both load an empty
+          array, as `df_values_to_psql_arrays` replaces null results with `'{}'`.
+          Defaults to `'{}'`.
+
+    Returns:
+        ColumnEncoding
+    """
+    if value_on_error not in ("{}", None):
+        raise ValueError(
+            "Binary copy only supports '{}' and None as value_on_error, "
+            f"got {value_on_error}."
+        )
+
+    cells = []
+    for x in s.to_numpy(dtype=object):
+        if isinstance(x, (list, set, np.ndarray)):
+            cells.append(element_to_bytes(x))
+        elif pd.api.types.is_scalar(x) and pd.isna(x):
+            cells.append(empty_array)
+        elif handle_errors:
+            cells.append(empty_array)
+        else:
+            raise ValueError(f"Unexpected type for x: {type(x)}.")
+    return encode_bytes(cells)
+
+
+_ARRAY_ELEMENT_TYPES = (
+    (types.Boolean, BOOL_OID, "u1"),
+    (types.SmallInteger, INT2_OID, ">i2"),
+    (types.BigInteger, INT8_OID, ">i8"),
+    (types.Integer, INT4_OID, ">i4"),
+    (types.REAL, FLOAT4_OID, ">f4"),
+    (types.Float, FLOAT8_OID, ">f8"),
+    (types.CHAR, BPCHAR_OID, None),
+    (types.Enum, None, None),
+    (types.VARCHAR, VARCHAR_OID, None),
+    (types.String, TEXT_OID, None),
+)
+
+
+def _get_array_element_encoder(
+    item_type: types.TypeEngine,
+) -> Tuple[Callable[[Iterable], bytes], int]:
+    for element_type, element_oid, dtype in _ARRAY_ELEMENT_TYPES:
+        if isinstance(item_type, element_type):
+            if element_oid is None:
+                break
+            elif dtype is None:
+                return (
+                    lambda x: _text_array_to_bytes(x, element_oid=element_oid),
+                    element_oid,
+                )
+            else:
+                return (
+                    lambda x: _fixed_width_array_to_bytes(
+                        x, element_oid=element_oid, dtype=dtype
+                    ),
+                    element_oid,
+                )
+    raise ValueError(f"Binary copy of arrays of {item_type} is not supported.")
+
+
+def encode_column(
+    s: pd.Series,
+    column_type: types.TypeEngine,
+    jsonb_columns: Union[List[str], None] = None,
+    handle_array_conversion_errors: bool = True,
+    value_on_array_conversion_error: Union[str, None] = "{}",
+) -> ColumnEncoding:
+    """
+    Encodes a Series in the binary format of the Postgresql type `column_type`.
+
+    Args:
+        s (pd.Series): values to encode
+        column_type (types.TypeEngine): sqlalchemy type of the table column to load
+          the values into, as returned by table reflection
+        jsonb_columns (List[str], optional): names of the `json` or `jsonb` columns
+          that contain python objects to serialize. Other `json` or `jsonb` columns
+          must contain json strings.
+        handle_array_conversion_errors (bool): see `encode_arrays`
+        value_on_array_conversion_error (Union[str, None]): see `encode_arrays`
+
+    Returns:
+        ColumnEncoding
+
+    Raises:
+        ValueError: if the type of the column is not supported.
+    """
+    if isinstance(column_type, types.ARRAY):
+        element_to_bytes, element_oid = _get_array_element_encoder(
+            column_type.item_type
+        )
+        return encode_arrays(
+            s,
+            element_to_bytes=element_to_bytes,
+            empty_array=struct.pack(">iii", 0, 0, element_oid),
+            handle_errors=handle_array_conversion_errors,
+            value_on_error=value_on_array_conversion_error,
+        )
+    elif isinstance(column_type, types.JSON):
+        return encode_json(
+            s,
+            jsonb=isinstance(column_type, postgresql.JSONB),
+            serialize=s.name in (jsonb_columns or []),
+        )
+    elif isinstance(column_type, types.Boolean):
+        return encode_booleans(s)
+    elif isinstance(column_type, types.SmallInteger):
+        return encode_integers(s, ">i2")
+    elif isinstance(column_type, types.BigInteger):
+        return encode_integers(s, ">i8")
+    elif isinstance(column_type, types.Integer):
+        return encode_integers(s, ">i4")
+    elif isinstance(column_type, types.REAL):
+        return encode_floats(s, ">f4")
+    elif isinstance(column_type, types.Float):
+        return encode_floats(s, ">f8")
+    elif isinstance(column_type, types.DateTime):
+        return encode_timestamps(s, timezone=bool(column_type.timezone))
+    elif isinstance(column_type, types.Date):
+        return encode_dates(s)
+    elif isinstance(column_type, (postgresql.INTERVAL, types.Interval)):
+        return encode_intervals(s)
+    elif isinstance(column_type, types.LargeBinary):
+        return encode_bytea(s)
+    elif isinstance(column_type, types.String):
+        return encode_texts(s)
+    else:
+        raise ValueError(
+            f"Binary copy of column {s.name} of type {column_type} is not supported."
+        )
+
+
+def df_to_pgcopy_binary(
+    df: pd.DataFrame,
+    table: sqlalchemy.Table,
+    jsonb_columns: Union[List[str], None] = None,
+    handle_array_conversion_errors: bool = True,
+    value_on_array_conversion_error: Union[str, None] = "{}",
+) -> bytes:
+    """
+    Serializes a DataFrame to the binary format of Postgresql's `COPY` command,
+    encoding each column according to the type of the column of the same name in
+    `table`.
+
+    Args:
+        df (pd.DataFrame): data to serialize
+        table (sqlalchemy.Table): reflected table the data is to be loaded into.
+          All columns of `df` must exist in `table`.
+        jsonb_columns (List[str], optional): see `encode_column`
+        handle_array_conversion_errors (bool): see `encode_arrays`
+        value_on_array_conversion_error (Union[str, None]): see `encode_arrays`
+
+    Returns:
+        bytes: data to pass to `COPY table (columns) FROM STDIN WITH BINARY`, columns
+        being in the order of the DataFrame's columns.
+    """
+    n_rows, n_columns = df.shape
+
+    encodings = []
+    for column in df.columns:
+        try:
+            column_type = table.c[column].type
+        except KeyError:
+            raise ValueError(f"Column {column} not found in table {table.name}.")
+
+        encodings.append(
+            encode_column(
+                df[column],
+                column_type,
+                jsonb_columns=jsonb_columns,
+                handle_array_conversion_errors=handle_array_conversion_errors,
+                value_on_array_conversion_error=value_on_array_conversion_error,
+            )
+        )
+
+    # Each row is made of a 2-byte field count, followed by each field's 4-byte length
+    # and value
+    field_sizes = [4 + np.maximum(e.lengths, 0) for e in encodings]
+    row_sizes = 2 + sum(field_sizes, np.zeros(n_rows, dtype=np.int64))
+    row_starts = len(PGCOPY_HEADER) + np.cumsum(row_sizes) - row_sizes
+    total_size = len(PGCOPY_HEADER) + int(row_sizes.sum()) + len(PGCOPY_TRAILER)
+
+    buffer = np.empty(total_size, dtype=np.uint8)
+    buffer[: len(PGCOPY_HEADER)] = np.frombuffer(PGCOPY_HEADER, dtype=np.uint8)
+    buffer[-len(PGCOPY_TRAILER) :] = np.frombuffer(PGCOPY_TRAILER, dtype=np.uint8)
+    buffer[row_starts[:, None] + np.arange(2)] = np.frombuffer(
+        struct.pack(">h", n_columns), dtype=np.uint8
+    )
+
+    field_starts = row_starts + 2
+    for encoding, sizes in zip(encodings, field_sizes):
+        buffer[field_starts[:, None] + np.arange(4)] = (
+            encoding.lengths.astype(">i4").view(np.uint8).reshape(n_rows, 4)
+        )
+
+        value_sizes = sizes - 4
+        value_starts = np.cumsum(value_sizes) - value_sizes
+        buffer[
+            np.repeat(field_starts + 4 - value_starts, value_sizes)
+            + np.arange(len(encoding.payload))
+        ] = encoding.payload
+
+        field_starts = field_starts + sizes
+
+    return buffer.tobytes()
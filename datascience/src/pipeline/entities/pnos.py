@@ -207,6 +207,7 @@ class RenderedPno:
     source: PnoSource
     html_for_pdf: Optional[str] = None
     pdf_document: Optional[bytes] = None
+    pdf_document_content_hash: Optional[str] = None
     generation_datetime_utc: Optional[datetime] = None
     html_email_body: Optional[str] = None
     sms_content: Optional[str] = None
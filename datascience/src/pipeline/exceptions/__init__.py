@@ -1 +1,2 @@
+from .backend_api_error import BackendApiError
 from .monitorfish_health_error import MonitorfishHealthError
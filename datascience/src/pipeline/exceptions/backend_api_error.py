@@ -0,0 +1,4 @@
+class BackendApiError(Exception):
+    """
+    Exception raised when requests to the Monitorfish backend API fail.
+    """
@@ -221,7 +221,8 @@ def load_current_segments(vessels_segments):  # pragma: no cover
         schema="public",
         db_name="monitorfish_remote",
         logger=logger,
-        how="replace",
+        how="diff",
+        key_columns=["cfr"],
         pg_array_columns=["segments"],
         handle_array_conversion_errors=True,
         value_on_array_conversion_error="{}",
@@ -1,4 +1,5 @@
 import dataclasses
+import hashlib
 from datetime import datetime
 from email.policy import EmailPolicy
 from itertools import chain
@@ -12,7 +13,6 @@ import prefect.engine
 import prefect.engine.signals
 import prefect.exceptions
 import requests
-import weasyprint
 from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
 from prefect import Flow, Parameter, case, flatten, task, unmapped
 from prefect.executors import LocalDaskExecutor
@@ -53,9 +53,13 @@ from src.pipeline.helpers.emails import (
     CommunicationMeans,
     create_html_email,
     create_sms_email,
-    resize_pdf_to_A4,
     send_email_or_sms_or_fax_message,
 )
+from src.pipeline.helpers.pdf_rendering import (
+    get_rendering_workers,
+    render_pdf_in_pool,
+    shutdown_rendering_pool,
+)
 from src.pipeline.processing import remove_nones_from_list
 from src.pipeline.shared_tasks.control_flow import (
     check_flow_not_running,
@@ -64,6 +68,29 @@ from src.pipeline.shared_tasks.control_flow import (
 from src.pipeline.shared_tasks.dates import get_utcnow, make_timedelta
 from src.pipeline.shared_tasks.infrastructure import execute_statement
 
+# Prior notifications are laid out on pages of 15.75cm x 22.275cm (see
+# prior_notifications.css), which this zoom factor scales to A4 pages
+PNO_PDF_ZOOM = 21 / 15.75
+
+
+def get_pdf_content_hash(html_for_pdf: str) -> str:
+    """
+    Returns a hash of the content of a PNO pdf document. PNO pdf documents are
+    rendered from `html_for_pdf`, which captures both the content of the PNO and the
+    version of the template used to render it, so that two documents with the same
+    hash are identical.
+
+    Args:
+        html_for_pdf (str): html from which the pdf document is rendered
+
+    Returns:
+        str: hex digest of the hash
+    """
+    h = hashlib.sha256()
+    h.update(f"zoom={PNO_PDF_ZOOM};".encode())
+    h.update(html_for_pdf.encode())
+    return h.hexdigest()
+
 
 @task(checkpoint=False)
 def extract_species_names() -> dict:
@@ -110,6 +137,39 @@ def extract_pnos_to_generate(
     return (pnos, generation_needed)
 
 
+@task(checkpoint=False)
+def extract_previous_pdf_documents(pnos: pd.DataFrame) -> dict:
+    """
+    Extracts the pdf documents previously generated for the input PNOs, if any, so
+    that documents whose content did not change can be reused instead of being
+    rendered again.
+
+    Args:
+        pnos (pd.DataFrame): PNOs to generate, with a `report_id` column
+
+    Returns:
+        dict: `dict` with report_id as key and (content_hash, pdf_document) as value
+    """
+    logger = prefect.context.get("logger")
+
+    previous_pdf_documents = extract(
+        db_name="monitorfish_remote",
+        query_filepath="monitorfish/prior_notification_pdf_documents.sql",
+        params={"report_ids": tuple(pnos.report_id)},
+    )
+    logger.info(
+        f"Extracted {len(previous_pdf_documents)} previously generated PNO pdf "
+        "documents."
+    )
+
+    return {
+        report_id: (content_hash, bytes(pdf_document))
+        for report_id, content_hash, pdf_document in previous_pdf_documents[
+            ["report_id", "content_hash", "pdf_document"]
+        ].itertuples(index=False)
+    }
+
+
 @task(checkpoint=False)
 def extract_pno_units_targeting_vessels() -> pd.DataFrame:
     return extract(
@@ -175,6 +235,26 @@ def to_pnos_to_render(pnos: pd.DataFrame) -> List[PnoToRender]:
     return [PnoToRender(**record) for record in records]
 
 
+@task(checkpoint=False)
+def get_pdf_rendering_workers(pnos: List[PnoToRender]) -> int:
+    """
+    Returns the number of processes in which to render the pdf documents of `pnos`.
+    See `get_rendering_workers`.
+    """
+    return get_rendering_workers(len(pnos))
+
+
+@task(
+    checkpoint=False, skip_on_upstream_skip=False, trigger=prefect.triggers.all_finished
+)
+def shutdown_pdf_rendering_pool(rendered_pnos: List[RenderedPno]):
+    """
+    Shuts down the pool of pdf rendering processes, if it was started, once all PNOs
+    are rendered. The pool only lasts for one flow run.
+    """
+    shutdown_rendering_pool()
+
+
 @task(checkpoint=False)
 def pre_render_pno(
     pno: PnoToRender, species_names: dict, fishing_gear_names: dict
@@ -390,7 +470,30 @@ def render_pno(
     html_for_pdf_template: Template,
     email_body_template: Template,
     sms_template: Template,
+    previous_pdf_documents: dict = None,
+    pdf_rendering_workers: int = None,
 ) -> RenderedPno:
+    """
+    Renders the pdf document, email body and sms of a PNO.
+
+    The pdf document previously generated for the PNO, if given in
+    `previous_pdf_documents`, is reused when its content hash is that of the html
+    to render, rather than being rendered again.
+
+    Args:
+        pno (PreRenderedPno): PNO to render
+        html_for_pdf_template (Template): template of the pdf document
+        email_body_template (Template): template of the email body
+        sms_template (Template): template of the sms
+        previous_pdf_documents (dict, optional): `dict` with report_id as key and
+          (content_hash, pdf_document) as value. Defaults to None.
+        pdf_rendering_workers (int, optional): number of processes in which pdf
+          documents are rendered, see `render_pdf_in_pool`. Defaults to None.
+
+    Returns:
+        RenderedPno
+    """
+    logger = prefect.context.get("logger")
     fonts_directory = EMAIL_FONTS_LOCATION.as_uri()
 
     state_flag_icon_src = (
@@ -517,10 +620,18 @@ def render_pno(
         note=pno.note,
     )
 
-    pdf = weasyprint.HTML(string=html_for_pdf).write_pdf(
-        optimize_size=("fonts", "images")
+    content_hash = get_pdf_content_hash(html_for_pdf)
+    previous_content_hash, previous_pdf = (previous_pdf_documents or {}).get(
+        pno.report_id, (None, None)
     )
-    pdf = resize_pdf_to_A4(pdf)
+
+    if previous_content_hash == content_hash:
+        logger.info(f"Reusing unchanged pdf document of PNO {pno.report_id}.")
+        pdf = previous_pdf
+    else:
+        pdf = render_pdf_in_pool(
+            html_for_pdf, zoom=PNO_PDF_ZOOM, n_workers=pdf_rendering_workers
+        )
 
     return RenderedPno(
         report_id=pno.report_id,
@@ -534,6 +645,7 @@ def render_pno(
         source=pno.source,
         html_for_pdf=html_for_pdf,
         pdf_document=pdf,
+        pdf_document_content_hash=content_hash,
         generation_datetime_utc=datetime.utcnow(),
         html_email_body=html_email_body,
         sms_content=sms_content,
@@ -558,8 +670,14 @@ def load_pno_pdf_documents(
     logger = prefect.context.get("logger")
 
     df = pd.DataFrame(pno_pdf_documents)[
-        ["report_id", "source", "generation_datetime_utc", "pdf_document"]
-    ]
+        [
+            "report_id",
+            "source",
+            "generation_datetime_utc",
+            "pdf_document",
+            "pdf_document_content_hash",
+        ]
+    ].rename(columns={"pdf_document_content_hash": "content_hash"})
 
     logger.info(f"Loading {len(df)} generated PNO pdf documents.")
 
@@ -1026,6 +1144,7 @@ with Flow("Distribute pnos", executor=LocalDaskExecutor()) as flow:
             html_for_pdf_template = get_html_for_pdf_template()
             email_body_template = get_email_body_template()
             sms_template = get_sms_template()
+            previous_pdf_documents = extract_previous_pdf_documents(pnos_to_generate)
             units_targeting_vessels = extract_pno_units_targeting_vessels()
             units_ports_and_segments_subscriptions = (
                 extract_pno_units_ports_and_segments_subscriptions()
@@ -1033,6 +1152,7 @@ with Flow("Distribute pnos", executor=LocalDaskExecutor()) as flow:
 
             # Render pdf documents
             pnos_to_render = to_pnos_to_render(pnos_to_generate)
+            pdf_rendering_workers = get_pdf_rendering_workers(pnos_to_render)
             pre_rendered_pnos = pre_render_pno.map(
                 pnos_to_render,
                 species_names=unmapped(species_names),
@@ -1043,7 +1163,10 @@ with Flow("Distribute pnos", executor=LocalDaskExecutor()) as flow:
                 html_for_pdf_template=unmapped(html_for_pdf_template),
                 email_body_template=unmapped(email_body_template),
                 sms_template=unmapped(sms_template),
+                previous_pdf_documents=unmapped(previous_pdf_documents),
+                pdf_rendering_workers=unmapped(pdf_rendering_workers),
             )
+            shutdown_pdf_rendering_pool(rendered_pnos)
 
             # Load pdf documents
             pnos_to_distribute, distribution_needed = load_pno_pdf_documents(
@@ -5,21 +5,18 @@ import numpy as np
 import pandas as pd
 import prefect
 from prefect import Flow, Parameter, case, task, unmapped
-from sqlalchemy import text
+from sqlalchemy import REAL, Boolean, Column, Integer, MetaData, Table, text
+from sqlalchemy.dialects.postgresql import INTERVAL
 
 from src.db_config import create_engine
 from src.pipeline.generic_tasks import extract
 from src.pipeline.helpers.dates import Period
-from src.pipeline.helpers.spatial import enrich_positions
-from src.pipeline.processing import (
-    left_isin_right_by_decreasing_priority,
-    prepare_df_for_loading,
-    zeros_ones_to_bools,
-)
+from src.pipeline.helpers.spatial import enrich_positions_by_group
+from src.pipeline.processing import left_isin_right_by_decreasing_priority
 from src.pipeline.shared_tasks.control_flow import check_flow_not_running
 from src.pipeline.shared_tasks.dates import make_periods
 from src.pipeline.shared_tasks.positions import tag_positions_at_port
-from src.pipeline.utils import psql_insert_copy
+from src.pipeline.utils import psql_insert_copy_binary
 
 
 def extract_positions(period: Period) -> pd.DataFrame:
@@ -86,7 +83,8 @@ def enrich_positions_by_vessel(
     minimum_minutes_of_emission_at_sea: int,
 ) -> pd.DataFrame:
     """
-    Applies `enrich_positions` to each vessel's positions.
+    Applies `enrich_positions` to each vessel's positions. All vessels are processed
+    at once by `enrich_positions_by_group`.
 
     Args:
         positions (pd.DataFrame): input positions. Must have columns:
@@ -114,30 +112,15 @@ def enrich_positions_by_vessel(
         minimum_minutes_of_emission_at_sea, "m"
     )
 
-    if len(positions) == 0:
-        # With an empty DataFrame, the `groupby` has nothing to group on and therefore
-        # `enrich_positions` does not get applied at all, which causes the result to
-        # be equal to the input and therefore some columns are missing.
-        # In this case, applying `enrich_positions` without any groupby just adds the
-        # desired columns and solves the problem.
-        res = enrich_positions(
-            positions, minimum_time_of_emission_at_sea=minimum_time_of_emission_at_sea
-        )
-    else:
-        res = positions.groupby(
-            ["cfr", "ircs", "external_immatriculation"], dropna=False, group_keys=False
-        ).apply(
-            enrich_positions,
-            minimum_time_of_emission_at_sea=minimum_time_of_emission_at_sea,
-            minimum_consecutive_positions=minimum_consecutive_positions,
-            min_fishing_speed_threshold=min_fishing_speed_threshold,
-            max_fishing_speed_threshold=max_fishing_speed_threshold,
-            return_floats=True,
-        )
-        # It is much faster to apply zeros_ones_to_bool once after processing all
-        # vessels' positions than to apply it inside the enrich_position function
-        # for each vessel individually
-        res["is_fishing"] = zeros_ones_to_bools(res["is_fishing"])
+    res = enrich_positions_by_group(
+        positions,
+        minimum_time_of_emission_at_sea=minimum_time_of_emission_at_sea,
+        by=["cfr", "ircs", "external_immatriculation"],
+        minimum_consecutive_positions=minimum_consecutive_positions,
+        min_fishing_speed_threshold=min_fishing_speed_threshold,
+        max_fishing_speed_threshold=max_fishing_speed_threshold,
+    )
+
     return res
 
 
@@ -165,26 +148,20 @@ def load_fishing_activity(positions: pd.DataFrame, period: Period, logger: Logge
 
     with e.begin() as connection:
         logger.info("Creating temporary table")
-        connection.execute(
-            text(
-                "CREATE TEMP TABLE tmp_enriched_positions("
-                "    id INTEGER PRIMARY KEY,"
-                "    is_at_port BOOLEAN,"
-                "    meters_from_previous_position REAL,"
-                "    time_since_previous_position INTERVAL,"
-                "    average_speed REAL,"
-                "    is_fishing BOOLEAN,"
-                "    time_emitting_at_sea INTERVAL"
-                ")"
-                "ON COMMIT DROP;"
-            )
-        )
-
-        positions = prepare_df_for_loading(
-            positions,
-            logger,
-            timedelta_columns=["time_since_previous_position", "time_emitting_at_sea"],
+        tmp_enriched_positions = Table(
+            "tmp_enriched_positions",
+            MetaData(),
+            Column("id", Integer, primary_key=True, autoincrement=False),
+            Column("is_at_port", Boolean),
+            Column("meters_from_previous_position", REAL),
+            Column("time_since_previous_position", INTERVAL),
+            Column("average_speed", REAL),
+            Column("is_fishing", Boolean),
+            Column("time_emitting_at_sea", INTERVAL),
+            prefixes=["TEMP"],
+            postgresql_on_commit="DROP",
         )
+        tmp_enriched_positions.create(connection)
 
         columns_to_load = [
             "id",
@@ -198,12 +175,8 @@ def load_fishing_activity(positions: pd.DataFrame, period: Period, logger: Logge
 
         logger.info("Loading to temporary table")
 
-        positions[columns_to_load].to_sql(
-            "tmp_enriched_positions",
-            connection,
-            if_exists="append",
-            index=False,
-            method=psql_insert_copy,
+        psql_insert_copy_binary(
+            positions[columns_to_load], tmp_enriched_positions, connection
         )
 
         logger.info("Updating positions from temporary table")
@@ -1,16 +1,23 @@
 from datetime import datetime
 from pathlib import Path
-from typing import Tuple
+from typing import Set, Tuple, Union
 
 import pandas as pd
 import prefect
 from prefect import Flow, Parameter, case, task
 from prefect.executors import LocalDaskExecutor
 from prefect.tasks.control_flow import merge
+from sqlalchemy import column, literal_column, or_, select, text
+from sqlalchemy.sql import Select
 
-from config import CURRENT_POSITION_ESTIMATION_MAX_HOURS, default_risk_factors
+from config import (
+    CURRENT_POSITION_ESTIMATION_MAX_HOURS,
+    LAST_POSITIONS_INCREMENTAL_ID_OVERLAP,
+    default_risk_factors,
+)
+from src.db_config import create_engine
 from src.pipeline.generic_tasks import extract, load
-from src.pipeline.helpers.spatial import estimate_current_position
+from src.pipeline.helpers.spatial import compute_estimated_current_positions
 from src.pipeline.processing import (
     coalesce,
     drop_duplicates_by_decreasing_priority,
@@ -28,6 +35,9 @@ from src.pipeline.shared_tasks.positions import (
     tag_positions_at_port,
 )
 from src.pipeline.shared_tasks.vessels import add_vessel_id
+from src.pipeline.utils import delete_rows
+from src.pipeline.utils import get_table as get_table_with_connection
+from src.read_query import read_query, read_saved_query_file
 
 
 @task(checkpoint=False)
@@ -46,7 +56,7 @@ def validate_action(action: str) -> str:
         ValueError: if input in not valid
     """
 
-    valid_actions = {"update", "replace"}
+    valid_actions = {"update", "replace", "incremental"}
 
     if action in valid_actions:
         return action
@@ -57,12 +67,71 @@ def validate_action(action: str) -> str:
 
 
 @task(checkpoint=False)
-def extract_last_positions(minutes: int) -> pd.DataFrame:
+def extract_recent_last_positions_ids(action: str) -> Set[int]:
     """
-    Extracts the last position of each vessel over the past `minutes` minutes.
+    In `incremental` mode, returns the ids of the positions of the `last_positions`
+    table that are less than `LAST_POSITIONS_INCREMENTAL_ID_OVERLAP` below the highest
+    id of the table. The highest id serves as a high-water mark of the positions that
+    were already processed by previous runs of the flow.
+
+    Returns an empty set in other modes (or if the `last_positions` table is empty).
+
+    Args:
+        action (str): input parameter for the flow
+
+    Returns:
+        Set[int]: ids of the most recent positions of the `last_positions` table
+    """
+    if action != "incremental":
+        return set()
+
+    return set(
+        extract(
+            db_name="monitorfish_remote",
+            query_filepath="monitorfish/last_positions_recent_ids.sql",
+            params={"id_overlap": LAST_POSITIONS_INCREMENTAL_ID_OVERLAP},
+        )["id"]
+    )
+
+
+@task(checkpoint=False)
+def get_min_position_id(recent_last_positions_ids: Set[int]) -> int:
+    """
+    Returns the position id above which positions must be extracted:
+
+    - if `recent_last_positions_ids` is not empty, the high-water mark (the highest
+      of these ids) minus `LAST_POSITIONS_INCREMENTAL_ID_OVERLAP`. Positions whose
+      transaction commits late may have ids below the high-water mark, the overlap
+      ensures that they are processed. Positions that were already processed are
+      dropped by `drop_processed_positions`.
+    - 0 otherwise, in which case all positions of the requested time period are
+      extracted
+
+    Args:
+        recent_last_positions_ids (Set[int]): output of
+          `extract_recent_last_positions_ids`
+
+    Returns:
+        int: position id above which positions must be extracted
+    """
+    if not recent_last_positions_ids:
+        return 0
+
+    return max(
+        max(recent_last_positions_ids) - LAST_POSITIONS_INCREMENTAL_ID_OVERLAP, 0
+    )
+
+
+@task(checkpoint=False)
+def extract_last_positions(minutes: int, min_position_id: int = 0) -> pd.DataFrame:
+    """
+    Extracts the last position of each vessel over the past `minutes` minutes, among
+    positions whose id is greater than `min_position_id`.
 
     Args:
         minutes (int): number of minutes from current datetime to extract
+        min_position_id (int, optional): only positions with an id strictly greater
+          than this value are taken into account. Defaults to 0.
 
     Returns:
         pd.DataFrame: DataFrame of vessels' last position.
@@ -70,27 +139,141 @@ def extract_last_positions(minutes: int) -> pd.DataFrame:
     return extract(
         db_name="monitorfish_remote",
         query_filepath="monitorfish/compute_last_positions.sql",
-        params={"minutes": minutes},
+        params={"minutes": minutes, "min_position_id": min_position_id},
         dtypes={"last_position_datetime_utc": "datetime64[ns]"},
     )
 
 
 @task(checkpoint=False)
-def extract_pending_alerts() -> pd.DataFrame:
-    return extract(
-        db_name="monitorfish_remote",
-        query_filepath="monitorfish/pending_alerts.sql",
+def drop_processed_positions(
+    last_positions: pd.DataFrame, processed_positions_ids: Set[int]
+) -> pd.DataFrame:
+    """
+    Removes the positions that were already processed by previous runs of the flow.
+
+    Args:
+        last_positions (pd.DataFrame): output of `extract_last_positions`
+        processed_positions_ids (Set[int]): ids of positions already present in the
+          `last_positions` table
+
+    Returns:
+        pd.DataFrame: subset of last_positions
+    """
+    return last_positions[~last_positions.id.isin(processed_positions_ids)].copy(
+        deep=True
     )
 
 
 @task(checkpoint=False)
-def extract_reportings() -> pd.DataFrame:
-    return extract(
-        db_name="monitorfish_remote",
-        query_filepath="monitorfish/reportings.sql",
+def is_up_to_date(action: str, last_positions: pd.DataFrame) -> bool:
+    """
+    Returns `True` in `incremental` mode if there are no new positions, in which case
+    the `last_positions` table is already up to date and the rest of the flow is
+    skipped.
+
+    Args:
+        action (str): input parameter for the flow
+        last_positions (pd.DataFrame): new positions
+
+    Returns:
+        bool
+    """
+    if action == "incremental" and len(last_positions) == 0:
+        logger = prefect.context.get("logger")
+        logger.info("No new positions, the last_positions table is up to date.")
+        return True
+    return False
+
+
+def make_vessels_data_query(query_filepath: str, vessels: pd.DataFrame) -> Select:
+    """
+    Creates a `sqlalchemy.select` statement that runs the saved query
+    `query_filepath` and only keeps the rows of its result that match any of the
+    lines of `vessels` on any of `vessel_id`, `cfr`, `ircs` or
+    `external_immatriculation`.
+
+    Args:
+        query_filepath (str): path to .sql file, starting from the saved queries
+          folder. The query must have columns `vessel_id`, `cfr`, `ircs` and
+          `external_immatriculation`.
+        vessels (pd.DataFrame): vessels. Must have columns `vessel_id`, `cfr`, `ircs`
+          and `external_immatriculation`.
+
+    Returns:
+        Select: select statement to execute to get the rows of the vessels
+    """
+    vessel_id_cols = ["vessel_id", "cfr", "ircs", "external_immatriculation"]
+    q = (
+        text(read_saved_query_file(query_filepath))
+        .columns(*[column(col) for col in vessel_id_cols])
+        .subquery("q")
+    )
+
+    vessel_ids = vessels.vessel_id.dropna().astype(int).drop_duplicates().tolist()
+    return (
+        select(literal_column("*"))
+        .select_from(q)
+        .where(
+            or_(
+                q.c.vessel_id.in_(vessel_ids),
+                *[
+                    q.c[col].in_(vessels[col].dropna().drop_duplicates().tolist())
+                    for col in vessel_id_cols[1:]
+                ],
+            )
+        )
+    )
+
+
+def extract_vessels_data(
+    query_filepath: str, vessels: Union[pd.DataFrame, None] = None
+) -> pd.DataFrame:
+    """
+    Runs the saved query `query_filepath` against the `monitorfish_remote` database.
+    If `vessels` is given, only the rows of vessels that match one of `vessels` are
+    extracted, see `make_vessels_data_query`.
+
+    Args:
+        query_filepath (str): path to .sql file, starting from the saved queries
+          folder
+        vessels (Union[pd.DataFrame, None], optional): vessels to extract data for.
+          If `None`, the data of all vessels is extracted. Defaults to None.
+
+    Returns:
+        pd.DataFrame: query results
+    """
+    if vessels is None:
+        return extract(db_name="monitorfish_remote", query_filepath=query_filepath)
+
+    return read_query(
+        make_vessels_data_query(query_filepath, vessels), db="monitorfish_remote"
     )
 
 
+@task(checkpoint=False)
+def get_vessels_to_refresh(
+    action: str, last_positions: pd.DataFrame
+) -> Union[pd.DataFrame, None]:
+    """
+    Returns the vessels whose risk factors, alerts, reportings and beacon
+    malfunctions must be extracted : the vessels of `last_positions` in `incremental`
+    mode, `None` (all vessels) otherwise.
+    """
+    if action == "incremental":
+        return last_positions
+    return None
+
+
+@task(checkpoint=False)
+def extract_pending_alerts(vessels: pd.DataFrame = None) -> pd.DataFrame:
+    return extract_vessels_data("monitorfish/pending_alerts.sql", vessels)
+
+
+@task(checkpoint=False)
+def extract_reportings(vessels: pd.DataFrame = None) -> pd.DataFrame:
+    return extract_vessels_data("monitorfish/reportings.sql", vessels)
+
+
 @task(checkpoint=False)
 def drop_duplicates(positions: pd.DataFrame) -> pd.DataFrame:
     """
@@ -229,6 +412,30 @@ def split(
     )
 
 
+@task(checkpoint=False)
+def drop_outdated_updates(last_positions_to_update: pd.DataFrame) -> pd.DataFrame:
+    """
+    Removes the vessels whose new last position is older than their previous last
+    position.
+
+    This happens in `incremental` mode when positions are received late : positions
+    with an id above the high-water mark may then have a `date_time` older than the
+    last position already known for the vessel, which must be kept.
+
+    Args:
+        last_positions_to_update (pd.DataFrame): output of `split`
+
+    Returns:
+        pd.DataFrame: subset of last_positions_to_update
+    """
+    return last_positions_to_update[
+        ~(
+            last_positions_to_update.last_position_datetime_utc_new
+            < last_positions_to_update.last_position_datetime_utc_previous
+        )
+    ].copy(deep=True)
+
+
 @task(checkpoint=False)
 def compute_emission_period(last_positions_to_update: pd.DataFrame) -> pd.DataFrame:
     """
@@ -301,18 +508,36 @@ def concatenate(
 
 
 @task(checkpoint=False)
-def extract_risk_factors():
-    return extract(
-        db_name="monitorfish_remote",
-        query_filepath="monitorfish/risk_factors.sql",
+def concatenate_changed(
+    new_vessels_last_positions: pd.DataFrame,
+    updated_last_positions: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Concatenates the last_positions of new vessels and of vessels that have moved,
+    which are the only rows of the `last_positions` table that need to be written in
+    `incremental` mode.
+
+    Args:
+        new_vessels_last_positions (pd.DataFrame)
+        updated_last_positions (pd.DataFrame)
+
+    Returns:
+        pd.DataFrame: concatenation of the 2 inputs sets of last_positions
+    """
+    return pd.concat(
+        [new_vessels_last_positions, updated_last_positions], ignore_index=True
     )
 
 
 @task(checkpoint=False)
-def extract_beacon_malfunctions():
-    return extract(
-        db_name="monitorfish_remote",
-        query_filepath="monitorfish/beacon_malfunctions_for_last_positions.sql",
+def extract_risk_factors(vessels: pd.DataFrame = None):
+    return extract_vessels_data("monitorfish/risk_factors.sql", vessels)
+
+
+@task(checkpoint=False)
+def extract_beacon_malfunctions(vessels: pd.DataFrame = None):
+    return extract_vessels_data(
+        "monitorfish/beacon_malfunctions_for_last_positions.sql", vessels
     )
 
 
@@ -321,6 +546,8 @@ def estimate_current_positions(
     last_positions: pd.DataFrame, max_hours_since_last_position: float
 ) -> pd.DataFrame:
     """
+    Estimates the current position of vessels by extrapolating their last position
+    with their course and speed, using `compute_estimated_current_positions`.
 
     Args:
         last_positions (pd.DataFrame): vessels' last position with route and speed
@@ -337,25 +564,20 @@ def estimate_current_positions(
     last_positions = last_positions.copy(deep=True)
     now = datetime.utcnow()
 
-    estimated_position_cols = [
-        "estimated_current_latitude",
-        "estimated_current_longitude",
-    ]
-
-    last_positions[estimated_position_cols] = last_positions.apply(
-        lambda row: estimate_current_position(
-            last_latitude=row["latitude"],
-            last_longitude=row["longitude"],
-            course=row["course"],
-            speed=row["speed"],
-            hours_since_last_position=(
-                (now - row["last_position_datetime_utc"]).total_seconds() / 3600
-            ),
-            max_hours_since_last_position=max_hours_since_last_position,
-            on_error="ignore",
-        ),
-        axis=1,
-        result_type="expand",
+    hours_since_last_position = (
+        now - pd.to_datetime(last_positions["last_position_datetime_utc"])
+    ).dt.total_seconds() / 3600
+
+    (
+        last_positions["estimated_current_latitude"],
+        last_positions["estimated_current_longitude"],
+    ) = compute_estimated_current_positions(
+        last_latitudes=pd.to_numeric(last_positions["latitude"], errors="coerce"),
+        last_longitudes=pd.to_numeric(last_positions["longitude"], errors="coerce"),
+        courses=pd.to_numeric(last_positions["course"], errors="coerce"),
+        speeds=pd.to_numeric(last_positions["speed"], errors="coerce"),
+        hours_since_last_position=hours_since_last_position,
+        max_hours_since_last_position=max_hours_since_last_position,
     )
 
     return last_positions
@@ -419,15 +641,78 @@ def load_last_positions(last_positions):
         schema="public",
         db_name="monitorfish_remote",
         logger=prefect.context.get("logger"),
-        how="replace",
-        pg_array_columns=["segments", "alerts", "reportings"],
+        how="diff",
+        key_columns=["vessel_id", "cfr", "ircs", "external_immatriculation"],
         handle_array_conversion_errors=True,
         value_on_array_conversion_error="{}",
         jsonb_columns=["gear_onboard", "species_onboard"],
-        nullable_integer_columns=["beacon_malfunction_id", "vessel_id"],
-        timedelta_columns=["emission_period"],
+        copy_format="binary",
+    )
+
+
+@task(checkpoint=False)
+def upsert_last_positions(
+    last_positions: pd.DataFrame, previous_last_positions: pd.DataFrame
+):
+    """
+    Writes the last_positions of the vessels present in `last_positions` to the
+    `last_positions` table, replacing the rows of these vessels in the table, and
+    leaves the rows of all other vessels untouched.
+
+    The rows to replace are identified in `previous_last_positions` (the contents of
+    the table before deduplication) using vessel_id, cfr, ircs and
+    external_immatriculation by decreasing priority, the same way as in `split`.
+
+    Args:
+        last_positions (pd.DataFrame): last_positions of vessels that have changed
+        previous_last_positions (pd.DataFrame): contents of the `last_positions`
+          table, with `vessel_id` added
+    """
+    logger = prefect.context.get("logger")
+
+    if len(last_positions) == 0:
+        logger.info("No vessel has moved, nothing to load.")
+        return
+
+    vessel_id_cols = ["vessel_id", "cfr", "ircs", "external_immatriculation"]
+    ids_to_replace = set(
+        previous_last_positions.loc[
+            left_isin_right_by_decreasing_priority(
+                previous_last_positions[vessel_id_cols],
+                last_positions[vessel_id_cols],
+            ),
+            "id",
+        ]
     )
 
+    e = create_engine("monitorfish_remote")
+
+    with e.begin() as connection:
+        if ids_to_replace:
+            table = get_table_with_connection(
+                "last_positions", "public", connection, logger
+            )
+            delete_rows(
+                table=table,
+                id_column="id",
+                ids_to_delete=ids_to_replace,
+                connection=connection,
+                logger=logger,
+            )
+
+        load(
+            last_positions,
+            table_name="last_positions",
+            schema="public",
+            logger=logger,
+            how="append",
+            handle_array_conversion_errors=True,
+            value_on_array_conversion_error="{}",
+            jsonb_columns=["gear_onboard", "species_onboard"],
+            copy_format="binary",
+            connection=connection,
+        )
+
 
 with Flow("Last positions", executor=LocalDaskExecutor()) as flow:
     # Only run if the previous run has finished running
@@ -451,62 +736,110 @@ with Flow("Last positions", executor=LocalDaskExecutor()) as flow:
 
         vessels_table = get_table("vessels")
 
-        risk_factors = extract_risk_factors(upstream_tasks=[positions_healthcheck])
-        pending_alerts = extract_pending_alerts(upstream_tasks=[positions_healthcheck])
-        reportings = extract_reportings(upstream_tasks=[positions_healthcheck])
-        beacon_malfunctions = extract_beacon_malfunctions(
-            upstream_tasks=[positions_healthcheck]
+        recent_last_positions_ids = extract_recent_last_positions_ids(action)
+        min_position_id = get_min_position_id(recent_last_positions_ids)
+        last_positions = extract_last_positions(
+            minutes=minutes, min_position_id=min_position_id
         )
-
-        last_positions = extract_last_positions(minutes=minutes)
-        last_positions = add_vessel_id(last_positions, vessels_table)
-        last_positions = drop_duplicates(last_positions)
-        last_positions = add_vessel_identifier(last_positions)
-        last_positions = tag_positions_at_port(last_positions)
-
-        with case(action, "update"):
-            previous_last_positions = extract_previous_last_positions()
-            previous_last_positions = add_vessel_id(
-                previous_last_positions, vessels_table
-            )
-            previous_last_positions = drop_duplicates(previous_last_positions)
-            new_last_positions = drop_unchanged_new_last_positions(
-                last_positions, previous_last_positions
+        last_positions = drop_processed_positions(
+            last_positions, recent_last_positions_ids
+        )
+        up_to_date = is_up_to_date(action, last_positions)
+
+        with case(up_to_date, False):
+            last_positions = add_vessel_id(last_positions, vessels_table)
+            last_positions = drop_duplicates(last_positions)
+            last_positions = add_vessel_identifier(last_positions)
+            last_positions = tag_positions_at_port(last_positions)
+
+            with case(action, "update"):
+                previous_last_positions = extract_previous_last_positions()
+                previous_last_positions = add_vessel_id(
+                    previous_last_positions, vessels_table
+                )
+                previous_last_positions = drop_duplicates(previous_last_positions)
+                new_last_positions = drop_unchanged_new_last_positions(
+                    last_positions, previous_last_positions
+                )
+
+                (
+                    unchanged_previous_last_positions,
+                    new_vessels_last_positions,
+                    last_positions_to_update,
+                ) = split(previous_last_positions, new_last_positions)
+                updated_last_positions = compute_emission_period(
+                    last_positions_to_update
+                )
+
+                last_positions_1 = concatenate(
+                    unchanged_previous_last_positions,
+                    new_vessels_last_positions,
+                    updated_last_positions,
+                )
+
+            with case(action, "replace"):
+                last_positions_2 = last_positions
+
+            # In incremental mode, only the vessels that have moved since the previous
+            # run are processed and written to the `last_positions` table. Risk
+            # factors, alerts, reportings, beacon malfunctions and estimated current
+            # positions of other vessels are refreshed by the periodic runs in
+            # `update` mode.
+            with case(action, "incremental"):
+                stored_last_positions = extract_previous_last_positions()
+                stored_last_positions = add_vessel_id(
+                    stored_last_positions, vessels_table
+                )
+                previous_last_positions_3 = drop_duplicates(stored_last_positions)
+
+                (
+                    _,
+                    new_vessels_last_positions_3,
+                    last_positions_to_update_3,
+                ) = split(previous_last_positions_3, last_positions)
+                last_positions_to_update_3 = drop_outdated_updates(
+                    last_positions_to_update_3
+                )
+                updated_last_positions_3 = compute_emission_period(
+                    last_positions_to_update_3
+                )
+
+                last_positions_3 = concatenate_changed(
+                    new_vessels_last_positions_3, updated_last_positions_3
+                )
+
+            last_positions = merge(
+                last_positions_1, last_positions_2, last_positions_3, checkpoint=False
             )
 
-            (
-                unchanged_previous_last_positions,
-                new_vessels_last_positions,
-                last_positions_to_update,
-            ) = split(previous_last_positions, new_last_positions)
-            updated_last_positions = compute_emission_period(last_positions_to_update)
+            vessels_to_refresh = get_vessels_to_refresh(action, last_positions)
+            risk_factors = extract_risk_factors(vessels_to_refresh)
+            pending_alerts = extract_pending_alerts(vessels_to_refresh)
+            reportings = extract_reportings(vessels_to_refresh)
+            beacon_malfunctions = extract_beacon_malfunctions(vessels_to_refresh)
 
-            last_positions_1 = concatenate(
-                unchanged_previous_last_positions,
-                new_vessels_last_positions,
-                updated_last_positions,
+            last_positions = estimate_current_positions(
+                last_positions=last_positions,
+                max_hours_since_last_position=current_position_estimation_max_hours,
+            )
+            last_positions = join(
+                last_positions,
+                risk_factors,
+                pending_alerts,
+                reportings,
+                beacon_malfunctions,
             )
 
-        with case(action, "replace"):
-            last_positions_2 = last_positions
-
-        last_positions = merge(last_positions_1, last_positions_2, checkpoint=False)
+            last_positions = drop_duplicates(last_positions)
 
-        last_positions = estimate_current_positions(
-            last_positions=last_positions,
-            max_hours_since_last_position=current_position_estimation_max_hours,
-        )
-        last_positions = join(
-            last_positions,
-            risk_factors,
-            pending_alerts,
-            reportings,
-            beacon_malfunctions,
-        )
+            # Load
+            with case(action, "incremental"):
+                upsert_last_positions(last_positions, stored_last_positions)
 
-        last_positions = drop_duplicates(last_positions)
+            with case(action, "update"):
+                load_last_positions(last_positions)
 
-        # Load
-        load_last_positions(last_positions)
+            with case(action, "replace"):
+                load_last_positions(last_positions)
 
 flow.file_name = Path(__file__).name
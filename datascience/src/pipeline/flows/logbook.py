@@ -1,22 +1,26 @@
 import os
 import re
 from enum import Enum
+from itertools import islice
+from logging import Logger
 from pathlib import Path
-from typing import List, Union
-from zipfile import ZipFile
+from typing import Iterator, List
+from zipfile import BadZipFile, ZipFile
 
 import prefect
 from prefect import Flow, Parameter, task
 from prefect.executors import LocalDaskExecutor
 from prefect.tasks.control_flow import case
+from sqlalchemy import Table
+from sqlalchemy.engine import Connection
 
-from config import ERS_FILES_LOCATION
+from config import ERS_FILES_LOCATION, LOGBOOK_LOADING_BATCH_SIZE
 from src.db_config import create_engine
 from src.pipeline.parsers.ers import ers
 from src.pipeline.parsers.flux import flux
-from src.pipeline.processing import drop_rows_already_in_table, to_json
+from src.pipeline.processing import drop_rows_already_in_table
 from src.pipeline.shared_tasks.control_flow import check_flow_not_running, str_to_path
-from src.pipeline.utils import get_table, move, psql_insert_copy
+from src.pipeline.utils import get_table, move, psql_insert_copy_binary
 
 RECEIVED_DIRECTORY = ERS_FILES_LOCATION / "received"
 TREATED_DIRECTORY = ERS_FILES_LOCATION / "treated"
@@ -98,6 +102,182 @@ def get_logbook_zipped_file_type(zipfile_name: str) -> LogbookZippedFileType:
         )
 
 
+def iter_xml_messages(zipfile: dict) -> Iterator[str]:
+    """Takes a `dict` describing a zipfile (see `extract_zipfiles`), opens the
+    corresponding zipfile on the filesystem and yields the content of the xml files
+    it contains, one at a time.
+
+    Args:
+        zipfile (dict): `dict` with `input_dir` and `full_name` items
+
+    Yields:
+        str: content of each xml file contained in the zipfile
+    """
+    with ZipFile(zipfile["input_dir"] / zipfile["full_name"]) as zipobj:
+        for xml_filename in zipobj.namelist():
+            with zipobj.open(xml_filename, mode="r") as f:
+                yield f.read().decode("utf-8")
+
+
+def parse_xml_messages(
+    xml_messages: List[str], transmission_format: LogbookTransmissionFormat
+) -> dict:
+    """Parses a list of xml messages with the parser corresponding to the
+    `transmission_format`.
+
+    Args:
+        xml_messages (List[str]): xml messages
+        transmission_format (LogbookTransmissionFormat): transmission format of the
+          messages
+
+    Returns:
+        dict: `dict` with `logbook_reports`, `logbook_raw_messages` and
+          `batch_generated_errors` items (see `ers.batch_parse`)
+    """
+    batch_parsers = {
+        LogbookTransmissionFormat.ERS: ers.batch_parse,
+        LogbookTransmissionFormat.FLUX: flux.batch_parse,
+    }
+
+    batch_parser = batch_parsers[transmission_format]
+    parsed_batch = batch_parser(xml_messages)
+    parsed_batch["logbook_reports"]["transmission_format"] = transmission_format.value
+    return parsed_batch
+
+
+def clean_parsed_batch(
+    parsed_batch: dict, transmission_format: LogbookTransmissionFormat
+) -> dict:
+    """Removes QUE and RSP messages from ERS messages (and their raw messages), which
+    are not loaded into the database.
+
+    Args:
+        parsed_batch (dict): output of `parse_xml_messages`
+        transmission_format (LogbookTransmissionFormat): transmission format of the
+          messages
+
+    Returns:
+        dict: cleaned copy of `parsed_batch`
+    """
+    parsed_batch = dict(parsed_batch)
+    if transmission_format is LogbookTransmissionFormat.ERS:
+        parsed_batch["logbook_reports"] = parsed_batch["logbook_reports"][
+            parsed_batch["logbook_reports"].operation_type.isin(
+                ["DAT", "DEL", "COR", "RET"]
+            )
+        ]
+        parsed_batch["logbook_raw_messages"] = parsed_batch["logbook_raw_messages"][
+            parsed_batch["logbook_raw_messages"].operation_number.isin(
+                parsed_batch["logbook_reports"]["operation_number"]
+            )
+        ]
+    return parsed_batch
+
+
+def iter_logbook_batches(zipfile: dict, batch_size: int) -> Iterator[dict]:
+    """Reads, parses and cleans the xml messages of a zipfile by batches of
+    `batch_size` messages, so that only one batch of messages is held in memory at a
+    time, whatever the size of the zipfile.
+
+    Args:
+        zipfile (dict): `dict` describing a zipfile (see `extract_zipfiles`)
+        batch_size (int): number of xml messages per batch
+
+    Yields:
+        dict: `dict` with `logbook_reports`, `logbook_raw_messages` and
+          `batch_generated_errors` items for each batch of messages
+    """
+    transmission_format = zipfile["transmission_format"]
+    xml_messages = iter_xml_messages(zipfile)
+
+    while True:
+        xml_messages_batch = list(islice(xml_messages, batch_size))
+        if not xml_messages_batch:
+            return
+        parsed_batch = parse_xml_messages(xml_messages_batch, transmission_format)
+        yield clean_parsed_batch(parsed_batch, transmission_format)
+
+
+def load_parsed_batch(
+    parsed_batch: dict,
+    transmission_format: LogbookTransmissionFormat,
+    logbook_reports_table: Table,
+    logbook_raw_messages_table: Table,
+    connection: Connection,
+    logger: Logger,
+):
+    """Loads a batch of parsed messages into the logbook_reports and
+    logbook_raw_messages tables, skipping messages that are already in the database.
+
+    Args:
+        parsed_batch (dict): output of `clean_parsed_batch`
+        transmission_format (LogbookTransmissionFormat): transmission format of the
+          messages
+        logbook_reports_table (Table): logbook_reports table
+        logbook_raw_messages_table (Table): logbook_raw_messages table
+        connection (Connection): database connection. Rows loaded from previous
+          batches in the same transaction are seen as already in the database.
+        logger (Logger): logger
+    """
+    logbook_reports = parsed_batch["logbook_reports"]
+    logbook_raw_messages = parsed_batch["logbook_raw_messages"]
+
+    # Drop rows for which the operation number already exists in the
+    # logbook_raw_messages database
+
+    logbook_raw_messages = drop_rows_already_in_table(
+        df=logbook_raw_messages,
+        df_column_name="operation_number",
+        table=logbook_raw_messages_table,
+        table_column_name="operation_number",
+        connection=connection,
+        logger=logger,
+    )
+
+    if transmission_format is LogbookTransmissionFormat.FLUX:
+        logbook_reports = drop_rows_already_in_table(
+            df=logbook_reports,
+            df_column_name="report_id",
+            table=logbook_reports_table,
+            table_column_name="report_id",
+            connection=connection,
+            logger=logger,
+        )
+
+    else:
+        # With ERS data, we cannot rely on having unique report_ids like we do
+        # in FLUX data for two reasons :
+        # - DEL messages have a NULL report_id
+        # - Visiocapture data holds multiple reports in a single ERS element,
+        #   and therefore several logbook_reports with the same report_id
+        #
+        # What we do instead is ensure we only insert logbook_reports for which
+        # the corresponding logbook_raw_message is not yet in the database.
+        logbook_reports = logbook_reports[
+            logbook_reports.operation_number.isin(logbook_raw_messages.operation_number)
+        ]
+
+    if len(logbook_raw_messages) > 0:
+        n_lines = len(logbook_raw_messages)
+        logger.info(f"Inserting {n_lines} messages in logbook_raw_messages table.")
+
+        psql_insert_copy_binary(
+            logbook_raw_messages,
+            logbook_raw_messages_table,
+            connection,
+        )
+
+    if len(logbook_reports) > 0:
+        n_lines = len(logbook_reports)
+        logger.info(f"Inserting {n_lines} messages in logbook_reports table.")
+
+        psql_insert_copy_binary(
+            logbook_reports,
+            logbook_reports_table,
+            connection,
+        )
+
+
 ######################################## TASKS ########################################
 
 
@@ -231,94 +411,22 @@ def extract_zipfiles(
 
 
 @task(checkpoint=False)
-def extract_xmls_from_zipfile(zipfile: Union[None, dict]) -> Union[None, dict]:
-    """Takes a `dict` with the following structure :
-
-          - full_name (`str`): name of the zipfile
-          - input_dir (`Path`): path of the folder container the zipfile
-          - treated_dir (`Path`): path where the zipfile is be transfered after
-            integration
-          - error_dir (`Path`): path where the zipfile should be transfered
-            in case of error during its treatment
-          - transmission_format (`LogbookTransmissionFormat`): transmission format
-
-    Opens the corresponding zipfile on the filesystem, reads the xml files it is
-    expected to contain, puts the content of these xml files in a list of strings,
-    then returns a copy of the input `dict` with an added `xml_messages` item that
-    contains that list of strings.
-
-    Args:
-        zipfile (Union[None, dict]):
-
-    Returns:
-        Union[None, dict]: Copy of the input `dict` with an additionnal `xml_messages`
-          item that contains the list of strings contained inside the zipfile
-          identified by the `input_dir` and `full_name` in the input dictionnary
-    """
-
-    if zipfile:
-        logger = prefect.context.get("logger")
-        logger.info(f"Extracting zipfile {zipfile['full_name']}.")
+def load_logbook_data(
+    zipfiles: List[dict], batch_size: int = LOGBOOK_LOADING_BATCH_SIZE
+):
+    """Reads, parses and loads the messages of logbook zipfiles into
+    public.logbook_reports and public.logbook_raw_messages tables, then moves each
+    zipfile to its `treated_dir`, or to its `error_dir` if errors occurred during the
+    treatment of some of its messages.
 
-        with ZipFile(zipfile["input_dir"] / zipfile["full_name"]) as zipobj:
-            xml_filenames = zipobj.namelist()
-            xml_messages = []
-            for xml_filename in xml_filenames:
-                with zipobj.open(xml_filename, mode="r") as f:
-                    xml_messages.append(f.read().decode("utf-8"))
-            zipfile["xml_messages"] = xml_messages
-            return zipfile
-
-
-@task(checkpoint=False)
-def parse_xmls(zipfile: Union[None, dict]) -> Union[None, dict]:
-    batch_parsers = {
-        LogbookTransmissionFormat.ERS: ers.batch_parse,
-        LogbookTransmissionFormat.FLUX: flux.batch_parse,
-    }
-
-    logger = prefect.context.get("logger")
-    if zipfile:
-        logger.info(f"Parsing messages of zipfile {zipfile['full_name']}")
-        transmission_format = zipfile["transmission_format"]
-        batch_parser = batch_parsers[transmission_format]
-        parsed_batch = batch_parser(zipfile["xml_messages"])
-        parsed_batch["logbook_reports"][
-            "transmission_format"
-        ] = transmission_format.value
-        zipfile.pop("xml_messages")
-        zipfile = {**zipfile, **parsed_batch}
-        return zipfile
-
-
-@task(checkpoint=False)
-def clean(zipfile: Union[None, dict]) -> Union[None, dict]:
-    logger = prefect.context.get("logger")
-    if zipfile:
-        if zipfile["transmission_format"] is LogbookTransmissionFormat.ERS:
-            logger.info(
-                "Removing QUE and RSP messages from messages of "
-                + f"zipfile {zipfile['full_name']}."
-            )
-            zipfile["logbook_reports"] = zipfile["logbook_reports"][
-                zipfile["logbook_reports"].operation_type.isin(
-                    ["DAT", "DEL", "COR", "RET"]
-                )
-            ]
-            zipfile["logbook_raw_messages"] = zipfile["logbook_raw_messages"][
-                zipfile["logbook_raw_messages"].operation_number.isin(
-                    zipfile["logbook_reports"]["operation_number"]
-                )
-            ]
-        return zipfile
-
-
-@task(checkpoint=False)
-def load_logbook_data(cleaned_data: List[dict]):
-    """Loads logbook data into public.logbook_reports and public.logbook_raw_messages tables.
+    Messages are streamed from each zipfile and loaded by batches of `batch_size`
+    messages, in one transaction per zipfile.
 
     Args:
-        cleaned_data (list) : list of dictionaries (output of `clean` task)
+        zipfiles (List[dict]) : list of dictionaries (output of `extract_zipfiles`
+          task)
+        batch_size (int, optional): number of messages parsed and loaded at a time.
+          Defaults to `LOGBOOK_LOADING_BATCH_SIZE`.
     """
     schema = "public"
     logbook_reports_table_name = "logbook_reports"
@@ -333,117 +441,67 @@ def load_logbook_data(cleaned_data: List[dict]):
         logbook_raw_messages_table_name, schema, engine, logger
     )
 
-    cleaned_data = list(filter(lambda x: True if x else False, cleaned_data))
-
-    for zipfile in cleaned_data:
-
-        with engine.begin() as connection:
-            logbook_reports = zipfile["logbook_reports"]
-            logbook_raw_messages = zipfile["logbook_raw_messages"]
-            transmission_format = zipfile["transmission_format"]
-            try:
-                assert transmission_format in (
-                    LogbookTransmissionFormat.FLUX,
-                    LogbookTransmissionFormat.ERS,
-                )
-            except AssertionError:
-                logger.error(
-                    (
-                        f"Unexpected transmission_format {transmission_format}. "
-                        f"Moving {zipfile['full_name']} to error_dir"
-                    )
-                )
-                move(
-                    zipfile["input_dir"] / zipfile["full_name"],
-                    zipfile["error_dir"],
-                    if_exists="replace",
+    for zipfile in zipfiles:
+        transmission_format = zipfile["transmission_format"]
+        try:
+            assert transmission_format in (
+                LogbookTransmissionFormat.FLUX,
+                LogbookTransmissionFormat.ERS,
+            )
+        except AssertionError:
+            logger.error(
+                (
+                    f"Unexpected transmission_format {transmission_format}. "
+                    f"Moving {zipfile['full_name']} to error_dir"
                 )
-                continue
-
-            # Drop rows for which the operation number already exists in the
-            # logbook_raw_messages database
-
-            logbook_raw_messages = drop_rows_already_in_table(
-                df=logbook_raw_messages,
-                df_column_name="operation_number",
-                table=logbook_raw_messages_table,
-                table_column_name="operation_number",
-                connection=connection,
-                logger=logger,
             )
+            move(
+                zipfile["input_dir"] / zipfile["full_name"],
+                zipfile["error_dir"],
+                if_exists="replace",
+            )
+            continue
 
-            if zipfile["transmission_format"] is LogbookTransmissionFormat.FLUX:
-                logbook_reports = drop_rows_already_in_table(
-                    df=logbook_reports,
-                    df_column_name="report_id",
-                    table=logbook_reports_table,
-                    table_column_name="report_id",
-                    connection=connection,
-                    logger=logger,
-                )
+        logger.info(f"Loading messages of zipfile {zipfile['full_name']}.")
+        batch_generated_errors = False
 
-            else:
-                # With ERS data, we cannot rely on having unique report_ids like we do
-                # in FLUX data for two reasons :
-                # - DEL messages have a NULL report_id
-                # - Visiocapture data holds multiple reports in a single ERS element,
-                #   and therefore several logbook_reports with the same report_id
-                #
-                # What we do instead is ensure we only insert logbook_reports for which
-                # the corresponding logbook_raw_message is not yet in the database.
-                logbook_reports = logbook_reports[
-                    logbook_reports.operation_number.isin(
-                        logbook_raw_messages.operation_number
+        try:
+            with engine.begin() as connection:
+                for parsed_batch in iter_logbook_batches(zipfile, batch_size):
+                    batch_generated_errors = (
+                        batch_generated_errors or parsed_batch["batch_generated_errors"]
                     )
-                ]
-
-            if len(logbook_raw_messages) > 0:
-                n_lines = len(logbook_raw_messages)
-                logger.info(
-                    f"Inserting {n_lines} messages in logbook_raw_messages table."
-                )
-
-                logbook_raw_messages.to_sql(
-                    name=logbook_raw_messages_table_name,
-                    con=connection,
-                    schema=schema,
-                    index=False,
-                    method=psql_insert_copy,
-                    if_exists="append",
-                )
-
-            if len(logbook_reports) > 0:
-                n_lines = len(logbook_reports)
-                logger.info(f"Inserting {n_lines} messages in logbook_reports table.")
-
-                # Serialize dicts to prepare for insertion as json in database
-                logbook_reports["value"] = logbook_reports.value.map(to_json)
-
-                logbook_reports.to_sql(
-                    name=logbook_reports_table_name,
-                    con=connection,
-                    schema=schema,
-                    index=False,
-                    method=psql_insert_copy,
-                    if_exists="append",
-                )
+                    load_parsed_batch(
+                        parsed_batch,
+                        transmission_format,
+                        logbook_reports_table,
+                        logbook_raw_messages_table,
+                        connection,
+                        logger,
+                    )
+        except BadZipFile:
+            logger.error(
+                f"{zipfile['full_name']} is not a valid zipfile. Moving it to error "
+                "directory."
+            )
+            batch_generated_errors = True
 
-            if zipfile["batch_generated_errors"]:
-                logger.error(
-                    "Errors occurred during parsing of some of the messages. "
-                    f"Moving {zipfile['full_name']} to error directory."
-                )
-                move(
-                    zipfile["input_dir"] / zipfile["full_name"],
-                    zipfile["error_dir"],
-                    if_exists="replace",
-                )
-            else:
-                move(
-                    zipfile["input_dir"] / zipfile["full_name"],
-                    zipfile["treated_dir"],
-                    if_exists="replace",
-                )
+        if batch_generated_errors:
+            logger.error(
+                "Errors occurred during parsing of some of the messages. "
+                f"Moving {zipfile['full_name']} to error directory."
+            )
+            move(
+                zipfile["input_dir"] / zipfile["full_name"],
+                zipfile["error_dir"],
+                if_exists="replace",
+            )
+        else:
+            move(
+                zipfile["input_dir"] / zipfile["full_name"],
+                zipfile["treated_dir"],
+                if_exists="replace",
+            )
 
 
 with Flow("Logbook", executor=LocalDaskExecutor()) as flow:
@@ -471,9 +529,6 @@ with Flow("Logbook", executor=LocalDaskExecutor()) as flow:
             treated_directory,
             error_directory,
         )
-        zipfiles = extract_xmls_from_zipfile.map(zipfiles)
-        zipfiles = parse_xmls.map(zipfiles)
-        zipfiles = clean.map(zipfiles)
         load_logbook_data(zipfiles)
 
 flow.file_name = Path(__file__).name
@@ -2,12 +2,13 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Tuple
 
+import numpy as np
 import pandas as pd
 import prefect
 from geoalchemy2.functions import ST_Intersects
 from prefect import Flow, Parameter, case, task
 from prefect.executors import LocalDaskExecutor
-from sqlalchemy import Table, and_, not_, or_, select
+from sqlalchemy import Table, and_, func, not_, or_, select
 from sqlalchemy.sql import Select
 
 from src.pipeline.exceptions import MonitorfishHealthError
@@ -64,6 +65,7 @@ def make_positions_at_sea_query(
     eez_areas_table: Table = None,
     eez_to_monitor_iso3: list = None,
     only_fishing_positions: bool = False,
+    aggregate_by_day: bool = False,
 ) -> Select:
     """
     Generates the `sqlalchemy.Select` statement to run in order to get the positions of
@@ -89,6 +91,9 @@ def make_positions_at_sea_query(
         only_fishing_positions (bool, optional): if `True`, only positions which were
           detected as being in fishing operation will be considered.
           Defaults to `False`.
+        aggregate_by_day (bool, optional): if `True`, only the last position of each
+          vessel on each day is queried, so that days at sea can be counted without
+          transferring all positions. Defaults to `False`.
 
     Raises:
         ValueError: If `minimum_length` is not `None` and the `vessels_table` is not
@@ -177,6 +182,17 @@ def make_positions_at_sea_query(
     if eez_to_monitor_iso3:
         q = q.where(eez_areas_table.c.iso_sov1.in_(eez_to_monitor_iso3))
 
+    if aggregate_by_day:
+        vessel_day = (
+            positions_table.c.internal_reference_number,
+            positions_table.c.external_reference_number,
+            positions_table.c.ircs,
+            func.date_trunc("day", positions_table.c.date_time),
+        )
+        q = q.distinct(*vessel_day).order_by(
+            *vessel_day, positions_table.c.date_time.desc()
+        )
+
     return q
 
 
@@ -257,7 +273,9 @@ def concat(
 def get_vessels_at_sea(positions_at_sea: pd.DataFrame, min_days: int) -> pd.DataFrame:
     """
     Returns a DataFrame with the vessels present in the input `positions_at_sea`
-    DataFrame which were at sea on at least `min_days` days. Must have columns :
+    DataFrame which were at sea on at least `min_days` days, with their last position.
+    The input may have one row per position or, if it was queried with
+    `aggregate_by_day`, one row per vessel and per day. Must have columns :
 
       - `cfr`
       - `external_immatriculation`
@@ -279,21 +297,39 @@ def get_vessels_at_sea(positions_at_sea: pd.DataFrame, min_days: int) -> pd.Data
         pd.DataFrame: vessels of the input that were at sea on at least `n_days`
         different days.
     """
-    positions_at_sea = positions_at_sea.copy(deep=True)
-    positions_at_sea["date"] = positions_at_sea.date_time.map(lambda d: d.date())
+    vessel_keys = ["cfr", "ircs", "external_immatriculation"]
+
+    # Rows with a null identifier belong to no vessel (code -1) and are excluded
+    vessel_codes = (
+        positions_at_sea.groupby(vessel_keys, sort=False)
+        .ngroup()
+        .fillna(-1)
+        .astype(int)
+        .to_numpy()
+    )
+    day_codes, _ = pd.factorize(
+        pd.to_datetime(positions_at_sea.date_time).dt.floor("D")
+    )
 
-    positions_at_sea["days_at_sea"] = positions_at_sea.groupby(
-        ["cfr", "ircs", "external_immatriculation"]
-    )["date"].transform("nunique")
+    vessel_days = pd.DataFrame(
+        {"vessel": vessel_codes, "day": day_codes}
+    ).drop_duplicates()
+    vessel_days = vessel_days.loc[vessel_days.vessel >= 0]
+    days_at_sea = np.bincount(
+        vessel_days.vessel, minlength=vessel_codes.max(initial=0) + 1
+    )
 
-    positions_at_sea = positions_at_sea.loc[
-        positions_at_sea.days_at_sea >= min_days
-    ].reset_index(drop=True)
+    is_vessel_at_sea = (vessel_codes >= 0) & (
+        days_at_sea[np.maximum(vessel_codes, 0)] >= min_days
+    )
+
+    positions_at_sea = positions_at_sea.loc[is_vessel_at_sea].assign(
+        vessel_code=vessel_codes[is_vessel_at_sea]
+    )
 
     vessels_at_sea = (
         positions_at_sea.sort_values("date_time", ascending=False)
-        .groupby(["cfr", "ircs", "external_immatriculation"])
-        .head(1)[
+        .drop_duplicates(subset="vessel_code")[
             [
                 "cfr",
                 "external_immatriculation",
@@ -437,6 +473,7 @@ with Flow("Missing FAR alerts", executor=LocalDaskExecutor()) as flow:
             vessels_table=vessels_table,
             minimum_length=minimum_length,
             only_fishing_positions=only_raise_if_route_shows_fishing,
+            aggregate_by_day=True,
         )
 
         positions_at_sea_yesterday_in_french_eez_query = make_positions_at_sea_query(
@@ -450,6 +487,7 @@ with Flow("Missing FAR alerts", executor=LocalDaskExecutor()) as flow:
             eez_areas_table=eez_areas_table,
             eez_to_monitor_iso3=["FRA"],
             only_fishing_positions=only_raise_if_route_shows_fishing,
+            aggregate_by_day=True,
         )
 
         positions_at_sea_yesterday_in_french_eez = read_query_task(
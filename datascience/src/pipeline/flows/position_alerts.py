@@ -1,12 +1,14 @@
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, List
 
+import numpy as np
 import pandas as pd
 import prefect
 from geoalchemy2 import Geometry
 from geoalchemy2.functions import ST_Intersects
-from prefect import Flow, Parameter, case, task
+from prefect import Flow, Parameter, case, task, unmapped
 from prefect.executors import LocalDaskExecutor
 from prefect.tasks.control_flow import merge
 from sqlalchemy import Table, and_, or_, select
@@ -15,6 +17,12 @@ from sqlalchemy.sql import Select
 from src.db_config import create_engine
 from src.pipeline import utils
 from src.pipeline.generic_tasks import extract, read_query_task
+from src.pipeline.helpers.spatial import ZonesIndex
+from src.pipeline.helpers.vessels import (
+    make_add_vessels_columns_query,
+    make_find_vessels_query,
+    merge_vessel_id,
+)
 from src.pipeline.processing import coalesce, join_on_multiple_keys
 from src.pipeline.shared_tasks.alerts import (
     extract_silenced_alerts,
@@ -26,7 +34,6 @@ from src.pipeline.shared_tasks.control_flow import check_flow_not_running
 from src.pipeline.shared_tasks.infrastructure import get_table
 from src.pipeline.shared_tasks.positions import add_vessel_identifier
 from src.pipeline.shared_tasks.risk_factors import extract_current_risk_factors
-from src.pipeline.shared_tasks.vessels import add_vessel_id, add_vessels_columns
 from src.read_query import read_query
 
 
@@ -62,6 +69,183 @@ class ZonesTable:
         )
 
 
+class ZonesIndexCache:
+    """In-memory cache of `ZonesIndex` objects, so that zones geometries are only
+    loaded from the database and indexed once per flow run when several alert
+    configurations of a batch use the same zones.
+
+    Flow runs each run in a fresh process, so cached indexes only live for the
+    duration of a flow run.
+
+    Instances are thread-safe and can be shared between the tasks of flows run with
+    `LocalDaskExecutor`.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: tuple, load: Callable[[], ZonesIndex]) -> ZonesIndex:
+        """Returns the cached `ZonesIndex` for `key`, after loading it with `load` if
+        it is not cached yet."""
+        with self._lock:
+            if key not in self._indexes:
+                self._indexes[key] = load()
+            return self._indexes[key]
+
+    def invalidate(self):
+        """Empties the cache."""
+        with self._lock:
+            self._indexes = {}
+
+
+zones_index_cache = ZonesIndexCache()
+
+
+@task(checkpoint=False)
+def validate_engine(engine: str) -> str:
+    """
+    Checks that the received `engine` parameter value is valid and returns it.
+
+      - 'sql' evaluates positions in alert in the database, with PostGIS spatial joins
+      - 'local' fetches positions and evaluates them against in-memory indexes of
+        zones, see `compute_positions_in_alert`
+
+    Args:
+        engine (str): input parameter for the flow
+
+    Returns:
+        str: input, if valid
+
+    Raises:
+        ValueError: if input in not valid
+    """
+
+    valid_engines = {"sql", "local"}
+
+    if engine in valid_engines:
+        return engine
+    else:
+        raise ValueError(
+            f"engine must be one of {', '.join(sorted(valid_engines))}, got {engine}"
+        )
+
+
+ALERT_CONFIG_DEFAULTS = {
+    "zones": None,
+    "hours_from_now": 8,
+    "only_fishing_positions": True,
+    "flag_states": None,
+    "except_flag_states": None,
+    "fishing_gears": None,
+    "fishing_gear_categories": None,
+    "include_vessels_unknown_gear": True,
+}
+
+
+@task(checkpoint=False)
+def make_alert_configs(
+    alert_configs: List[dict] = None,
+    alert_type: str = None,
+    alert_config_name: str = None,
+    zones: List = None,
+    hours_from_now: int = 8,
+    only_fishing_positions: bool = True,
+    flag_states: List = None,
+    except_flag_states: List = None,
+    fishing_gears: List = None,
+    fishing_gear_categories: List = None,
+    include_vessels_unknown_gear: bool = True,
+) -> Dict[str, list]:
+    """
+    Returns the alert configurations to evaluate in the flow run, as a dictionary of
+    lists with one element per configuration, so that tasks can be mapped over
+    the values of each parameter.
+
+    If `alert_configs` is given, the configurations it contains are used and the
+    other arguments are ignored. Otherwise, a single configuration is made from the
+    other arguments.
+
+    Args:
+        alert_configs (List[dict], optional): list of alert configurations. Each
+          configuration is a `dict` which must have `alert_type` and
+          `alert_config_name` keys and may have any of the keys of
+          `ALERT_CONFIG_DEFAULTS`, missing keys taking the default values. Defaults
+          to None.
+        alert_type (str, optional): type of alert of the single configuration.
+        alert_config_name (str, optional): name of the single configuration.
+        other arguments: parameters of the single configuration, see
+          `make_positions_in_alert_query` and `filter_on_gears`.
+
+    Returns:
+        Dict[str, list]: `dict` with `alert_type`, `alert_config_name` and the keys of
+        `ALERT_CONFIG_DEFAULTS` as keys, and lists of the values of these parameters
+        for each configuration as values.
+
+    Raises:
+        ValueError: if there is no configuration, if a configuration lacks an
+          `alert_type` or `alert_config_name` or has unexpected keys, or if several
+          configurations have the same `alert_config_name`.
+    """
+    if alert_configs is None:
+        alert_configs = [
+            {
+                "alert_type": alert_type,
+                "alert_config_name": alert_config_name,
+                "zones": zones,
+                "hours_from_now": hours_from_now,
+                "only_fishing_positions": only_fishing_positions,
+                "flag_states": flag_states,
+                "except_flag_states": except_flag_states,
+                "fishing_gears": fishing_gears,
+                "fishing_gear_categories": fishing_gear_categories,
+                "include_vessels_unknown_gear": include_vessels_unknown_gear,
+            }
+        ]
+
+    if not alert_configs:
+        raise ValueError("At least one alert configuration is required.")
+
+    keys = ["alert_type", "alert_config_name", *ALERT_CONFIG_DEFAULTS]
+    res = {key: [] for key in keys}
+
+    for alert_config in alert_configs:
+        unexpected_keys = set(alert_config) - set(keys)
+        if unexpected_keys:
+            raise ValueError(
+                f"Unexpected alert configuration parameters: {unexpected_keys}."
+            )
+
+        if not (
+            alert_config.get("alert_type") and alert_config.get("alert_config_name")
+        ):
+            raise ValueError(
+                (
+                    "Alert configurations must have an `alert_type` and an "
+                    f"`alert_config_name`, got {alert_config}."
+                )
+            )
+
+        alert_config = {**ALERT_CONFIG_DEFAULTS, **alert_config}
+        for key in keys:
+            res[key].append(alert_config[key])
+
+    if len(set(res["alert_config_name"])) < len(res["alert_config_name"]):
+        raise ValueError("Alert configurations must have distinct names.")
+
+    return res
+
+
+@task(checkpoint=False)
+def get_max_hours_from_now(hours_from_now: List[int]) -> int:
+    """
+    Returns the longest time range, in hours, of the input alert configurations'
+    `hours_from_now`, i.e. the time range of positions to extract to evaluate all
+    configurations.
+    """
+    return max(hours_from_now)
+
+
 @task(checkpoint=False)
 def alert_has_gear_parameters(
     fishing_gears: list, fishing_gear_categories: list
@@ -97,6 +281,15 @@ def alert_has_gear_parameters(
     return True if fishing_gears or fishing_gear_categories else False
 
 
+@task(checkpoint=False)
+def any_alert_has_gear_parameters(alerts_have_gear_parameters: List[bool]) -> bool:
+    """
+    Returns `True` if at least one of the evaluated alert configurations has gear
+    parameters, `False` otherwise.
+    """
+    return any(alerts_have_gear_parameters)
+
+
 @task(checkpoint=False)
 def get_alert_type_zones_table(alert_type: str) -> ZonesTable:
     """
@@ -252,6 +445,233 @@ def make_positions_in_alert_query(
     return q
 
 
+def load_zones_index(zones_table: ZonesTable, zones: List = None) -> ZonesIndex:
+    """
+    Returns a `ZonesIndex` of the zones of the input `ZonesTable`, with the values of
+    the table's `filter_column` as zones values. Indexes are cached in memory in
+    `zones_index_cache` for the duration of the flow run.
+
+    Args:
+        zones_table (ZonesTable): `ZonesTable` of zones.
+        zones (List, optional): If provided, only zones with one of these values are
+          loaded. Defaults to None.
+
+    Returns:
+        ZonesIndex: index of the zones.
+    """
+    zones = sorted(set(zones)) if zones else None
+    key = (
+        zones_table.table.schema,
+        zones_table.table.name,
+        zones_table.geometry_column,
+        zones_table.filter_column,
+        tuple(zones) if zones else None,
+    )
+
+    def load() -> ZonesIndex:
+        query = select(
+            zones_table.table.c[zones_table.filter_column].label("value"),
+            zones_table.table.c[zones_table.geometry_column].label("geometry"),
+        )
+        if zones:
+            query = query.where(
+                zones_table.table.c[zones_table.filter_column].in_(zones)
+            )
+
+        zones_gdf = read_query(
+            query,
+            db="monitorfish_remote",
+            backend="geopandas",
+            geom_col="geometry",
+        )
+        return ZonesIndex(geometries=zones_gdf.geometry.values, values=zones_gdf.value)
+
+    return zones_index_cache.get_or_load(key, load)
+
+
+@task(checkpoint=False)
+def get_zones_index(zones_table: ZonesTable, zones: List = None) -> ZonesIndex:
+    """
+    Returns a `ZonesIndex` of the zones of the input `ZonesTable` with one of the
+    values in `zones` (or of all zones if `zones` is not given), see
+    `load_zones_index`.
+    """
+    return load_zones_index(zones_table, zones)
+
+
+@task(checkpoint=False)
+def get_facades_index(facades_table: Table) -> ZonesIndex:
+    """
+    Returns a `ZonesIndex` of the input table of façades, with façades names as
+    zones values.
+    """
+    return load_zones_index(
+        ZonesTable(
+            table=facades_table, geometry_column="geometry", filter_column="facade"
+        )
+    )
+
+
+def make_recent_positions_query(
+    positions_table: Table, start_date: datetime, end_date: datetime
+) -> Select:
+    """
+    Creates select statement for the query to execute to fetch the positions, with
+    known vessel identifiers, to evaluate with the local engine.
+
+    Args:
+        positions_table (Table): `SQLAlchemy.Table` of positions.
+        start_date (datetime): only positions with a `date_time` after this date are
+          selected.
+        end_date (datetime): only positions with a `date_time` before this date are
+          selected.
+
+    Returns:
+        Select: `SQLAlchemy.Select` statement corresponding to the given parameters.
+    """
+    return select(
+        positions_table.c.id,
+        positions_table.c.internal_reference_number.label("cfr"),
+        positions_table.c.external_reference_number.label("external_immatriculation"),
+        positions_table.c.ircs,
+        positions_table.c.vessel_name,
+        positions_table.c.flag_state,
+        positions_table.c.date_time,
+        positions_table.c.latitude,
+        positions_table.c.longitude,
+        positions_table.c.is_fishing,
+    ).where(
+        and_(
+            positions_table.c.date_time > start_date,
+            positions_table.c.date_time < end_date,
+            or_(
+                positions_table.c.internal_reference_number.isnot(None),
+                positions_table.c.external_reference_number.isnot(None),
+                positions_table.c.ircs.isnot(None),
+            ),
+        )
+    )
+
+
+@task(checkpoint=False)
+def extract_recent_positions(
+    positions_table: Table, hours_from_now: int
+) -> pd.DataFrame:
+    """
+    Fetches positions of the last `hours_from_now` hours with known vessel
+    identifiers. Positions are fetched once per flow run and shared by all alert
+    configurations evaluated in the run.
+
+    Args:
+        positions_table (Table): `SQLAlchemy.Table` of positions.
+        hours_from_now (int): Determines how many hours back in the past positions
+          are fetched.
+
+    Returns:
+        pd.DataFrame: positions
+    """
+    now = datetime.utcnow()
+    start_date = now - timedelta(hours=hours_from_now)
+
+    positions = read_query(
+        make_recent_positions_query(
+            positions_table, start_date=start_date, end_date=now
+        ),
+        db="monitorfish_remote",
+    )
+    positions["is_fishing"] = positions.is_fishing.fillna(False).astype(bool)
+
+    return positions
+
+
+@task(checkpoint=False)
+def compute_positions_in_alert(
+    positions: pd.DataFrame,
+    zones_index: ZonesIndex,
+    facades_index: ZonesIndex,
+    only_fishing_positions: bool,
+    zones: List = None,
+    hours_from_now: int = 8,
+    flag_states: List = None,
+    except_flag_states: List = None,
+) -> pd.DataFrame:
+    """
+    Local equivalent of the query built by `make_positions_in_alert_query`: filters
+    input `positions` to keep those that lie in one of the zones of `zones_index`, and
+    adds the `facade` in which each position lies.
+
+    Input positions may span a longer time range than `hours_from_now`, so that
+    positions extracted once can be used to evaluate several alert configurations.
+
+    Unlike the spatial join of the SQL query, which returns one row per zone (and per
+    façade) a position lies in, each position is returned once, with the first façade
+    it lies in, if any. This does not change the resulting vessels in alert.
+
+    Args:
+        positions (pd.DataFrame): positions, as returned by `extract_recent_positions`
+        zones_index (ZonesIndex): index of zones, with values of the zones table's
+          `filter_column` as zones values
+        facades_index (ZonesIndex): index of façades, with façades names as zones
+          values
+        only_fishing_positions (bool): If `True`, filters positions to keep only
+          positions tagged as `is_fishing`.
+        zones (List, optional): If provided, only zones with one of these values are
+          considered. Defaults to None.
+        hours_from_now (int, optional): Only positions of the last `hours_from_now`
+          hours are considered. Defaults to 8.
+        flag_states (List, optional): If given, filters positions to keep only those of
+          vessels that belong to these flag_states. Defaults to None.
+        except_flag_states (List, optional): If given, filters positions to keep only
+          those of vessels that do NOT belong to these flag_states. Defaults to None.
+
+    Returns:
+        pd.DataFrame: positions in alert
+    """
+    now = datetime.utcnow()
+    start_date = now - timedelta(hours=hours_from_now)
+
+    positions = positions.loc[
+        (positions.date_time > start_date) & (positions.date_time < now)
+    ]
+
+    if only_fishing_positions:
+        positions = positions.loc[positions.is_fishing]
+
+    positions = positions.drop(columns=["is_fishing"])
+
+    if flag_states:
+        positions = positions.loc[positions.flag_state.isin(flag_states)]
+
+    if except_flag_states:
+        # `NOT IN` is never true for null values in SQL
+        positions = positions.loc[
+            positions.flag_state.notnull()
+            & ~positions.flag_state.isin(except_flag_states)
+        ]
+
+    positions_idx, zones_idx = zones_index.intersects(
+        positions.longitude, positions.latitude
+    )
+
+    if zones:
+        is_in_zones = pd.Series(zones_index.values[zones_idx]).isin(zones).values
+        positions_idx = positions_idx[is_in_zones]
+
+    positions_in_alert = positions.iloc[np.unique(positions_idx)].reset_index(drop=True)
+
+    facades_positions_idx, facades_idx = facades_index.intersects(
+        positions_in_alert.longitude, positions_in_alert.latitude
+    )
+    facades_positions_idx, first_facade = np.unique(
+        facades_positions_idx, return_index=True
+    )
+    facades = np.full(len(positions_in_alert), None, dtype=object)
+    facades[facades_positions_idx] = facades_index.values[facades_idx[first_facade]]
+    positions_in_alert["facade"] = facades
+
+    return positions_in_alert
+
+
 @task(checkpoint=False)
 def make_fishing_gears_query(
     fishing_gears_table: Table,
@@ -333,6 +753,7 @@ def filter_on_gears(
     current_gears: pd.DataFrame,
     gear_codes: set,
     include_vessels_unknown_gear: bool,
+    must_filter_on_gears: bool = True,
 ):
     """
     Filters input `positions_in_alert` to keep only rows for which the vessel's
@@ -349,8 +770,15 @@ def filter_on_gears(
           is either absent of the `current_gears` DataFrame or has `None` in
           the `current_gears` field of that DataFrame) are kept. Otherwise, those rows
           are discarded.
+        must_filter_on_gears (bool, optional): if `False`, the input
+          `positions_in_alert` are returned unchanged. This allows mapping over
+          several alert configurations, not all of which filter on gears. Defaults
+          to `True`.
     """
 
+    if not must_filter_on_gears:
+        return positions_in_alert
+
     positions_in_alert = join_on_multiple_keys(
         positions_in_alert,
         current_gears,
@@ -428,12 +856,72 @@ def get_vessels_in_alert(positions_in_alert: pd.DataFrame) -> pd.DataFrame:
     return vessels_in_alerts
 
 
+@task(checkpoint=False)
+def add_vessels_data(
+    vessels_in_alert: List[pd.DataFrame],
+    vessels_table: Table,
+    districts_table: Table,
+) -> List[pd.DataFrame]:
+    """
+    Adds `vessel_id` and `dml` columns to the vessels in alert of each alert
+    configuration. This is the equivalent of running `add_vessel_id` and
+    `add_vessels_columns` on each input DataFrame, with a single query of each kind
+    for all alert configurations.
+
+    Args:
+        vessels_in_alert (List[pd.DataFrame]): vessels in alert of each alert
+          configuration. Must have columns `cfr`, `ircs` and
+          `external_immatriculation`.
+        vessels_table (Table): vessels table.
+        districts_table (Table): districts table.
+
+    Returns:
+        List[pd.DataFrame]: same as input with added `vessel_id` and `dml` columns
+    """
+    logger = prefect.context.get("logger")
+
+    all_vessels_in_alert = pd.concat(vessels_in_alert, ignore_index=True)
+    found_vessels = read_query(
+        make_find_vessels_query(all_vessels_in_alert, vessels_table),
+        db="monitorfish_remote",
+    )
+
+    # Vessels are matched separately for each configuration, as a vessel can be in
+    # alert in several configurations
+    vessels_in_alert = [
+        merge_vessel_id(vessels, found_vessels, logger) for vessels in vessels_in_alert
+    ]
+
+    vessel_ids = (
+        pd.concat(vessels_in_alert, ignore_index=True).vessel_id.unique().tolist()
+    )
+    vessels_added_columns = read_query(
+        make_add_vessels_columns_query(
+            vessel_ids=vessel_ids,
+            vessels_table=vessels_table,
+            districts_table=districts_table,
+            districts_columns_to_add=["dml"],
+        ),
+        db="monitorfish_remote",
+    )
+
+    return [
+        pd.merge(vessels, vessels_added_columns, on="vessel_id", how="left")
+        for vessels in vessels_in_alert
+    ]
+
+
+@task(checkpoint=False)
+def concat_alerts(alerts: List[pd.DataFrame]) -> pd.DataFrame:
+    return pd.concat(alerts, ignore_index=True)
+
+
 with Flow("Position alert", executor=LocalDaskExecutor()) as flow:
     flow_not_running = check_flow_not_running()
     with case(flow_not_running, True):
-        alert_type = Parameter("alert_type")
-        alert_config_name = Parameter("alert_config_name")
-        zones = Parameter("zones")
+        alert_type = Parameter("alert_type", default=None)
+        alert_config_name = Parameter("alert_config_name", default=None)
+        zones = Parameter("zones", default=None)
         hours_from_now = Parameter("hours_from_now", default=8)
         only_fishing_positions = Parameter("only_fishing_positions", default=True)
         flag_states = Parameter("flag_states", default=None)
@@ -443,68 +931,126 @@ with Flow("Position alert", executor=LocalDaskExecutor()) as flow:
         include_vessels_unknown_gear = Parameter(
             "include_vessels_unknown_gear", default=True
         )
+        # Batch mode : list of alert configurations to evaluate together. When given,
+        # the parameters of the single configuration above are ignored.
+        alert_configs = Parameter("alert_configs", default=None)
+        engine = Parameter("engine", default="sql")
+
+        engine = validate_engine(engine)
+
+        alert_configs = make_alert_configs(
+            alert_configs=alert_configs,
+            alert_type=alert_type,
+            alert_config_name=alert_config_name,
+            zones=zones,
+            hours_from_now=hours_from_now,
+            only_fishing_positions=only_fishing_positions,
+            flag_states=flag_states,
+            except_flag_states=except_flag_states,
+            fishing_gears=fishing_gears,
+            fishing_gear_categories=fishing_gear_categories,
+            include_vessels_unknown_gear=include_vessels_unknown_gear,
+        )
 
-        must_filter_on_gears = alert_has_gear_parameters(
-            fishing_gears, fishing_gear_categories
+        must_filter_on_gears = alert_has_gear_parameters.map(
+            alert_configs["fishing_gears"], alert_configs["fishing_gear_categories"]
         )
 
         positions_table = get_table("positions")
         vessels_table = get_table("vessels")
         districts_table = get_table("districts")
-        zones_table = get_alert_type_zones_table(alert_type)
+        zones_tables = get_alert_type_zones_table.map(alert_configs["alert_type"])
         facades_table = get_table("facade_areas_subdivided")
 
-        positions_query = make_positions_in_alert_query(
-            positions_table=positions_table,
-            facades_table=facades_table,
-            zones_table=zones_table,
-            only_fishing_positions=only_fishing_positions,
-            zones=zones,
-            hours_from_now=hours_from_now,
-            flag_states=flag_states,
-            except_flag_states=except_flag_states,
+        with case(engine, "sql"):
+            positions_queries = make_positions_in_alert_query.map(
+                positions_table=unmapped(positions_table),
+                facades_table=unmapped(facades_table),
+                zones_table=zones_tables,
+                only_fishing_positions=alert_configs["only_fishing_positions"],
+                zones=alert_configs["zones"],
+                hours_from_now=alert_configs["hours_from_now"],
+                flag_states=alert_configs["flag_states"],
+                except_flag_states=alert_configs["except_flag_states"],
+            )
+
+            positions_in_alert_sql = read_query_task.map(
+                unmapped("monitorfish_remote"), positions_queries
+            )
+
+        with case(engine, "local"):
+            zones_indexes = get_zones_index.map(zones_tables, alert_configs["zones"])
+            facades_index = get_facades_index(facades_table)
+            recent_positions = extract_recent_positions(
+                positions_table=positions_table,
+                hours_from_now=get_max_hours_from_now(alert_configs["hours_from_now"]),
+            )
+            positions_in_alert_local = compute_positions_in_alert.map(
+                positions=unmapped(recent_positions),
+                zones_index=zones_indexes,
+                facades_index=unmapped(facades_index),
+                only_fishing_positions=alert_configs["only_fishing_positions"],
+                zones=alert_configs["zones"],
+                hours_from_now=alert_configs["hours_from_now"],
+                flag_states=alert_configs["flag_states"],
+                except_flag_states=alert_configs["except_flag_states"],
+            )
+
+        positions_in_alert = merge(
+            positions_in_alert_sql, positions_in_alert_local, checkpoint=False
         )
 
-        positions_in_alert = read_query_task("monitorfish_remote", positions_query)
+        any_must_filter_on_gears = any_alert_has_gear_parameters(must_filter_on_gears)
 
-        with case(must_filter_on_gears, True):
+        with case(any_must_filter_on_gears, True):
             fishing_gears_table = get_table("fishing_gear_codes")
-            fishing_gears_query = make_fishing_gears_query(
-                fishing_gears_table=fishing_gears_table,
-                fishing_gears=fishing_gears,
-                fishing_gear_categories=fishing_gear_categories,
+            fishing_gears_queries = make_fishing_gears_query.map(
+                fishing_gears_table=unmapped(fishing_gears_table),
+                fishing_gears=alert_configs["fishing_gears"],
+                fishing_gear_categories=alert_configs["fishing_gear_categories"],
             )
-            gear_codes = extract_gear_codes(fishing_gears_query)
+            gear_codes = extract_gear_codes.map(fishing_gears_queries)
             current_gears = extract_current_gears()
 
-            positions_in_alert_1 = filter_on_gears(
+            positions_in_alert_1 = filter_on_gears.map(
                 positions_in_alert=positions_in_alert,
-                current_gears=current_gears,
+                current_gears=unmapped(current_gears),
                 gear_codes=gear_codes,
-                include_vessels_unknown_gear=include_vessels_unknown_gear,
+                include_vessels_unknown_gear=alert_configs[
+                    "include_vessels_unknown_gear"
+                ],
+                must_filter_on_gears=must_filter_on_gears,
             )
 
-        with case(must_filter_on_gears, False):
+        with case(any_must_filter_on_gears, False):
             positions_in_alert_2 = positions_in_alert
 
         positions_in_alert = merge(
             positions_in_alert_1, positions_in_alert_2, checkpoint=False
         )
 
-        positions_in_alert = add_vessel_identifier(positions_in_alert)
+        positions_in_alert = add_vessel_identifier.map(positions_in_alert)
         current_risk_factors = extract_current_risk_factors()
-        positions_in_alert = merge_risk_factor(positions_in_alert, current_risk_factors)
-        vessels_in_alert = get_vessels_in_alert(positions_in_alert)
-        vessels_in_alert = add_vessel_id(vessels_in_alert, vessels_table)
-        vessels_in_alert = add_vessels_columns(
+        positions_in_alert = merge_risk_factor.map(
+            positions_in_alert, unmapped(current_risk_factors)
+        )
+        vessels_in_alert = get_vessels_in_alert.map(positions_in_alert)
+
+        vessels_in_alert = add_vessels_data(
+            vessels_in_alert, vessels_table, districts_table
+        )
+
+        alerts = make_alerts.map(
             vessels_in_alert,
-            vessels_table,
-            districts_table=districts_table,
-            districts_columns_to_add=["dml"],
+            alert_configs["alert_type"],
+            alert_configs["alert_config_name"],
         )
-        alerts = make_alerts(vessels_in_alert, alert_type, alert_config_name)
         silenced_alerts = extract_silenced_alerts()
-        alert_without_silenced = filter_silenced_alerts(alerts, silenced_alerts)
-        load_alerts(alert_without_silenced, alert_config_name)
+        alert_without_silenced = filter_silenced_alerts.map(
+            alerts, unmapped(silenced_alerts)
+        )
+        load_alerts(
+            concat_alerts(alert_without_silenced), alert_configs["alert_config_name"]
+        )
 
 flow.file_name = Path(__file__).name
@@ -135,7 +135,8 @@ def load_risk_factors(risk_factors: pd.DataFrame):
             "last_control_species_infractions",
             "last_control_other_infractions",
         ],
-        how="replace",
+        how="diff",
+        key_columns=["vessel_id", "cfr"],
     )
 
 
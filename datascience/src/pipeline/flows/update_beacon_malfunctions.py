@@ -1,16 +1,14 @@
 from datetime import datetime
 from pathlib import Path
-from typing import Tuple
+from typing import List, Tuple
 
 import numpy as np
 import pandas as pd
 import prefect
-import requests
-from prefect import Flow, Parameter, case, task, unmapped
+from prefect import Flow, Parameter, case, task
 from prefect.executors import LocalDaskExecutor
 
 from config import (
-    BACKEND_API_KEY,
     BEACON_MALFUNCTIONS_ENDPOINT,
     BEACONS_MAX_HOURS_WITHOUT_EMISSION_AT_PORT,
     BEACONS_MAX_HOURS_WITHOUT_EMISSION_AT_SEA,
@@ -22,12 +20,15 @@ from src.pipeline.entities.beacon_malfunctions import (
     BeaconStatus,
     EndOfMalfunctionReason,
 )
+from src.pipeline.exceptions import BackendApiError
 from src.pipeline.generic_tasks import extract, load
-from src.pipeline.processing import join_on_multiple_keys
-from src.pipeline.shared_tasks.control_flow import (
-    check_flow_not_running,
-    filter_results,
+from src.pipeline.helpers.backend_api import (
+    ApiRequest,
+    ApiResult,
+    get_backend_api_client,
 )
+from src.pipeline.processing import join_on_multiple_keys
+from src.pipeline.shared_tasks.control_flow import check_flow_not_running
 from src.pipeline.shared_tasks.dates import get_utcnow, make_timedelta
 from src.pipeline.shared_tasks.healthcheck import (
     assert_last_positions_flow_health,
@@ -332,15 +333,14 @@ def load_new_beacon_malfunctions(new_beacon_malfunctions: pd.DataFrame):
     )
 
 
-@task(checkpoint=False)
-def update_beacon_malfunction(
+def make_beacon_malfunction_update(
     beacon_malfunction_id: int,
     *,
     new_stage: BeaconMalfunctionStage = None,
     new_vessel_status: BeaconMalfunctionVesselStatus = None,
     end_of_malfunction_reason: EndOfMalfunctionReason = None,
-):
-    """Update a `beacon_malfunction` stage or vessel status.
+) -> ApiRequest:
+    """Make the request to update a `beacon_malfunction` stage or vessel status.
 
     - Exactly one of `new_state` or `new_vessel_status` must be provided
     - `end_of_malfunction_reason` must be provided if `new_stage` is provided and is
@@ -357,6 +357,9 @@ def update_beacon_malfunction(
         end_of_malfunction_reason (endOfMalfunctionReason, optional): reason that led
           to the end of the malfunction. Defaults to None.
 
+    Returns:
+        ApiRequest: request to send to the backend API
+
     Raises:
         ValueError: in the following cases :
 
@@ -366,7 +369,6 @@ def update_beacon_malfunction(
             provided
           - an `end_of_malfunction_reason` is provided along with a `new_vessel_status`
     """
-
     try:
         assert (
             new_stage is None
@@ -425,23 +427,22 @@ def update_beacon_malfunction(
             )
         json["vesselStatus"] = new_vessel_status.value
 
-    if json:
-        headers = {
+    return ApiRequest(
+        method="PUT",
+        url=url,
+        json=json,
+        headers={
             "Accept": "application/json, text/plain",
             "Content-Type": "application/json;charset=UTF-8",
-            "X-API-KEY": BACKEND_API_KEY,
-        }
-        r = requests.put(url=url, json=json, headers=headers)
-        r.raise_for_status()
-
-    return beacon_malfunction_id
+        },
+        item_id=beacon_malfunction_id,
+    )
 
 
-@task(checkpoint=False)
-def request_notification(
+def make_notification_request(
     beacon_malfunction_id: int,
     requested_notification: BeaconMalfunctionNotificationType,
-):
+) -> ApiRequest:
     try:
         assert isinstance(requested_notification, BeaconMalfunctionNotificationType)
     except AssertionError:
@@ -456,9 +457,109 @@ def request_notification(
         BEACON_MALFUNCTIONS_ENDPOINT
         + f"{str(beacon_malfunction_id)}/{requested_notification.value}"
     )
-    headers = {"X-API-KEY": BACKEND_API_KEY}
-    r = requests.put(url=url, headers=headers)
-    r.raise_for_status()
+    return ApiRequest(method="PUT", url=url, item_id=beacon_malfunction_id)
+
+
+def send_api_requests(api_requests: List[ApiRequest], action: str) -> List[ApiResult]:
+    """
+    Sends `api_requests` in a batch with the backend API client and logs the
+    requests that failed.
+
+    Args:
+        api_requests (List[ApiRequest]): requests to send
+        action (str): description of the requests, for logging
+
+    Returns:
+        List[ApiResult]: results of the requests
+    """
+    logger = prefect.context.get("logger")
+
+    if not api_requests:
+        return []
+
+    logger.info(f"{action} : sending {len(api_requests)} requests.")
+    results = get_backend_api_client().send_batch(api_requests)
+
+    failed = [res for res in results if not res.ok]
+    for res in failed:
+        logger.error(
+            f"{action} failed for beacon malfunction {res.request.item_id}: "
+            f"{res.error}"
+        )
+    logger.info(
+        f"{action} : {len(results) - len(failed)} requests succeeded, "
+        f"{len(failed)} failed."
+    )
+
+    return results
+
+
+@task(checkpoint=False)
+def update_beacon_malfunctions(
+    beacon_malfunction_ids: List[int],
+    *,
+    new_stage: BeaconMalfunctionStage = None,
+    new_vessel_status: BeaconMalfunctionVesselStatus = None,
+    end_of_malfunction_reason: EndOfMalfunctionReason = None,
+) -> List[ApiResult]:
+    """Update the stage or vessel status of `beacon_malfunction_ids` through the
+    backend API. See `make_beacon_malfunction_update` for the accepted arguments.
+
+    Updates are sent in a batch : updates that fail are reported in the results and
+    do not prevent the others from being made.
+
+    Returns:
+        List[ApiResult]: results of the updates
+    """
+    api_requests = [
+        make_beacon_malfunction_update(
+            beacon_malfunction_id,
+            new_stage=new_stage,
+            new_vessel_status=new_vessel_status,
+            end_of_malfunction_reason=end_of_malfunction_reason,
+        )
+        for beacon_malfunction_id in beacon_malfunction_ids
+    ]
+    return send_api_requests(api_requests, action="Beacon malfunctions update")
+
+
+@task(checkpoint=False)
+def request_notifications(
+    update_results: List[ApiResult],
+    requested_notification: BeaconMalfunctionNotificationType,
+) -> List[ApiResult]:
+    """Request a notification for each beacon malfunction that was successfully
+    updated in `update_results`.
+
+    Returns:
+        List[ApiResult]: results of the notification requests
+    """
+    api_requests = [
+        make_notification_request(res.request.item_id, requested_notification)
+        for res in update_results
+        if res.ok
+    ]
+    return send_api_requests(api_requests, action="Notification requests")
+
+
+@task(checkpoint=False)
+def check_api_results(results: List[List[ApiResult]]):
+    """
+    Raises if any of the requests sent to the backend API failed, once all requests
+    have been sent.
+
+    Args:
+        results (List[List[ApiResult]]): results of batches of requests
+
+    Raises:
+        BackendApiError: if any request failed
+    """
+    failed = [res for batch_results in results for res in batch_results if not res.ok]
+    if failed:
+        raise BackendApiError(
+            f"{len(failed)} requests to the backend API failed, for beacon "
+            f"malfunctions {sorted({res.request.item_id for res in failed})}."
+        )
 
 
 with Flow("Beacons malfunctions", executor=LocalDaskExecutor()) as flow:
@@ -542,60 +643,57 @@ with Flow("Beacons malfunctions", executor=LocalDaskExecutor()) as flow:
         # vessel_status of the malfunction) - that is, in a status of AT_SEA,
         # ACTIVITY_DETECTED... anything by AT_PORT - are moved to END_OF_MALFUNCTION.
         # Notification is left to be done manually after a human check.
-        update_beacon_malfunction.map(
+        not_at_port_restarted_emitting_updates = update_beacon_malfunctions(
             ids_not_at_port_restarted_emitting,
-            new_stage=unmapped(BeaconMalfunctionStage.END_OF_MALFUNCTION),
-            end_of_malfunction_reason=unmapped(
-                EndOfMalfunctionReason.RESUMED_TRANSMISSION
-            ),
+            new_stage=BeaconMalfunctionStage.END_OF_MALFUNCTION,
+            end_of_malfunction_reason=EndOfMalfunctionReason.RESUMED_TRANSMISSION,
         )
 
         # Malfunctions "at port" (or supposed to be, according to the latest
         # vessel_status of the malfunction) and malfunctions of unsupervised beacons
         # are moved to ARCHIVED and automatically notified.
-        ids_at_port_restarted_emitting_updated = update_beacon_malfunction.map(
+        at_port_restarted_emitting_updates = update_beacon_malfunctions(
             ids_at_port_restarted_emitting,
-            new_stage=unmapped(BeaconMalfunctionStage.ARCHIVED),
-            end_of_malfunction_reason=unmapped(
-                EndOfMalfunctionReason.RESUMED_TRANSMISSION
-            ),
-        )
-
-        ids_at_port_restarted_emitting_updated = filter_results(
-            ids_at_port_restarted_emitting_updated
+            new_stage=BeaconMalfunctionStage.ARCHIVED,
+            end_of_malfunction_reason=EndOfMalfunctionReason.RESUMED_TRANSMISSION,
         )
 
-        request_notification.map(
-            ids_at_port_restarted_emitting_updated,
-            unmapped(BeaconMalfunctionNotificationType.END_OF_MALFUNCTION),
+        at_port_restarted_emitting_notifications = request_notifications(
+            at_port_restarted_emitting_updates,
+            BeaconMalfunctionNotificationType.END_OF_MALFUNCTION,
         )
 
-        ids_unsupervised_restarted_emitting_updated = update_beacon_malfunction.map(
+        unsupervised_restarted_emitting_updates = update_beacon_malfunctions(
             ids_unsupervised_restarted_emitting,
-            new_stage=unmapped(BeaconMalfunctionStage.ARCHIVED),
-            end_of_malfunction_reason=unmapped(
-                EndOfMalfunctionReason.RESUMED_TRANSMISSION
-            ),
+            new_stage=BeaconMalfunctionStage.ARCHIVED,
+            end_of_malfunction_reason=EndOfMalfunctionReason.RESUMED_TRANSMISSION,
         )
 
-        ids_unsupervised_restarted_emitting_updated = filter_results(
-            ids_unsupervised_restarted_emitting_updated
-        )
-
-        request_notification.map(
-            ids_unsupervised_restarted_emitting_updated,
-            unmapped(BeaconMalfunctionNotificationType.END_OF_MALFUNCTION),
+        unsupervised_restarted_emitting_notifications = request_notifications(
+            unsupervised_restarted_emitting_updates,
+            BeaconMalfunctionNotificationType.END_OF_MALFUNCTION,
         )
 
         # Malfunctions for which the beacon has been deactivated or completely
         # unequipped are just archived.
-        update_beacon_malfunction.map(
+        not_required_to_emit_updates = update_beacon_malfunctions(
             ids_not_required_to_emit,
-            new_stage=unmapped(BeaconMalfunctionStage.ARCHIVED),
-            end_of_malfunction_reason=unmapped(
+            new_stage=BeaconMalfunctionStage.ARCHIVED,
+            end_of_malfunction_reason=(
                 EndOfMalfunctionReason.BEACON_DEACTIVATED_OR_UNEQUIPPED
             ),
         )
 
+        check_api_results(
+            [
+                not_at_port_restarted_emitting_updates,
+                at_port_restarted_emitting_updates,
+                at_port_restarted_emitting_notifications,
+                unsupervised_restarted_emitting_updates,
+                unsupervised_restarted_emitting_notifications,
+                not_required_to_emit_updates,
+            ]
+        )
+
 
 flow.file_name = Path(__file__).name
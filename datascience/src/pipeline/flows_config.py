@@ -124,10 +124,18 @@ foreign_fmcs.flow.schedule = CronSchedule("37 10 * * *")
 infractions.flow.schedule = CronSchedule("1 8 * * *")
 last_positions.flow.schedule = Schedule(
     clocks=[
+        # Full reconciliation every 10 minutes, incremental updates in between.
+        # Incremental runs only refresh vessels that have moved, so the risk factors,
+        # alerts, reportings, beacon malfunctions and estimated current positions of
+        # vessels that have not moved are up to 10 minutes stale.
         clocks.CronClock(
-            "* * * * *",
+            "*/10 * * * *",
             parameter_defaults={"minutes": 1440, "action": "update"},
-        )
+        ),
+        clocks.CronClock(
+            "1-9,11-19,21-29,31-39,41-49,51-59 * * * *",
+            parameter_defaults={"minutes": 1440, "action": "incremental"},
+        ),
     ]
 )
 missing_far_alerts.flow.schedule = Schedule(
@@ -186,74 +194,72 @@ position_alerts.flow.schedule = Schedule(
         clocks.CronClock(
             "1,11,21,31,41,51 * * * *",
             parameter_defaults={
-                "alert_type": "THREE_MILES_TRAWLING_ALERT",
-                "alert_config_name": "THREE_MILES_TRAWLING_ALERT",
-                "zones": ["0-3"],
-                "hours_from_now": 8,
-                "only_fishing_positions": True,
-                "fishing_gear_categories": ["Chaluts"],
-                "include_vessels_unknown_gear": True,
-            },
-        ),
-        clocks.CronClock(
-            "2,12,22,32,42,52 * * * *",
-            parameter_defaults={
-                "alert_type": "FRENCH_EEZ_FISHING_ALERT",
-                "alert_config_name": "FRENCH_EEZ_FISHING_ALERT",
-                "zones": ["FRA"],
-                "hours_from_now": 8,
-                "only_fishing_positions": True,
-                "except_flag_states": list(
-                    set(
-                        european_union_country_codes_iso_2
-                        + french_vessels_country_codes_iso_2
-                        + ["VE"]
-                    )
-                ),
-            },
-        ),
-        clocks.CronClock(
-            "3,13,23,33,43,53 * * * *",
-            parameter_defaults={
-                "alert_type": "TWELVE_MILES_FISHING_ALERT",
-                "alert_config_name": "TWELVE_MILES_FISHING_ALERT_BE_NL",
-                "zones": ["0-12_MINUS_BE_AND_NL_FISHING_AREAS"],
-                "hours_from_now": 8,
-                "only_fishing_positions": True,
-                "flag_states": ["BE", "NL"],
-            },
-        ),
-        clocks.CronClock(
-            "4,14,24,34,44,54 * * * *",
-            parameter_defaults={
-                "alert_type": "TWELVE_MILES_FISHING_ALERT",
-                "alert_config_name": "TWELVE_MILES_FISHING_ALERT_ES",
-                "zones": ["0-12_MINUS_ES_FISHING_AREAS"],
-                "hours_from_now": 8,
-                "only_fishing_positions": True,
-                "flag_states": ["ES"],
-            },
-        ),
-        clocks.CronClock(
-            "5,15,25,35,45,55 * * * *",
-            parameter_defaults={
-                "alert_type": "TWELVE_MILES_FISHING_ALERT",
-                "alert_config_name": "TWELVE_MILES_FISHING_ALERT_DE",
-                "zones": ["0-12_MINUS_DE_FISHING_AREAS"],
-                "hours_from_now": 8,
-                "only_fishing_positions": True,
-                "flag_states": ["DE"],
-            },
-        ),
-        clocks.CronClock(
-            "6,16,26,36,46,56 * * * *",
-            parameter_defaults={
-                "alert_type": "TWELVE_MILES_FISHING_ALERT",
-                "alert_config_name": "TWELVE_MILES_FISHING_ALERT_OTHERS",
-                "zones": ["0-3", "3-6", "6-12", "0-12"],
-                "hours_from_now": 8,
-                "only_fishing_positions": True,
-                "except_flag_states": ["FR", "PF", "VE", "BE", "NL", "DE", "ES"],
+                "engine": "sql",
+                "alert_configs": [
+                    {
+                        "alert_type": "THREE_MILES_TRAWLING_ALERT",
+                        "alert_config_name": "THREE_MILES_TRAWLING_ALERT",
+                        "zones": ["0-3"],
+                        "hours_from_now": 8,
+                        "only_fishing_positions": True,
+                        "fishing_gear_categories": ["Chaluts"],
+                        "include_vessels_unknown_gear": True,
+                    },
+                    {
+                        "alert_type": "FRENCH_EEZ_FISHING_ALERT",
+                        "alert_config_name": "FRENCH_EEZ_FISHING_ALERT",
+                        "zones": ["FRA"],
+                        "hours_from_now": 8,
+                        "only_fishing_positions": True,
+                        "except_flag_states": list(
+                            set(
+                                european_union_country_codes_iso_2
+                                + french_vessels_country_codes_iso_2
+                                + ["VE"]
+                            )
+                        ),
+                    },
+                    {
+                        "alert_type": "TWELVE_MILES_FISHING_ALERT",
+                        "alert_config_name": "TWELVE_MILES_FISHING_ALERT_BE_NL",
+                        "zones": ["0-12_MINUS_BE_AND_NL_FISHING_AREAS"],
+                        "hours_from_now": 8,
+                        "only_fishing_positions": True,
+                        "flag_states": ["BE", "NL"],
+                    },
+                    {
+                        "alert_type": "TWELVE_MILES_FISHING_ALERT",
+                        "alert_config_name": "TWELVE_MILES_FISHING_ALERT_ES",
+                        "zones": ["0-12_MINUS_ES_FISHING_AREAS"],
+                        "hours_from_now": 8,
+                        "only_fishing_positions": True,
+                        "flag_states": ["ES"],
+                    },
+                    {
+                        "alert_type": "TWELVE_MILES_FISHING_ALERT",
+                        "alert_config_name": "TWELVE_MILES_FISHING_ALERT_DE",
+                        "zones": ["0-12_MINUS_DE_FISHING_AREAS"],
+                        "hours_from_now": 8,
+                        "only_fishing_positions": True,
+                        "flag_states": ["DE"],
+                    },
+                    {
+                        "alert_type": "TWELVE_MILES_FISHING_ALERT",
+                        "alert_config_name": "TWELVE_MILES_FISHING_ALERT_OTHERS",
+                        "zones": ["0-3", "3-6", "6-12", "0-12"],
+                        "hours_from_now": 8,
+                        "only_fishing_positions": True,
+                        "except_flag_states": [
+                            "FR",
+                            "PF",
+                            "VE",
+                            "BE",
+                            "NL",
+                            "DE",
+                            "ES",
+                        ],
+                    },
+                ],
             },
         ),
     ]
@@ -1,20 +1,26 @@
 import logging
+import sys
+from contextlib import nullcontext
 from pathlib import Path
-from typing import List, Union
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Union
 
 import geopandas as gpd
 import pandas as pd
 from prefect import task
-from sqlalchemy import DDL
+from sqlalchemy import DDL, Table
 from sqlalchemy.engine import Connection
 from sqlalchemy.sql import Select
 
 from src.db_config import create_engine
 from src.pipeline import utils
 from src.pipeline.processing import prepare_df_for_loading
-from src.pipeline.utils import get_table, psql_insert_copy
+from src.pipeline.utils import get_table, psql_insert_copy, psql_insert_copy_binary
 from src.read_query import read_query, read_saved_query
 
+# pyarrow is an optional dependency, only imported when arrow data is used
+if TYPE_CHECKING:
+    import pyarrow as pa
+
 
 def extract(
     db_name: str,
@@ -81,8 +87,104 @@ def extract(
     return res
 
 
+def extract_batches(
+    db_name: str,
+    query_filepath: Union[Path, str],
+    *,
+    batch_size: int = 100000,
+    dtypes: Union[None, dict] = None,
+    parse_dates: Union[list, dict, None] = None,
+    params=None,
+    backend: str = "pandas",
+    geom_col: str = "geom",
+    crs: Union[int, None] = None,
+    output: str = "pandas",
+) -> Iterator[Union[pd.DataFrame, gpd.GeoDataFrame, "pa.RecordBatch"]]:
+    """Run SQL query against the indicated database and return the result as an
+    iterator of batches of at most `batch_size` rows.
+
+    Rows are fetched from the database with a server-side cursor as the iterator is
+    consumed, so that memory usage is bounded by the size of the batches and not by
+    the size of the query result. `dtypes` and `parse_dates` are applied to each
+    batch.
+
+    The query is only run when the first batch is requested.
+
+    Args:
+        db_name (str): name of the database to extract from : "fmc", "ocan",
+            "monitorfish_local" or "monitorfish_remote"
+        query_filepath (Union[Path, str]): path to .sql file, starting from the saved
+            queries folder. example : "ocan/nav_fr_peche.sql"
+        batch_size (int, optional): maximum number of rows of each batch. Defaults to
+            100000.
+        dtypes (Union[None, dict], optional): see `extract`. Note that with
+            `category` dtypes, the categories of each batch are those present in that
+            batch. Defaults to None.
+        parse_dates (Union[list, dict, None], optional): see `extract`. Defaults to
+            None.
+        params (Union[dict, None], optional): Parameters to pass to execute method.
+            Defaults to None.
+        backend (str, optional) : 'pandas' or 'geopandas', see `extract`. Defaults to
+            'pandas'.
+        geom_col (str, optional): see `extract`. Defaults to 'geom'.
+        crs (Union[None, str], optional) : see `extract`. Defaults to None.
+        output (str, optional) : 'pandas' to return `pandas.DataFrame` (or
+            `geopandas.GeoDataFrame`) batches, 'arrow' to return `pyarrow.RecordBatch`
+            batches. 'arrow' is not supported with the 'geopandas' backend. Defaults
+            to 'pandas'.
+
+    Returns:
+        Iterator[Union[pd.DataFrame, gpd.GeoDataFrame, pa.RecordBatch]]: batches of
+        query results
+    """
+
+    if output not in ("pandas", "arrow"):
+        raise ValueError(f"output must be 'pandas' or 'arrow', got {output}")
+
+    if output == "arrow" and backend != "pandas":
+        raise ValueError("'arrow' output is only supported with 'pandas' backend.")
+
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be a positive integer, got {batch_size}")
+
+    if output == "arrow":
+        import pyarrow as pa
+
+    def batches():
+        for batch in read_saved_query(
+            query_filepath,
+            db=db_name,
+            chunksize=batch_size,
+            parse_dates=parse_dates,
+            params=params,
+            backend=backend,
+            geom_col=geom_col,
+            crs=crs,
+        ):
+            if dtypes:
+                batch = batch.astype(dtypes)
+
+            if output == "arrow":
+                yield pa.RecordBatch.from_pandas(batch, preserve_index=False)
+            else:
+                yield batch
+
+    return batches()
+
+
+def _is_arrow_data(x) -> bool:
+    # Arrow data can only have been created if pyarrow was imported
+    pa = sys.modules.get("pyarrow")
+    return pa is not None and isinstance(x, (pa.RecordBatch, pa.Table))
+
+
 def load(
-    df: Union[pd.DataFrame, gpd.GeoDataFrame],
+    df: Union[
+        pd.DataFrame,
+        gpd.GeoDataFrame,
+        "pa.RecordBatch",
+        Iterable[Union[pd.DataFrame, gpd.GeoDataFrame, "pa.RecordBatch"]],
+    ],
     *,
     table_name: str,
     schema: str,
@@ -102,13 +204,24 @@ def load(
     init_ddls: List[DDL] = None,
     end_ddls: List[DDL] = None,
     bytea_columns: list = None,
+    copy_format: str = "csv",
+    key_columns: list = None,
 ):
     r"""
     Load a DataFrame or GeoDataFrame to a database table using sqlalchemy. The table
     must already exist in the database.
 
+    Data may also be given as an iterator of DataFrames or arrow `RecordBatch`, like
+    the ones returned by `extract_batches`. Batches are then prepared and loaded one
+    at a time in a single transaction, so that memory usage is bounded by the size of
+    the batches.
+
     Args:
-        df (Union[pd.DataFrame, gpd.GeoDataFrame]): data to load
+        df (Union[pd.DataFrame, gpd.GeoDataFrame, pa.RecordBatch, Iterable]): data to
+          load, or iterable of batches of data to load. With 'replace', the table is
+          emptied before the first batch, with 'upsert' the rows of the table
+          whose ids are in a batch are replaced by the rows of that batch, and with
+          'diff' the table is made equal to the union of all batches.
         table_name (str): name of the table
         schema (str): database schema of the table
         logger (logging.Logger): logger instance
@@ -118,6 +231,11 @@ def load(
           - 'append' to append the data to rows already in the table
           - 'upsert' to append the rows to the table, replacing the rows whose id is
             already
+          - 'diff' to replace the contents of the table like 'replace', but only
+            deleting, updating and inserting the rows that differ between the data
+            and the table, which are matched using `key_columns`. This avoids
+            rewriting all rows of tables whose contents change little between two
+            loads. See `utils.apply_diff`.
 
         db_name (str, optional): Required if a `connection` is not provided.
           'monitorfish_remote', 'monitorenv_remote' or 'monitorfish_local'.
@@ -169,50 +287,167 @@ def load(
                 - 'c1' for 11000001
 
             - the Postgresql hex string will be '\x59c1'
+
+        copy_format (str): format used to transfer data to Postgresql with the
+          `COPY` command, for DataFrames (GeoDataFrames are always loaded with
+          `to_postgis`). One of :
+
+            - 'csv' (the default) : values are serialized as strings in the
+              formats described above before being written as CSV
+            - 'binary' : values are encoded natively according to the types of the
+              table's columns, which saves serialization time and payload size on
+              large DataFrames. `pg_array_columns`, `nullable_integer_columns`,
+              `timedelta_columns` and `bytea_columns` are then not needed, and
+              `value_on_array_conversion_error` must be '{}' or None. See
+              `src.pipeline.binary_copy`.
+
+        key_columns (list, optional): names of the columns that identify rows, in the
+          data and in the table. Required if `how` is "diff".
     """
 
-    df = prepare_df_for_loading(
-        df,
-        logger,
-        pg_array_columns=pg_array_columns,
-        handle_array_conversion_errors=handle_array_conversion_errors,
-        value_on_array_conversion_error=value_on_array_conversion_error,
-        jsonb_columns=jsonb_columns,
-        nullable_integer_columns=nullable_integer_columns,
-        timedelta_columns=timedelta_columns,
-        enum_columns=enum_columns,
-        bytea_columns=bytea_columns,
-    )
+    if copy_format not in ("csv", "binary"):
+        raise ValueError(f"copy_format must be 'csv' or 'binary', got {copy_format}")
+
+    if how == "diff" and not key_columns:
+        raise ValueError("key_columns cannot be null if how='diff'")
+
+    def prepare(batch):
+        if _is_arrow_data(batch):
+            batch = batch.to_pandas()
+
+        if copy_format == "csv":
+            return prepare_df_for_loading(
+                batch,
+                logger,
+                pg_array_columns=pg_array_columns,
+                handle_array_conversion_errors=handle_array_conversion_errors,
+                value_on_array_conversion_error=value_on_array_conversion_error,
+                jsonb_columns=jsonb_columns,
+                nullable_integer_columns=nullable_integer_columns,
+                timedelta_columns=timedelta_columns,
+                enum_columns=enum_columns,
+                bytea_columns=bytea_columns,
+            )
+        elif enum_columns:
+            return prepare_df_for_loading(batch, logger, enum_columns=enum_columns)
+        else:
+            return batch
+
+    if isinstance(df, pd.DataFrame) or _is_arrow_data(df):
+        batches = [df]
+    else:
+        batches = df
 
     if connection is None:
-        e = create_engine(db_name)
-        with e.begin() as connection:
-            load_with_connection(
-                df=df,
-                connection=connection,
+        connection_context = create_engine(db_name).begin()
+    else:
+        connection_context = nullcontext(connection)
+
+    with connection_context as connection:
+        if how == "diff":
+            _load_diff(
+                (prepare(batch) for batch in batches),
                 table_name=table_name,
                 schema=schema,
+                connection=connection,
                 logger=logger,
-                how=how,
-                table_id_column=table_id_column,
-                df_id_column=df_id_column,
+                key_columns=key_columns,
                 init_ddls=init_ddls,
-                end_ddls=end_ddls,
+                copy_format=copy_format,
+                jsonb_columns=jsonb_columns,
+                handle_array_conversion_errors=handle_array_conversion_errors,
+                value_on_array_conversion_error=value_on_array_conversion_error,
             )
-    else:
-        load_with_connection(
-            df=df,
+        else:
+            n_batches = 0
+            for batch in batches:
+                # The table is emptied (in 'replace' mode) and `init_ddls` are run
+                # before the first batch only
+                load_with_connection(
+                    df=prepare(batch),
+                    connection=connection,
+                    table_name=table_name,
+                    schema=schema,
+                    logger=logger,
+                    how=how if (n_batches == 0 or how != "replace") else "append",
+                    table_id_column=table_id_column,
+                    df_id_column=df_id_column,
+                    init_ddls=init_ddls if n_batches == 0 else None,
+                    copy_format=copy_format,
+                    jsonb_columns=jsonb_columns,
+                    handle_array_conversion_errors=handle_array_conversion_errors,
+                    value_on_array_conversion_error=value_on_array_conversion_error,
+                )
+                n_batches += 1
+
+            if n_batches == 0:
+                logger.info("No data to load.")
+                if init_ddls:
+                    for ddl in init_ddls:
+                        connection.execute(ddl)
+                if how == "replace":
+                    utils.delete(
+                        get_table(table_name, schema, connection, logger),
+                        connection,
+                        logger,
+                    )
+
+        if end_ddls:
+            for ddl in end_ddls:
+                connection.execute(ddl)
+
+
+def _load_diff(
+    batches: Iterable[Union[pd.DataFrame, gpd.GeoDataFrame]],
+    *,
+    table_name: str,
+    schema: str,
+    connection: Connection,
+    logger: logging.Logger,
+    key_columns: list,
+    init_ddls: List[DDL] = None,
+    copy_format: str = "csv",
+    jsonb_columns: list = None,
+    handle_array_conversion_errors: bool = True,
+    value_on_array_conversion_error: str = "{}",
+):
+    """
+    Makes the contents of the table equal to the union of the prepared `batches`, by
+    loading them into a staging table which is then compared to the table. See
+    `load` with `how='diff'` for the arguments.
+    """
+    # All changes are made in the current transaction, so that readers see either the
+    # previous or the new contents of the table.
+    if init_ddls:
+        for ddl in init_ddls:
+            connection.execute(ddl)
+    table = get_table(table_name, schema, connection, logger)
+    staging_table = utils.create_staging_table(table, connection)
+    columns = [c.name for c in table.columns]
+
+    for i, batch in enumerate(batches):
+        if i == 0:
+            columns = list(batch.columns)
+        insert_with_connection(
+            batch,
+            table=staging_table,
             connection=connection,
-            table_name=table_name,
-            schema=schema,
             logger=logger,
-            how=how,
-            table_id_column=table_id_column,
-            df_id_column=df_id_column,
-            init_ddls=init_ddls,
-            end_ddls=end_ddls,
+            copy_format=copy_format,
+            jsonb_columns=jsonb_columns,
+            handle_array_conversion_errors=handle_array_conversion_errors,
+            value_on_array_conversion_error=value_on_array_conversion_error,
         )
 
+    utils.apply_diff(
+        table,
+        staging_table,
+        columns=columns,
+        key_columns=key_columns,
+        connection=connection,
+        logger=logger,
+    )
+
 
 def load_with_connection(
     df: Union[pd.DataFrame, gpd.GeoDataFrame],
@@ -226,6 +461,10 @@ def load_with_connection(
     df_id_column: Union[None, str] = None,
     init_ddls: List[DDL] = None,
     end_ddls: List[DDL] = None,
+    copy_format: str = "csv",
+    jsonb_columns: list = None,
+    handle_array_conversion_errors: bool = True,
+    value_on_array_conversion_error: str = "{}",
 ):
     if init_ddls:
         for ddl in init_ddls:
@@ -266,6 +505,36 @@ def load_with_connection(
         raise ValueError(f"how must be 'replace', 'upsert' or 'append', got {how}")
 
     # Insert data into table
+    insert_with_connection(
+        df,
+        table=table,
+        connection=connection,
+        logger=logger,
+        copy_format=copy_format,
+        jsonb_columns=jsonb_columns,
+        handle_array_conversion_errors=handle_array_conversion_errors,
+        value_on_array_conversion_error=value_on_array_conversion_error,
+    )
+
+    if end_ddls:
+        for ddl in end_ddls:
+            connection.execute(ddl)
+
+
+def insert_with_connection(
+    df: Union[pd.DataFrame, gpd.GeoDataFrame],
+    *,
+    table: Table,
+    connection: Connection,
+    logger: logging.Logger,
+    copy_format: str = "csv",
+    jsonb_columns: list = None,
+    handle_array_conversion_errors: bool = True,
+    value_on_array_conversion_error: str = "{}",
+):
+    """Inserts the rows of `df` into `table`. See `load` for the arguments."""
+    table_name = table.name
+    schema = table.schema
     logger.info(
         f"Loading {len(df)} row{'s' if len(df) > 1 else ''} into {schema}.{table_name}"
     )
@@ -280,6 +549,16 @@ def load_with_connection(
             if_exists="append",
         )
 
+    elif isinstance(df, pd.DataFrame) and copy_format == "binary":
+        psql_insert_copy_binary(
+            df,
+            table,
+            connection,
+            jsonb_columns=jsonb_columns,
+            handle_array_conversion_errors=handle_array_conversion_errors,
+            value_on_array_conversion_error=value_on_array_conversion_error,
+        )
+
     elif isinstance(df, pd.DataFrame):
         df.to_sql(
             name=table_name,
@@ -293,10 +572,6 @@ def load_with_connection(
     else:
         raise ValueError("df must be DataFrame or GeoDataFrame.")
 
-    if end_ddls:
-        for ddl in end_ddls:
-            connection.execute(ddl)
-
 
 def delete_rows(
     *,
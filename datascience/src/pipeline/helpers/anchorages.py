@@ -0,0 +1,137 @@
+import threading
+from typing import Union
+
+import numpy as np
+
+from config import ANCHORAGES_INDEX_MIN_H3_CELLS
+from src.pipeline.helpers.spatial import h3_cells_to_strings, h3_strings_to_cells
+from src.read_query import read_saved_query
+
+
+class AnchoragesIndex:
+    """
+    In-memory index of the h3 cells of the `anchorages` table, used to test whether
+    positions are located in a port or anchorage area without querying the database
+    with the h3 cells of all positions.
+
+    The h3 cells are held as a sorted array of integers, against which membership
+    tests are run with a vectorized binary search.
+
+    Flow runs each run in a fresh process, so the index only lives for the duration
+    of a flow run. Loading the h3 cells of all anchorages costs more than querying the
+    database with the h3 cells of a few positions, so `is_anchorage` only loads the
+    index for inputs spanning at least `ANCHORAGES_INDEX_MIN_H3_CELLS` h3 cells, or
+    when it is already loaded.
+
+    Once loaded, calls to `refresh` only query the version of the `anchorages`
+    table, which is incremented by a trigger on each modification of the table, and
+    reload the h3 cells if and only if the table was modified since the last load.
+
+    Instances are thread-safe and can be shared between the tasks of flows run with
+    `LocalDaskExecutor`.
+
+    Args:
+        db_name (str): name of the database to load anchorages from. Defaults to
+          "monitorfish_remote".
+    """
+
+    def __init__(self, db_name: str = "monitorfish_remote"):
+        self.db_name = db_name
+        self.version = None
+        self.h3_cells = np.array([], dtype=np.uint64)
+        self._lock = threading.Lock()
+
+    def get_version(self) -> Union[int, None]:
+        """
+        Returns the current version of the `anchorages` table, as maintained in the
+        `anchorages_version` table. Any modification of the `anchorages` table yields
+        a different version.
+        """
+        version = read_saved_query(
+            "monitorfish/anchorages_version.sql", db=self.db_name
+        )
+        return int(version.version.iloc[0]) if len(version) > 0 else None
+
+    def load(self, version: Union[int, None] = None):
+        """
+        (Re)loads the h3 cells of anchorages from the database.
+
+        Args:
+            version (int, optional): version of the table to store along with the
+              loaded cells. Defaults to None.
+        """
+        anchorages = read_saved_query("monitorfish/anchorages_h3.sql", db=self.db_name)
+        self.h3_cells = np.sort(h3_strings_to_cells(anchorages["h3"]))
+        self.version = version
+
+    def refresh(self) -> "AnchoragesIndex":
+        """
+        Reloads the h3 cells of anchorages if the `anchorages` table was modified
+        since they were last loaded, or if they were never loaded.
+
+        Returns:
+            AnchoragesIndex: the index itself, up to date with the database
+        """
+        version = self.get_version()
+
+        with self._lock:
+            if self.version is None or version != self.version:
+                self.load(version=version)
+
+        return self
+
+    def contains(self, h3_cells: np.ndarray) -> np.ndarray:
+        """
+        Tests the membership of the input h3 cells in the index.
+
+        Args:
+            h3_cells (np.ndarray): 1d array of h3 cells in integer representation, as
+              returned by `get_h3_cells`
+
+        Returns:
+            np.ndarray: 1d boolean array, `True` for h3 cells that are anchorages
+        """
+        anchorages_h3_cells = self.h3_cells
+        h3_cells = np.asarray(h3_cells, dtype=np.uint64)
+
+        if len(anchorages_h3_cells) == 0:
+            return np.zeros(len(h3_cells), dtype=bool)
+
+        idx = np.searchsorted(anchorages_h3_cells, h3_cells)
+        idx = np.minimum(idx, len(anchorages_h3_cells) - 1)
+        return anchorages_h3_cells[idx] == h3_cells
+
+    def is_anchorage(self, h3_cells: np.ndarray) -> np.ndarray:
+        """
+        Tests whether the input h3 cells are anchorages.
+
+        If the index is not loaded and the input has fewer than
+        `ANCHORAGES_INDEX_MIN_H3_CELLS` distinct h3 cells, the `anchorages` table is
+        queried with the input h3 cells. Otherwise the index is refreshed and the
+        membership test is run in memory.
+
+        Args:
+            h3_cells (np.ndarray): 1d array of h3 cells in integer representation, as
+              returned by `get_h3_cells`
+
+        Returns:
+            np.ndarray: 1d boolean array, `True` for h3 cells that are anchorages
+        """
+        h3_cells = np.asarray(h3_cells, dtype=np.uint64)
+        unique_h3_cells = np.unique(h3_cells)
+
+        if (
+            self.version is None
+            and len(unique_h3_cells) < ANCHORAGES_INDEX_MIN_H3_CELLS
+        ):
+            anchorages = read_saved_query(
+                "monitorfish/h3_is_anchorage.sql",
+                db=self.db_name,
+                params={"h3_cells": tuple(h3_cells_to_strings(unique_h3_cells))},
+            )
+            return np.isin(h3_cells, h3_strings_to_cells(anchorages["h3"]))
+
+        return self.refresh().contains(h3_cells)
+
+
+anchorages_index = AnchoragesIndex()
@@ -0,0 +1,148 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    BACKEND_API_KEY,
+    BACKEND_API_MAX_CONCURRENT_REQUESTS,
+    BACKEND_API_TIMEOUT_SECONDS,
+)
+
+
+@dataclass
+class ApiRequest:
+    """
+    Request to send to the backend API.
+
+    Args:
+        method (str): HTTP method
+        url (str): url of the request
+        json (dict, optional): json body of the request. Defaults to None.
+        headers (dict, optional): headers of the request, in addition to the client's
+          headers. Defaults to None.
+        item_id (Any, optional): identifier of the item the request is about, used
+          to report the result of the request. Defaults to None.
+    """
+
+    method: str
+    url: str
+    json: Optional[dict] = None
+    headers: Optional[dict] = None
+    item_id: Any = None
+
+
+@dataclass
+class ApiResult:
+    """
+    Result of an `ApiRequest`: the response's status code, if a response was
+    received, and the error that occurred, if any.
+    """
+
+    request: ApiRequest
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class BackendApiClient:
+    """
+    Client of the backend API, which sends requests on a keep-alive session.
+
+    Batches of requests are sent concurrently from a pool of threads, each with a
+    timeout. Requests that fail are reported in their `ApiResult` and do not prevent
+    the other requests of the batch from being sent.
+
+    Args:
+        api_key (str, optional): key of the backend API. Defaults to
+          `BACKEND_API_KEY`.
+        max_concurrent_requests (int, optional): maximum number of requests in
+          flight. Defaults to `BACKEND_API_MAX_CONCURRENT_REQUESTS`.
+        timeout (float, optional): timeout of each request, in seconds. Defaults to
+          `BACKEND_API_TIMEOUT_SECONDS`.
+    """
+
+    def __init__(
+        self,
+        api_key: str = BACKEND_API_KEY,
+        max_concurrent_requests: int = BACKEND_API_MAX_CONCURRENT_REQUESTS,
+        timeout: float = BACKEND_API_TIMEOUT_SECONDS,
+    ):
+        self.max_concurrent_requests = max_concurrent_requests
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent_requests)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"X-API-KEY": api_key})
+
+    def send(self, request: ApiRequest) -> ApiResult:
+        """
+        Sends `request` and returns its result. Connection errors, timeouts and
+        error status codes are reported in the result rather than raised.
+        """
+        try:
+            r = self.session.request(
+                request.method,
+                request.url,
+                json=request.json,
+                headers=request.headers,
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            return ApiResult(request=request, error=f"{type(e).__name__}: {e}")
+
+        try:
+            r.raise_for_status()
+        except requests.HTTPError as e:
+            return ApiResult(request=request, status_code=r.status_code, error=str(e))
+
+        return ApiResult(request=request, status_code=r.status_code)
+
+    def send_batch(self, requests_: List[ApiRequest]) -> List[ApiResult]:
+        """
+        Sends `requests_` concurrently and returns their results, in the same order.
+        """
+        if len(requests_) <= 1:
+            return [self.send(request) for request in requests_]
+
+        n_threads = min(self.max_concurrent_requests, len(requests_))
+        with ThreadPoolExecutor(n_threads) as executor:
+            return list(executor.map(self.send, requests_))
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_backend_api_client() -> BackendApiClient:
+    """
+    Returns the backend API client, creating it on first use. The client is shared
+    by all flows run in the same process, so that connections to the backend are
+    reused.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = BackendApiClient()
+        return _client
+
+
+def _reset_after_fork():
+    # The session's connections belong to the parent process
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,6 +1,8 @@
 import email
 import io
+import os
 import smtplib
+import threading
 from email.message import EmailMessage
 from enum import Enum
 from logging import Logger
@@ -12,9 +14,10 @@ from smtplib import (
     SMTPNotSupportedError,
     SMTPRecipientsRefused,
     SMTPSenderRefused,
+    SMTPServerDisconnected,
 )
-from time import sleep
-from typing import List, Union
+from time import monotonic, sleep
+from typing import Dict, List, Tuple, Union
 
 import pypdf
 
@@ -28,6 +31,10 @@ from config import (
     MONITORFISH_SMS_DOMAIN,
     MONITORFISH_SMS_SERVER_PORT,
     MONITORFISH_SMS_SERVER_URL,
+    SMTP_CONNECTION_MAX_IDLE_SECONDS,
+    SMTP_POOL_MAX_CONNECTIONS,
+    SMTP_RETRY_BACKOFF_SECONDS,
+    SMTP_SEND_MAX_ATTEMPTS,
 )
 
 
@@ -223,10 +230,182 @@ def create_fax_email(
     return msg
 
 
+class SmtpConnectionPool:
+    """
+    Pool of connections to an SMTP server, which are kept open to send successive
+    messages rather than opening a new connection for each message.
+
+    At most `max_connections` messages are sent at once, each on its own connection.
+    Connections are returned to the pool after each message. They are closed if an
+    error occurs during sending, or if they were left idle for longer than
+    `max_idle_seconds`, as the server may have closed them in the meantime.
+
+    Messages which fail to be sent because of a connection or server error are sent
+    again on a new connection, up to `max_attempts` times, with exponential backoff
+    between attempts. Backoff waits do not hold a connection slot, so other messages
+    keep being sent in the meantime.
+
+    Args:
+        host (str): SMTP server host
+        port (Union[int, str]): SMTP server port
+        max_connections (int, optional): maximum number of simultaneous connections.
+          Defaults to `SMTP_POOL_MAX_CONNECTIONS`.
+        max_idle_seconds (float, optional): duration after which idle connections
+          are closed. Defaults to `SMTP_CONNECTION_MAX_IDLE_SECONDS`.
+        max_attempts (int, optional): maximum number of attempts to send each
+          message. Defaults to `SMTP_SEND_MAX_ATTEMPTS`.
+        retry_backoff_seconds (float, optional): wait before the first retry, doubled
+          before each following retry. Defaults to `SMTP_RETRY_BACKOFF_SECONDS`.
+    """
+
+    retryable_errors = (
+        SMTPHeloError,
+        SMTPDataError,
+        SMTPServerDisconnected,
+        ConnectionError,
+    )
+
+    def __init__(
+        self,
+        host: str,
+        port: Union[int, str],
+        max_connections: int = SMTP_POOL_MAX_CONNECTIONS,
+        max_idle_seconds: float = SMTP_CONNECTION_MAX_IDLE_SECONDS,
+        max_attempts: int = SMTP_SEND_MAX_ATTEMPTS,
+        retry_backoff_seconds: float = SMTP_RETRY_BACKOFF_SECONDS,
+    ):
+        self.host = host
+        self.port = port
+        self.max_idle_seconds = max_idle_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def _connect(self) -> smtplib.SMTP:
+        return smtplib.SMTP(host=self.host, port=self.port)
+
+    @staticmethod
+    def _close_connection(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def _checkout(self) -> Tuple[smtplib.SMTP, bool]:
+        """
+        Returns the most recently used idle connection, if any, or a new connection,
+        along with a boolean indicating whether the connection was reused.
+        """
+        expired = []
+        server = None
+        with self._lock:
+            while self._idle:
+                idle_server, last_used = self._idle.pop()
+                if monotonic() - last_used <= self.max_idle_seconds:
+                    server = idle_server
+                    break
+                expired.append(idle_server)
+
+        for expired_server in expired:
+            self._close_connection(expired_server)
+
+        if server is not None:
+            return server, True
+        else:
+            return self._connect(), False
+
+    def _checkin(self, server: smtplib.SMTP):
+        with self._lock:
+            self._idle.append((server, monotonic()))
+
+    def _send_once(self, msg: EmailMessage) -> dict:
+        """
+        Sends `msg` on one of the pool's connections. If a reused connection turns
+        out to have been closed by the server, the message is sent again on a new
+        connection.
+        """
+        with self._slots:
+            server, reused = self._checkout()
+            try:
+                try:
+                    send_errors = server.send_message(msg)
+                except (SMTPServerDisconnected, ConnectionError):
+                    if not reused:
+                        raise
+                    server.close()
+                    server = self._connect()
+                    send_errors = server.send_message(msg)
+            except BaseException:
+                self._close_connection(server)
+                raise
+            self._checkin(server)
+        return send_errors
+
+    def send_message(self, msg: EmailMessage) -> dict:
+        """
+        Sends `msg` on one of the pool's connections, retrying with exponential
+        backoff on connection and server errors. See `send_email`.
+        """
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                sleep(self.retry_backoff_seconds * 2 ** (attempt - 1))
+            try:
+                return self._send_once(msg)
+            except self.retryable_errors:
+                if attempt == self.max_attempts - 1:
+                    raise
+
+    def close(self):
+        """
+        Closes the pool's idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close_connection(server)
+
+
+_smtp_pools: Dict[Tuple[str, str], SmtpConnectionPool] = {}
+_smtp_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(host: str, port: Union[int, str]) -> SmtpConnectionPool:
+    """
+    Returns the pool of connections to the SMTP server at `host:port`, creating it on
+    first use. Pools are shared by all flows run in the same process.
+    """
+    key = (host, str(port))
+    with _smtp_pools_lock:
+        if key not in _smtp_pools:
+            _smtp_pools[key] = SmtpConnectionPool(host, port)
+        return _smtp_pools[key]
+
+
+def close_smtp_pools():
+    with _smtp_pools_lock:
+        pools = list(_smtp_pools.values())
+        _smtp_pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def _reset_after_fork():
+    # Connections belong to the parent process
+    global _smtp_pools, _smtp_pools_lock
+    _smtp_pools = {}
+    _smtp_pools_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
 def send_email(msg: EmailMessage) -> dict:
     """
     Sends input email using the contents of `From` header as sender and `To`, `Cc`
-    and `Bcc` headers as recipients.
+    and `Bcc` headers as recipients, on a pooled connection to the email server (see
+    `SmtpConnectionPool`).
 
     This method will return normally if the mail is accepted for at least
     one recipient.  It returns a dictionary, with one entry for each
@@ -256,11 +435,9 @@ def send_email(msg: EmailMessage) -> dict:
     assert MONITORFISH_EMAIL_SERVER_URL is not None
     assert MONITORFISH_EMAIL_SERVER_PORT is not None
 
-    with smtplib.SMTP(
-        host=MONITORFISH_EMAIL_SERVER_URL, port=MONITORFISH_EMAIL_SERVER_PORT
-    ) as server:
-        send_errors = server.send_message(msg)
-    return send_errors
+    return get_smtp_pool(
+        MONITORFISH_EMAIL_SERVER_URL, MONITORFISH_EMAIL_SERVER_PORT
+    ).send_message(msg)
 
 
 def send_sms(msg: EmailMessage) -> dict:
@@ -270,11 +447,9 @@ def send_sms(msg: EmailMessage) -> dict:
     assert MONITORFISH_SMS_SERVER_URL is not None
     assert MONITORFISH_SMS_SERVER_PORT is not None
 
-    with smtplib.SMTP(
-        host=MONITORFISH_SMS_SERVER_URL, port=MONITORFISH_SMS_SERVER_PORT
-    ) as server:
-        send_errors = server.send_message(msg)
-    return send_errors
+    return get_smtp_pool(
+        MONITORFISH_SMS_SERVER_URL, MONITORFISH_SMS_SERVER_PORT
+    ).send_message(msg)
 
 
 def send_fax(msg: EmailMessage) -> dict:
@@ -285,11 +460,9 @@ def send_fax(msg: EmailMessage) -> dict:
     assert MONITORFISH_FAX_SERVER_URL is not None
     assert MONITORFISH_FAX_SERVER_PORT is not None
 
-    with smtplib.SMTP(
-        host=MONITORFISH_FAX_SERVER_URL, port=MONITORFISH_FAX_SERVER_PORT
-    ) as server:
-        send_errors = server.send_message(msg)
-    return send_errors
+    return get_smtp_pool(
+        MONITORFISH_FAX_SERVER_URL, MONITORFISH_FAX_SERVER_PORT
+    ).send_message(msg)
 
 
 def send_email_or_sms_or_fax_message(
@@ -310,17 +483,11 @@ def send_email_or_sms_or_fax_message(
     addressees = [a[1] for a in email.utils.getaddresses(addr_fields)]
 
     try:
-        try:
-            if is_integration:
-                logger.info(f"(Mock) Sending {communication_means.value.lower()}.")
-                send_errors = {}
-            else:
-                logger.info(f"Sending {communication_means.value.lower()}.")
-                send_errors = send(msg)
-        except (SMTPHeloError, SMTPDataError):
-            # Retry
-            logger.warning("Message not sent, retrying...")
-            sleep(10)
+        if is_integration:
+            logger.info(f"(Mock) Sending {communication_means.value.lower()}.")
+            send_errors = {}
+        else:
+            logger.info(f"Sending {communication_means.value.lower()}.")
             send_errors = send(msg)
     except SMTPHeloError:
         send_errors = {
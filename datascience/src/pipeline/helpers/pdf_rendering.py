@@ -0,0 +1,145 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Union
+
+import weasyprint
+from weasyprint.text.fonts import FontConfiguration
+
+from config import PDF_RENDERING_WORKERS
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+# Rendering resources, reused by all documents rendered in the process and loaded on
+# demand. Font configurations are not shared between threads, as documents may be
+# rendered in the threads of the main process.
+_fonts = threading.local()
+_image_cache = {}
+
+
+def _get_font_config() -> FontConfiguration:
+    if not hasattr(_fonts, "font_config"):
+        _fonts.font_config = FontConfiguration()
+    return _fonts.font_config
+
+
+def get_rendering_pool(n_workers: int) -> ProcessPoolExecutor:
+    """Returns the process pool used to render pdf documents, creating it on first
+    use. Flow runs each run in their own process, so the pool only lasts for one flow
+    run and must be shut down with `shutdown_rendering_pool` at the end of the run.
+
+    Worker processes are spawned rather than forked, since the flows rendering
+    documents run in threads.
+
+    Args:
+        n_workers (int): number of worker processes. If the existing pool does not
+          have this number of workers, it is replaced.
+
+    Returns:
+        ProcessPoolExecutor
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != n_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pool_workers = n_workers
+        return _pool
+
+
+def shutdown_rendering_pool():
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+        _pool = None
+        _pool_workers = None
+
+
+def _reset_after_fork():
+    # The pool's workers and management thread belong to the parent process
+    global _pool, _pool_workers, _pool_lock
+    _pool = None
+    _pool_workers = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_rendering_workers(n_documents: int) -> int:
+    """Returns the number of worker processes to use to render `n_documents`
+    documents. Starting worker processes takes longer than rendering a few documents,
+    so when there are fewer documents than `PDF_RENDERING_WORKERS`, documents are
+    rendered in the current process.
+
+    Args:
+        n_documents (int): number of documents to render
+
+    Returns:
+        int: number of worker processes, 1 to render in the current process
+    """
+    if n_documents < PDF_RENDERING_WORKERS:
+        return 1
+    return PDF_RENDERING_WORKERS
+
+
+def render_pdf(html: str, zoom: float = 1) -> bytes:
+    """Renders `html` to pdf in the current process, using the process' font
+    configuration and images cache.
+
+    Args:
+        html (str): html document
+        zoom (float, optional): zoom factor in pdf units per CSS units. Pages of
+          documents laid out with a page size of `s` have a size of `zoom * s` in the
+          resulting pdf. Defaults to 1.
+
+    Returns:
+        bytes: pdf document
+    """
+    return weasyprint.HTML(string=html).write_pdf(
+        zoom=zoom,
+        font_config=_get_font_config(),
+        cache=_image_cache,
+        optimize_size=("fonts", "images"),
+    )
+
+
+def render_pdf_in_pool(
+    html: str, zoom: float = 1, n_workers: Union[int, None] = None
+) -> bytes:
+    """Renders `html` to pdf in the pool of rendering processes. This can be called
+    from several threads at once, documents are then rendered in parallel in the
+    pool's processes.
+
+    Documents are rendered in the current process when `n_workers` is 1, or if the
+    pool breaks down.
+
+    Args:
+        html (str): html document
+        zoom (float, optional): see `render_pdf`. Defaults to 1.
+        n_workers (int, optional): number of worker processes. Defaults to
+          `PDF_RENDERING_WORKERS`.
+
+    Returns:
+        bytes: pdf document
+    """
+    n_workers = n_workers or PDF_RENDERING_WORKERS
+
+    if n_workers > 1:
+        try:
+            return get_rendering_pool(n_workers).submit(render_pdf, html, zoom).result()
+        except BrokenProcessPool:
+            logging.error("Pdf rendering pool broke down, rendering in main process.")
+            shutdown_rendering_pool()
+
+    return render_pdf(html, zoom=zoom)
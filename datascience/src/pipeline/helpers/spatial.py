@@ -1,18 +1,39 @@
+import warnings
 from dataclasses import dataclass
 from datetime import timedelta
-from typing import Iterable, Set, Tuple, Union
+from typing import Iterable, List, Sequence, Set, Tuple, Union
 from urllib.parse import quote
 
 import h3
 import numpy as np
 import pandas as pd
 import requests
+import shapely
 from pyproj import Geod
 from shapely.geometry import MultiPolygon, Polygon
 
 from config import GOOGLE_API_TOKEN, LOCATIONIQ_TOKEN
 from src.pipeline.helpers.dates import get_datetime_intervals
-from src.pipeline.processing import rows_belong_to_sequence, zeros_ones_to_bools
+from src.pipeline.processing import (
+    rows_belong_to_sequence,
+    values_belong_to_sequence,
+    zeros_ones_to_bools,
+)
+
+# `h3.unstable.vect` warns on import that its API may change. It is the only
+# vectorized h3 API available in h3 v3, the version pinned in this project.
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", UserWarning)
+    from h3.unstable import vect as h3_vect
+
+# Mean Earth radius used by h3, so that distances computed in this module match
+# those of `h3.point_dist`
+EARTH_RADIUS_KM = 6371.007180918475
+
+# WGS84 ellipsoid used for geodesic computations, built once and shared by all calls
+WGS84_GEOD = Geod(ellps="WGS84")
+
+KNOTS_TO_METERS_PER_HOUR = 1852
 
 
 @dataclass
@@ -139,6 +160,78 @@ def to_multipolygon(p: Union[Polygon, MultiPolygon]) -> MultiPolygon:
     return res
 
 
+class ZonesIndex:
+    """
+    Spatial index of zones, used to find in bulk which zones each point of a
+    (potentially large) set of points lies in.
+
+    Zones are indexed by their bounding boxes in a `shapely.STRtree` and their
+    geometries are prepared, so that evaluating points against the candidates found
+    in the tree is fast. Points on the boundary of a zone are considered to be in the
+    zone, as with PostGIS' `ST_Intersects`.
+
+    Args:
+        geometries (Sequence): shapely geometries of the zones. `None` values are
+          allowed and never match any point.
+        values (Sequence): a value associated to each zone (typically the id or the
+          name of the zone), in the same order as `geometries`
+
+    Raises:
+        ValueError: if `geometries` and `values` do not have the same length
+    """
+
+    def __init__(self, geometries: Sequence, values: Sequence):
+        geometries = np.asarray(geometries, dtype=object)
+        values = np.asarray(values, dtype=object)
+
+        if len(geometries) != len(values):
+            raise ValueError("`geometries` and `values` must have the same length.")
+
+        shapely.prepare(geometries)
+        self.geometries = geometries
+        self.values = values
+        self.tree = shapely.STRtree(geometries)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def __repr__(self):
+        return f"ZonesIndex({len(self)} zones)"
+
+    def intersects(
+        self, longitudes: Sequence, latitudes: Sequence
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds all (point, zone) pairs such that the point intersects the zone.
+
+        Args:
+            longitudes (Sequence): longitudes of points
+            latitudes (Sequence): latitudes of points, same length as `longitudes`.
+              Points with a null or non finite coordinate do not match any zone.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: indices of points and indices of zones of
+            matching pairs, sorted by point then by zone
+        """
+        longitudes = np.asarray(longitudes, dtype=float)
+        latitudes = np.asarray(latitudes, dtype=float)
+
+        valid_points_idx = np.flatnonzero(
+            np.isfinite(longitudes) & np.isfinite(latitudes)
+        )
+        points = shapely.points(
+            longitudes[valid_points_idx], latitudes[valid_points_idx]
+        )
+
+        points_idx, zones_idx = self.tree.query(points)
+        is_match = shapely.intersects(self.geometries[zones_idx], points[points_idx])
+        points_idx = valid_points_idx[points_idx[is_match]]
+        zones_idx = zones_idx[is_match]
+
+        order = np.lexsort((zones_idx, points_idx))
+        return points_idx[order], zones_idx[order]
+
+
 def estimate_current_position(
     last_latitude: float,
     last_longitude: float,
@@ -172,10 +265,11 @@ def estimate_current_position(
     if not 0 <= hours_since_last_position <= max_hours_since_last_position:
         lat, lon = None, None
     else:
-        geod = Geod(ellps="WGS84")
         try:
-            distance = speed * hours_since_last_position * 1852
-            lon, lat, _ = geod.fwd(last_longitude, last_latitude, course, distance)
+            distance = speed * hours_since_last_position * KNOTS_TO_METERS_PER_HOUR
+            lon, lat, _ = WGS84_GEOD.fwd(
+                last_longitude, last_latitude, course, distance
+            )
         except:
             if on_error == "ignore":
                 lat, lon = None, None
@@ -188,11 +282,137 @@ def estimate_current_position(
     return lat, lon
 
 
+def compute_estimated_current_positions(
+    last_latitudes: np.ndarray,
+    last_longitudes: np.ndarray,
+    courses: np.ndarray,
+    speeds: np.ndarray,
+    hours_since_last_position: np.ndarray,
+    max_hours_since_last_position: float = 2.0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized version of `estimate_current_position` : estimates the current
+    positions of vessels based on their last positions, courses and speeds.
+
+    Rows with a null or invalid input, or whose last position is older than
+    `max_hours_since_last_position` or in the future, are masked and get `NaN`
+    estimated coordinates. The geodesic computation is then run once on the
+    remaining rows.
+
+    Args:
+        last_latitudes (np.ndarray): last known latitudes of vessels
+        last_longitudes (np.ndarray): last known longitudes of vessels
+        courses (np.ndarray): last known routes of vessels in degrees
+        speeds (np.ndarray): last known speeds of vessels in knots
+        hours_since_last_position (np.ndarray): times since the last known positions
+          of vessels, in hours
+        max_hours_since_last_position (float): maximum time in hours since last
+          position, after which the estimation is not performed. Defaults to 2.0
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: estimated current latitudes and longitudes
+    """
+    last_latitudes = np.asarray(last_latitudes, dtype=float)
+    last_longitudes = np.asarray(last_longitudes, dtype=float)
+    courses = np.asarray(courses, dtype=float)
+    speeds = np.asarray(speeds, dtype=float)
+    hours_since_last_position = np.asarray(hours_since_last_position, dtype=float)
+
+    with np.errstate(invalid="ignore"):
+        valid = (
+            np.isfinite(courses)
+            & np.isfinite(speeds)
+            & (np.abs(last_latitudes) <= 90)
+            & (np.abs(last_longitudes) <= 180)
+            & (hours_since_last_position >= 0)
+            & (hours_since_last_position <= max_hours_since_last_position)
+        )
+
+    latitudes = np.full(len(last_latitudes), np.nan)
+    longitudes = np.full(len(last_latitudes), np.nan)
+
+    if valid.any():
+        distances = (
+            speeds[valid] * hours_since_last_position[valid] * KNOTS_TO_METERS_PER_HOUR
+        )
+        longitudes[valid], latitudes[valid], _ = WGS84_GEOD.fwd(
+            last_longitudes[valid], last_latitudes[valid], courses[valid], distances
+        )
+
+    return latitudes, longitudes
+
+
+def get_h3_cells(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    resolution: int = 12,
+) -> np.ndarray:
+    """
+    Returns the h3 cells corresponding to arrays of latitudes and longitudes, in
+    integer representation.
+
+    The computation is vectorized and runs on the whole arrays at once, which is much
+    faster than calling `h3.geo_to_h3` on each position. Null coordinates yield the
+    (invalid) h3 cell `0`.
+
+    Args:
+        latitudes (np.ndarray): 1d array of latitudes
+        longitudes (np.ndarray): 1d array of longitudes, with the same length as
+          `latitudes`
+        resolution (int): h3 resolution of the h3 cells to output. Defaults to 12.
+
+    Returns:
+        np.ndarray: 1d array of h3 cells with `uint64` dtype
+
+    Examples:
+        >>> get_h3_cells(np.array([45.0256]), np.array([1.2369]), resolution=9)
+        array([617422587756281855], dtype=uint64)
+    """
+    return h3_vect.geo_to_h3(latitudes, longitudes, resolution)
+
+
+def h3_cells_to_strings(h3_cells: np.ndarray) -> np.ndarray:
+    """
+    Converts an array of h3 cells in integer representation (as returned by
+    `get_h3_cells`) to an array of h3 cells in (hexadecimal) string representation.
+
+    Args:
+        h3_cells (np.ndarray): 1d array of h3 cells in integer representation
+
+    Returns:
+        np.ndarray: 1d array of h3 cells in string representation, with `object` dtype
+
+    Examples:
+        >>> h3_cells_to_strings(np.array([617422587756281855], dtype=np.uint64))
+        array(['89186928383ffff'], dtype=object)
+    """
+    return np.array([format(h, "x") for h in h3_cells.tolist()], dtype=object)
+
+
+def h3_strings_to_cells(h3_strings: Iterable[str]) -> np.ndarray:
+    """
+    Converts a sequence of h3 cells in (hexadecimal) string representation to an array
+    of h3 cells in integer representation. Inverse of `h3_cells_to_strings`.
+
+    Args:
+        h3_strings (Iterable[str]): h3 cells in string representation
+
+    Returns:
+        np.ndarray: 1d array of h3 cells with `uint64` dtype
+
+    Examples:
+        >>> h3_strings_to_cells(["89186928383ffff"])
+        array([617422587756281855], dtype=uint64)
+    """
+    return np.array([int(h, 16) for h in h3_strings], dtype=np.uint64)
+
+
 def get_h3_indices(
     df: pd.DataFrame,
     lat: str = "latitude",
     lon: str = "longitude",
     resolution: int = 12,
+    as_int: bool = False,
 ) -> pd.Series:
     """
     Returns a Series with the same index as the input DataFrame and values equal to the
@@ -205,19 +425,28 @@ def get_h3_indices(
         lat (str): name of the column containing latitudes. Defaults to "latitude".
         lon (str): name of the column containing longitudes. Defaults to "longitude".
         resolution (int): h3 resolution of the h3 cells to output.
+        as_int (bool): if `True`, h3 indices are returned in their compact integer
+          representation (`uint64` dtype). If `False` (the default), h3 indices are
+          returned as strings.
 
     Returns:
         pd.Series: h3 cells indices
     """
 
     if len(df) == 0:
-        res = pd.Series([], dtype=object)
+        res = pd.Series([], dtype=np.uint64 if as_int else object)
     else:
-        res = df.apply(
-            lambda row: h3.geo_to_h3(row["latitude"], row["longitude"], resolution),
-            axis=1,
+        h3_cells = get_h3_cells(
+            df[lat].values.astype(float),
+            df[lon].values.astype(float),
+            resolution=resolution,
         )
 
+        if not as_int:
+            h3_cells = h3_cells_to_strings(h3_cells)
+
+        res = pd.Series(h3_cells, index=df.index)
+
     return res
 
 
@@ -260,12 +489,136 @@ def point_dist(position1: Position, position2: Position) -> float:
     return d
 
 
+def haversine_distances(
+    latitudes_1: np.ndarray,
+    longitudes_1: np.ndarray,
+    latitudes_2: np.ndarray,
+    longitudes_2: np.ndarray,
+    unit: str = "m",
+) -> np.ndarray:
+    """
+    Vectorized computation of the great-circle (haversine) distances between two
+    arrays of points. Results are identical to those of `h3.point_dist`.
+
+    Args:
+        latitudes_1 (np.ndarray): latitudes of the first points, in degrees
+        longitudes_1 (np.ndarray): longitudes of the first points, in degrees
+        latitudes_2 (np.ndarray): latitudes of the second points, in degrees
+        longitudes_2 (np.ndarray): longitudes of the second points, in degrees
+        unit (str): 'm', 'km' or 'rads'. Defaults to 'm'.
+
+    Returns:
+        np.ndarray: array of distances between the points
+
+    Examples:
+        >>> haversine_distances(
+        ...     np.array([45.0]), np.array([-4.0]), np.array([45.1]), np.array([-4.5])
+        ... )
+        array([40822.56593944])
+    """
+    lat_1 = np.radians(latitudes_1)
+    lat_2 = np.radians(latitudes_2)
+    delta_lat = lat_2 - lat_1
+    delta_lon = np.radians(longitudes_2) - np.radians(longitudes_1)
+
+    a = (
+        np.sin(delta_lat / 2) ** 2
+        + np.cos(lat_1) * np.cos(lat_2) * np.sin(delta_lon / 2) ** 2
+    )
+    angles = 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    if unit == "m":
+        res = angles * EARTH_RADIUS_KM * 1000
+    elif unit == "km":
+        res = angles * EARTH_RADIUS_KM
+    elif unit == "rads":
+        res = angles
+    else:
+        raise ValueError(f"unit must be 'm', 'km' or 'rads', got {unit}")
+
+    return res
+
+
+def get_group_starts(group_codes: np.ndarray) -> np.ndarray:
+    """
+    Takes an array of group codes of rows sorted by group, returns a boolean array
+    which is `True` at the first row of each group.
+
+    Args:
+        group_codes (np.ndarray): 1d array of group codes, in which the rows of each
+          group are contiguous
+
+    Returns:
+        np.ndarray: 1d boolean array
+
+    Examples:
+        >>> get_group_starts(np.array([0, 0, 1, 1, 1, 2]))
+        array([ True, False,  True, False, False,  True])
+    """
+    group_starts = np.ones(len(group_codes), dtype=bool)
+    group_starts[1:] = group_codes[1:] != group_codes[:-1]
+    return group_starts
+
+
+def compute_step_distances(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    group_starts: Union[None, np.ndarray] = None,
+    how: str = "backward",
+    unit: str = "m",
+) -> np.ndarray:
+    """
+    Computes the distance between successive points of arrays of latitudes and
+    longitudes in a single vectorized pass.
+
+    If `group_starts` is given, points are assumed to be grouped in contiguous
+    segments (typically the successive positions of several vessels) and distances are
+    not computed between the last point of a group and the first point of the next
+    group, which are set to `NaN` instead.
+
+    Args:
+        latitudes (np.ndarray): 1d array of latitudes
+        longitudes (np.ndarray): 1d array of longitudes
+        group_starts (np.ndarray, optional): 1d boolean array, `True` at the first
+          point of each group, as returned by `get_group_starts`. If not given, all
+          points are considered to belong to the same group. Defaults to None.
+        how (str): if 'forward', computes the distance between each point and the
+          next one. if 'backward', computes the distance between each point and the
+          previous one. Defaults to 'backward'.
+        unit (str): 'm', 'km' or 'rads'. Defaults to 'm'.
+
+    Returns:
+        np.ndarray: array of distances between the successive points
+    """
+    if how not in ("forward", "backward"):
+        raise ValueError(f"how must be 'forward' or 'backward', got {how}")
+
+    n = len(latitudes)
+    distances = np.full(n, np.nan)
+
+    if n >= 2:
+        steps = haversine_distances(
+            latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:], unit=unit
+        )
+
+        if group_starts is not None:
+            steps[group_starts[1:]] = np.nan
+
+        if how == "backward":
+            distances[1:] = steps
+        else:
+            distances[:-1] = steps
+
+    return distances
+
+
 def get_step_distances(
     df: pd.DataFrame,
     lat: str = "latitude",
     lon: str = "longitude",
     how: str = "backward",
     unit: str = "m",
+    by: Union[None, str, List[str]] = None,
 ) -> np.array:
     """Compute the distance between successive positions (rows). The DataFrame must
     have latitude and longitude columns.
@@ -279,44 +632,28 @@ def get_step_distances(
         how (str): if, 'forward', computes the interval between each position and the
           next one. if 'backward', computes the interval between each position and
           the previous one.
-        unit (str): the distance unit (passed to h3.point_dist). Defaults to 'm'.
+        unit (str): the distance unit, 'm', 'km' or 'rads'. Defaults to 'm'.
+        by (Union[None, str, List[str]]): if given, column(s) identifying groups of
+          positions (typically vessels) between which distances must not be
+          computed. The rows of each group must be contiguous. Defaults to None.
 
     Returns:
         np.array: array of distances between the successive positions.
     """
 
-    if len(df) < 2:
-        distances = [np.nan] * len(df)
+    if by is None:
+        group_starts = None
     else:
-
-        # For some reason, this is 100x faster than df[[lat, lon]].values
-        lat_lon = np.concatenate(
-            (df[lat].values[:, None], df[lon].values[:, None]), axis=1
-        )
-
-        strides = np.lib.stride_tricks.sliding_window_view(
-            lat_lon,
-            window_shape=(2, 2),
-        ).reshape((len(df) - 1, 4))
-
-        # Using a list comprehension is 5x faster than using np.apply_over_axis here
-        distances = np.array(
-            [
-                h3.point_dist((lat1, lon1), (lat2, lon2), unit=unit)
-                for lat1, lon1, lat2, lon2 in strides
-            ]
-        )
-
-        if how == "forward":
-            distances = np.append(distances, [np.nan])
-        elif how == "backward":
-            distances = np.append([np.nan], distances)
-        else:
-            raise ValueError(f"how must be 'forward' or 'backward', got f{how}")
-
-    res = np.array(distances)
-
-    return res
+        group_codes = df.groupby(by, sort=False, dropna=False).ngroup().values
+        group_starts = get_group_starts(group_codes)
+
+    return compute_step_distances(
+        df[lat].values.astype(float),
+        df[lon].values.astype(float),
+        group_starts=group_starts,
+        how=how,
+        unit=unit,
+    )
 
 
 def compute_movement_metrics(
@@ -623,6 +960,167 @@ def enrich_positions(
     return positions
 
 
+def enrich_positions_by_group(
+    positions: pd.DataFrame,
+    minimum_time_of_emission_at_sea: np.timedelta64,
+    by: Union[None, str, List[str]] = None,
+    lat: str = "latitude",
+    lon: str = "longitude",
+    datetime_column: str = "datetime_utc",
+    is_at_port_column: str = "is_at_port",
+    time_emitting_at_sea_column: str = "time_emitting_at_sea",
+    minimum_consecutive_positions: int = 3,
+    min_fishing_speed_threshold: float = 0.1,
+    max_fishing_speed_threshold: float = 4.5,
+    return_floats: bool = False,
+) -> pd.DataFrame:
+    """
+    Applies `enrich_positions` to the positions of several vessels at once.
+
+    The result is the same as that of applying `enrich_positions` to each vessel's
+    positions with a `groupby`, but positions are sorted once by vessel and datetime
+    and all metrics are computed for all vessels in single vectorized passes, the
+    computations being reset at the boundaries between vessels. This avoids copying
+    the positions of each vessel and is much faster on large numbers of vessels.
+
+    Args:
+        positions (pd.DataFrame): positions of one or several vessels
+        minimum_time_of_emission_at_sea (np.timedelta64): see `detect_fishing_activity`
+        by (Union[None, str, List[str]]): column(s) identifying vessels. Null values
+          are considered as identifiers. If `None`, vessels are identified by
+          `["cfr", "ircs", "external_immatriculation"]`. Defaults to `None`.
+        lat, lon, datetime_column, is_at_port_column, time_emitting_at_sea_column,
+          minimum_consecutive_positions, min_fishing_speed_threshold,
+          max_fishing_speed_threshold, return_floats : see `compute_movement_metrics`
+          and `detect_fishing_activity`
+
+    Returns:
+        pd.DataFrame: copy of the input DataFrame, in the same order and with the same
+        index, with the columns added by `compute_movement_metrics` and
+        `detect_fishing_activity`
+    """
+
+    if by is None:
+        by = ["cfr", "ircs", "external_immatriculation"]
+
+    positions = positions.copy(deep=True)
+    n = len(positions)
+
+    # Sort positions by vessel and datetime
+    vessel_codes = positions.groupby(by, sort=False, dropna=False).ngroup().values
+    datetimes = positions[datetime_column].values.astype("datetime64[ns]")
+    order = np.lexsort((datetimes, vessel_codes))
+    vessel_codes = vessel_codes[order]
+    datetimes = datetimes[order]
+
+    group_starts = get_group_starts(vessel_codes)
+    group_starts_idx = np.flatnonzero(group_starts)
+    group_numbers = np.cumsum(group_starts) - 1
+    row_group_start_idx = group_starts_idx[group_numbers]
+
+    # Movement metrics
+    meters_from_previous_position = compute_step_distances(
+        positions[lat].values.astype(float)[order],
+        positions[lon].values.astype(float)[order],
+        group_starts=group_starts,
+        how="backward",
+        unit="m",
+    )
+
+    time_since_previous_position = np.full(n, np.timedelta64("NaT"), "m8[ns]")
+    time_since_previous_position[1:] = datetimes[1:] - datetimes[:-1]
+    time_since_previous_position[group_starts] = np.timedelta64("NaT")
+
+    average_speed = (
+        meters_from_previous_position
+        / 1852
+        / (time_since_previous_position / np.timedelta64(1, "h"))
+    )
+
+    # Time emitting at sea : see `compute_movement_metrics` for an explanation of the
+    # computation, which is done here with cumulative sums and maxima reset at the
+    # start of each vessel's positions.
+    is_at_port = positions[is_at_port_column].values.astype(bool)[order]
+    was_previously_at_port = np.zeros(n, dtype=bool)
+    was_previously_at_port[1:] = is_at_port[:-1]
+    was_previously_at_port[group_starts] = False
+
+    t0 = positions[time_emitting_at_sea_column].values.astype("m8[ns]")[order]
+    t0 = np.where(np.isnat(t0), np.timedelta64(0, "ns"), t0).view(np.int64)
+
+    time_emitting_at_sea_intervals = np.where(
+        group_starts, t0, time_since_previous_position.view(np.int64)
+    ) * ~(is_at_port | was_previously_at_port)
+
+    cumulated_time = np.cumsum(time_emitting_at_sea_intervals)
+    cumulated_time -= (
+        cumulated_time[group_starts_idx]
+        - time_emitting_at_sea_intervals[group_starts_idx]
+    )[group_numbers]
+
+    # As cumulated times are increasing within each vessel, the cumulative maximum of
+    # cumulated times at port is the cumulated time of the last position at port.
+    last_port_idx = np.maximum.accumulate(np.where(is_at_port, np.arange(n), -1))
+    cumulated_time_at_last_port = np.where(
+        last_port_idx >= row_group_start_idx,
+        cumulated_time[np.maximum(last_port_idx, 0)],
+        0,
+    )
+    time_emitting_at_sea = (cumulated_time - cumulated_time_at_last_port).view("m8[ns]")
+
+    # Fishing activity : see `detect_fishing_activity`
+    is_at_fishing_speed = (average_speed >= min_fishing_speed_threshold) & (
+        average_speed <= max_fishing_speed_threshold
+    )
+    unknown_speed = np.isnan(average_speed)
+
+    fishing_activity_unknown_speed_is_fishing_speed = values_belong_to_sequence(
+        ~is_at_port & (is_at_fishing_speed | unknown_speed),
+        window_length=minimum_consecutive_positions,
+        group_starts=group_starts,
+    )
+
+    fishing_activity_unknown_speed_is_not_fishing_speed = values_belong_to_sequence(
+        ~is_at_port & is_at_fishing_speed,
+        window_length=minimum_consecutive_positions,
+        group_starts=group_starts,
+    )
+
+    fishing_activity = np.where(
+        (
+            fishing_activity_unknown_speed_is_fishing_speed
+            == fishing_activity_unknown_speed_is_not_fishing_speed
+        ),
+        fishing_activity_unknown_speed_is_fishing_speed,
+        np.nan,
+    )
+
+    fishing_activity = np.where(
+        time_emitting_at_sea > minimum_time_of_emission_at_sea,
+        fishing_activity,
+        0.0,
+    )
+
+    # Restore the input order
+    inverse_order = np.empty(n, dtype=np.intp)
+    inverse_order[order] = np.arange(n)
+
+    positions["meters_from_previous_position"] = meters_from_previous_position[
+        inverse_order
+    ]
+    positions["time_since_previous_position"] = time_since_previous_position[
+        inverse_order
+    ]
+    positions["average_speed"] = average_speed[inverse_order]
+    positions[time_emitting_at_sea_column] = time_emitting_at_sea[inverse_order]
+    positions["is_fishing"] = fishing_activity[inverse_order]
+
+    if not return_floats:
+        positions["is_fishing"] = zeros_ones_to_bools(positions["is_fishing"])
+
+    return positions
+
+
 def geocode(
     query_string=None, country_code_iso2=None, backend: str = "Nominatim", **kwargs
 ):
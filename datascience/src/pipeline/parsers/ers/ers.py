@@ -6,8 +6,6 @@ from functools import partial
 from typing import List
 from xml.etree.ElementTree import ParseError
 
-import pandas as pd
-
 from src.pipeline.parsers.ers.log_parsers import (
     default_log_parser,
     parse_coe,
@@ -22,7 +20,9 @@ from src.pipeline.parsers.ers.log_parsers import (
     parse_pno,
     parse_rtp,
 )
+from src.pipeline.parsers.parallel import parse_in_parallel
 from src.pipeline.parsers.utils import (
+    ColumnAccumulator,
     get_first_child,
     get_root_tag,
     make_datetime,
@@ -208,9 +208,39 @@ def parse_xml_string(xml_string):
     return parse(el)
 
 
-def batch_parse(xml_messages: List[str]) -> dict:
-    """Parses a list of ERS messages and returns a dictionnary with the information
-    extracted from the messages.
+REPORTS_COLUMNS = [
+    "operation_number",
+    "operation_country",
+    "operation_datetime_utc",
+    "operation_type",
+    "report_id",
+    "referenced_report_id",
+    "report_datetime_utc",
+    "cfr",
+    "ircs",
+    "external_identification",
+    "vessel_name",
+    "flag_state",
+    "imo",
+    "log_type",
+    "value",
+    "integration_datetime_utc",
+]
+
+REPORTS_DATETIME_COLUMNS = [
+    "operation_datetime_utc",
+    "report_datetime_utc",
+    "integration_datetime_utc",
+]
+
+RAW_MESSAGES_COLUMNS = [
+    "operation_number",
+    "xml_message",
+]
+
+
+def parse_messages(xml_messages: List[str]) -> dict:
+    """Parses a list of ERS messages in the current process.
 
     Args:
         xml_messages (List[str]): list of ERS xml messages
@@ -218,40 +248,19 @@ def batch_parse(xml_messages: List[str]) -> dict:
     Returns:
         dict : dictionnary with 3 elemements:
 
-          - logbook_reports pd.DataFrame: Dataframe with parsed data
-          - logbook_raw_messages (pd.DataFrame):  Dataframe with the original xml
-            messages
+          - logbook_reports (ColumnAccumulator): parsed data
+          - logbook_raw_messages (ColumnAccumulator): original xml messages
           - batch_generated_errors (boolean): `True` if an error occurred during the
             treatment of one or more of the messages
     """
-    logbook_reports_list = []
-    logbook_raw_messages_list = []
+    logbook_reports = ColumnAccumulator(
+        REPORTS_COLUMNS,
+        datetime_columns=REPORTS_DATETIME_COLUMNS,
+        json_columns=["value"],
+    )
+    logbook_raw_messages = ColumnAccumulator(RAW_MESSAGES_COLUMNS)
     batch_generated_errors = False
 
-    raw_messages_columns = [
-        "operation_number",
-        "xml_message",
-    ]
-
-    reports_defaults = {
-        "operation_number": None,
-        "operation_country": None,
-        "operation_datetime_utc": None,
-        "operation_type": None,
-        "report_id": None,
-        "referenced_report_id": None,
-        "report_datetime_utc": None,
-        "cfr": None,
-        "ircs": None,
-        "external_identification": None,
-        "vessel_name": None,
-        "flag_state": None,
-        "imo": None,
-        "log_type": None,
-        "value": None,
-        "integration_datetime_utc": None,
-    }
-
     for xml_message in xml_messages:
         try:
             metadata, data_iterator = parse_xml_string(xml_message)
@@ -261,17 +270,14 @@ def batch_parse(xml_messages: List[str]) -> dict:
                 "xml_message": xml_message,
             }
             for data in data_iterator:
-                logbook_reports_list.append(
-                    pd.Series(
-                        {
-                            **reports_defaults,
-                            **metadata,
-                            **data,
-                            "integration_datetime_utc": now,
-                        }
-                    )
+                logbook_reports.append(
+                    {
+                        **metadata,
+                        **data,
+                        "integration_datetime_utc": now,
+                    }
                 )
-            logbook_raw_messages_list.append(pd.Series(raw))
+            logbook_raw_messages.append(raw)
         except ERSParsingError:
             log_end = "..." if len(xml_message) > 40 else ""
             logging.error(
@@ -284,15 +290,41 @@ def batch_parse(xml_messages: List[str]) -> dict:
             logging.error("Unkonwn error with message " + xml_message)
             batch_generated_errors = True
 
-    logbook_reports = pd.DataFrame(columns=pd.Index(reports_defaults))
-    logbook_raw_messages = pd.DataFrame(columns=pd.Index(raw_messages_columns))
-    if len(logbook_reports_list) > 0:
-        logbook_reports = pd.concat(logbook_reports_list, axis=1).T
-    if len(logbook_raw_messages_list) > 0:
-        logbook_raw_messages = pd.concat(logbook_raw_messages_list, axis=1).T
-
     return {
         "logbook_reports": logbook_reports,
         "logbook_raw_messages": logbook_raw_messages,
         "batch_generated_errors": batch_generated_errors,
     }
+
+
+def batch_parse(xml_messages: List[str], n_workers: int = None) -> dict:
+    """Parses a list of ERS messages and returns a dictionnary with the information
+    extracted from the messages. Messages are parsed in parallel in `n_workers`
+    processes.
+
+    Args:
+        xml_messages (List[str]): list of ERS xml messages
+        n_workers (int, optional): number of worker processes. Defaults to
+          `LOGBOOK_PARSING_WORKERS`.
+
+    Returns:
+        dict : dictionnary with 3 elemements:
+
+          - logbook_reports pd.DataFrame: Dataframe with parsed data, with
+            `datetime64` datetime columns and json strings in the `value` column
+          - logbook_raw_messages (pd.DataFrame):  Dataframe with the original xml
+            messages
+          - batch_generated_errors (boolean): `True` if an error occurred during the
+            treatment of one or more of the messages
+    """
+    parsed = parse_in_parallel(
+        parse_messages,
+        xml_messages,
+        n_workers=n_workers,
+    )
+
+    return {
+        "logbook_reports": parsed["logbook_reports"].to_dataframe(),
+        "logbook_raw_messages": parsed["logbook_raw_messages"].to_dataframe(),
+        "batch_generated_errors": parsed["batch_generated_errors"],
+    }
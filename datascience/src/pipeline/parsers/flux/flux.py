@@ -5,11 +5,9 @@ import xml
 import xml.etree.ElementTree as ET
 from datetime import datetime
 from enum import Enum
-from typing import List, Tuple
-from xml.etree.ElementTree import ParseError
-
-import pandas as pd
+from typing import Iterable, List, Tuple, Union
 
+from config import FLUX_STREAMING_THRESHOLD_BYTES
 from src.pipeline.parsers.flux.log_parsers import (
     null_parser,
     parse_coe,
@@ -22,12 +20,17 @@ from src.pipeline.parsers.flux.log_parsers import (
     parse_rtp,
 )
 from src.pipeline.parsers.flux.utils import (
-    NS_FLUX,
+    XML_PARSE_ERRORS,
     get_element,
+    get_elements,
     get_text,
+    get_xml_root_tag,
+    iterparse_xml_string,
     make_datetime,
+    parse_xml_string,
 )
-from src.pipeline.parsers.utils import get_root_tag, tagged_children
+from src.pipeline.parsers.parallel import parse_in_parallel
+from src.pipeline.parsers.utils import ColumnAccumulator, get_root_tag, tagged_children
 
 
 class FLUXParsingError(Exception):
@@ -278,15 +281,21 @@ def parse_specified_fishing_activity(
 
 
 def get_list_fa_report_documents(fa_report_message: ET.Element) -> List[ET.Element]:
-    fa_report_documents = fa_report_message.findall("FAReportDocument", NS_FLUX)
+    fa_report_documents = get_elements(fa_report_message, "rsm:FAReportDocument")
     return fa_report_documents
 
 
-def base64_decode(fa_report_message_string: str) -> str:
+def decode_fa_report_message(
+    fa_report_message_string: str,
+) -> Tuple[str, Union[ET.Element, None]]:
     """Takes a string that represents the content of an xml message of the FLUX format
     that may be base64-encoded and wrapped in an outer `BASE64DATA` xml tag (or not),
-    and returns the decoded message. If the input message is not base64-encoded, simply
-    return the unmodified input.
+    and returns the decoded message along with its parsed root element, so that
+    messages that are not base64-encoded are only parsed once.
+
+    The root element is `None` if the message was base64-encoded or if it is larger
+    than `FLUX_STREAMING_THRESHOLD_BYTES`, in which case it is not parsed as a whole
+    and only its root tag is read.
 
     Args:
         fa_report_message_string (str): FLUX message string, possibly base64-encoded
@@ -297,37 +306,75 @@ def base64_decode(fa_report_message_string: str) -> str:
           its root tag is unexpected.
 
     Returns:
-        str: decoded FLUX message, ready for parsing and data extraction
+        Tuple[str, Union[ET.Element, None]]: decoded FLUX message and its root element
     """
     try:
-        fa_report_message = ET.fromstring(fa_report_message_string)
-    except ParseError:
+        if len(fa_report_message_string) > FLUX_STREAMING_THRESHOLD_BYTES:
+            fa_report_message = None
+            fa_report_message_tag = get_xml_root_tag(fa_report_message_string)
+        else:
+            fa_report_message = parse_xml_string(fa_report_message_string)
+            fa_report_message_tag = get_root_tag(fa_report_message)
+
+        if fa_report_message_tag == "BASE64DATA":
+            if fa_report_message is None:
+                fa_report_message = parse_xml_string(fa_report_message_string)
+            decoded_flux_xml_string = gzip.decompress(
+                base64.b64decode(fa_report_message.text)
+            ).decode("utf-8")
+            return decoded_flux_xml_string, None
+
+    except XML_PARSE_ERRORS:
         raise FLUXParsingError(
             f"Could not parse FLUX xml document: {fa_report_message_string[:40]}[...]"
         )
 
-    fa_report_message_tag = get_root_tag(fa_report_message)
-    if fa_report_message_tag == "BASE64DATA":
-        decoded_flux_xml_string = gzip.decompress(
-            base64.b64decode(fa_report_message.text)
-        ).decode("utf-8")
-    elif fa_report_message_tag == "FLUXFAReportMessage":
-        decoded_flux_xml_string = fa_report_message_string
+    if fa_report_message_tag == "FLUXFAReportMessage":
+        return fa_report_message_string, fa_report_message
     else:
         raise FLUXParsingError(
             f"fa_report_message element has an unexpected root tag {fa_report_message_tag}"
         )
+
+
+def base64_decode(fa_report_message_string: str) -> str:
+    """Takes a string that represents the content of an xml message of the FLUX format
+    that may be base64-encoded and wrapped in an outer `BASE64DATA` xml tag (or not),
+    and returns the decoded message. If the input message is not base64-encoded, simply
+    return the unmodified input.
+
+    Args:
+        fa_report_message_string (str): FLUX message string, possibly base64-encoded
+          and wrapped in a `BASE64DATA` xml tag.
+
+    Raises:
+        FLUXParsingError: `FLUXParsingError` if the input string is not valid xml or
+          its root tag is unexpected.
+
+    Returns:
+        str: decoded FLUX message, ready for parsing and data extraction
+    """
+    decoded_flux_xml_string, _ = decode_fa_report_message(fa_report_message_string)
     return decoded_flux_xml_string
 
 
-def parse_fa_report_message_string(
-    fa_report_message_string: str,
-) -> Tuple[str, List[dict]]:
-    try:
-        fa_report_message = ET.fromstring(fa_report_message_string)
-    except ParseError as e:
-        raise FLUXParsingError("Could not parse xml string: ", e)
+def parse_fa_report_documents(
+    fa_report_documents: Iterable[ET.Element],
+) -> List[dict]:
+    fa_report_message_data = []
+    for fa_report_document in fa_report_documents:
+        try:
+            fa_report_document_data = parse_fa_report_document(fa_report_document)
+        except FLUXParsingError:
+            logging.error("Could not parse one report. This report will be skipped.")
+            continue
+        fa_report_message_data.append(fa_report_document_data)
+    return fa_report_message_data
 
+
+def parse_fa_report_message(
+    fa_report_message: ET.Element,
+) -> Tuple[str, List[dict]]:
     operation_number = get_text(
         fa_report_message, './/rsm:FLUXReportDocument/ram:ID[@schemeID="UUID"]'
     )
@@ -342,59 +389,112 @@ def parse_fa_report_message_string(
         ),
     }
     fa_report_documents = get_list_fa_report_documents(fa_report_message)
-    fa_report_message_data = []
-    for fa_report_document in fa_report_documents:
-        try:
-            fa_report_document_data = parse_fa_report_document(fa_report_document)
-        except FLUXParsingError:
-            logging.error("Could not parse one report. This report will be skipped.")
-            continue
-        fa_report_message_data.append({**operation_data, **fa_report_document_data})
-    return operation_number, fa_report_message_data
+    fa_report_message_data = parse_fa_report_documents(fa_report_documents)
+    return operation_number, [
+        {**operation_data, **fa_report_document_data}
+        for fa_report_document_data in fa_report_message_data
+    ]
 
 
-def batch_parse(fa_report_message_strings: List[str]) -> dict:
-    """Parses a list of FLUX messages and returns a dictionnary with the information
-    extracted from the messages.
+def iterparse_fa_report_message(
+    fa_report_message_string: str,
+) -> Tuple[str, List[dict]]:
+    """Same as `parse_fa_report_message_string`, but parses the message
+    incrementally, one `FAReportDocument` at a time, so that the parsed xml tree of
+    large messages is never held in memory as a whole."""
+    operation_data = {"operation_number": None, "operation_datetime_utc": None}
+    fa_report_documents_data = []
+
+    for tag, el in iterparse_xml_string(
+        fa_report_message_string, tags=("FLUXReportDocument", "FAReportDocument")
+    ):
+        if tag == "FLUXReportDocument":
+            operation_data = {
+                "operation_number": get_text(el, 'ram:ID[@schemeID="UUID"]'),
+                "operation_datetime_utc": make_datetime(
+                    get_text(el, "ram:CreationDateTime/udt:DateTime")
+                ),
+            }
+        else:
+            fa_report_documents_data += parse_fa_report_documents([el])
+
+    return operation_data["operation_number"], [
+        {**operation_data, **fa_report_document_data}
+        for fa_report_document_data in fa_report_documents_data
+    ]
+
+
+def parse_fa_report_message_string(
+    fa_report_message_string: str,
+) -> Tuple[str, List[dict]]:
+    try:
+        if len(fa_report_message_string) > FLUX_STREAMING_THRESHOLD_BYTES:
+            return iterparse_fa_report_message(fa_report_message_string)
+        fa_report_message = parse_xml_string(fa_report_message_string)
+    except XML_PARSE_ERRORS as e:
+        raise FLUXParsingError("Could not parse xml string: ", e)
+
+    return parse_fa_report_message(fa_report_message)
+
+
+REPORTS_COLUMNS = [
+    "operation_number",
+    "operation_datetime_utc",
+    "operation_type",
+    "report_id",
+    "referenced_report_id",
+    "report_datetime_utc",
+    "cfr",
+    "ircs",
+    "external_identification",
+    "vessel_name",
+    "flag_state",
+    "imo",
+    "log_type",
+    "value",
+    "integration_datetime_utc",
+]
+
+REPORTS_DATETIME_COLUMNS = [
+    "operation_datetime_utc",
+    "report_datetime_utc",
+    "integration_datetime_utc",
+]
+
+RAW_MESSAGES_COLUMNS = [
+    "operation_number",
+    "xml_message",
+]
+
+
+def parse_messages(fa_report_message_strings: List[str]) -> dict:
+    """Parses a list of FLUX messages in the current process.
 
     Args:
-        flux_fa_report_message_strings (List[str]): list of FLUX xml documents, some of
+        fa_report_message_strings (List[str]): list of FLUX xml documents, some of
           which may be BASE64 encoded
 
     Returns:
         dict : dictionnary with 3 elemements:
 
-          - logbook_reports pd.DataFrame: Dataframe with parsed data
-          - logbook_raw_messages (pd.DataFrame):  Dataframe with the original xml
-            messages
+          - logbook_reports (ColumnAccumulator): parsed data
+          - logbook_raw_messages (ColumnAccumulator): original xml messages
           - batch_generated_errors (boolean): `True` if an error occurred during the
             treatment of one or more of the messages
     """
-    logbook_reports_list = []
-    logbook_raw_messages_list = []
+    logbook_reports = ColumnAccumulator(
+        REPORTS_COLUMNS,
+        datetime_columns=REPORTS_DATETIME_COLUMNS,
+        json_columns=["value"],
+    )
+    logbook_raw_messages = ColumnAccumulator(RAW_MESSAGES_COLUMNS)
     batch_generated_errors = False
 
-    reports_defaults = {
-        "operation_number": None,
-        "operation_datetime_utc": None,
-        "operation_type": None,
-        "report_id": None,
-        "referenced_report_id": None,
-        "report_datetime_utc": None,
-        "cfr": None,
-        "ircs": None,
-        "external_identification": None,
-        "vessel_name": None,
-        "flag_state": None,
-        "imo": None,
-        "log_type": None,
-        "value": None,
-        "integration_datetime_utc": None,
-    }
-
     for fa_report_message_string in fa_report_message_strings:
         try:
-            fa_report_message_string = base64_decode(fa_report_message_string)
+            fa_report_message_string, fa_report_message = decode_fa_report_message(
+                fa_report_message_string
+            )
         except FLUXParsingError:
             log_end = "..." if len(fa_report_message_string) > 40 else ""
             logging.error(
@@ -404,9 +504,15 @@ def batch_parse(fa_report_message_strings: List[str]) -> dict:
             continue
 
         try:
-            operation_number, fa_report_message_data = parse_fa_report_message_string(
-                fa_report_message_string
-            )
+            if fa_report_message is None:
+                (
+                    operation_number,
+                    fa_report_message_data,
+                ) = parse_fa_report_message_string(fa_report_message_string)
+            else:
+                operation_number, fa_report_message_data = parse_fa_report_message(
+                    fa_report_message
+                )
         except FLUXParsingError:
             log_end = "..." if len(fa_report_message_string) > 40 else ""
             logging.error(
@@ -420,38 +526,67 @@ def batch_parse(fa_report_message_strings: List[str]) -> dict:
             continue
 
         now = datetime.utcnow()
-        raw = {
-            "operation_number": operation_number,
-            "xml_message": fa_report_message_string,
-        }
-        logbook_raw_messages_list.append(pd.Series(raw))
+        logbook_raw_messages.append(
+            {
+                "operation_number": operation_number,
+                "xml_message": fa_report_message_string,
+            }
+        )
 
         for fa_report_document_data in fa_report_message_data:
-            logbook_reports_list.append(
-                pd.Series(
-                    {
-                        **reports_defaults,
-                        **fa_report_document_data,
-                        "integration_datetime_utc": now,
-                    }
-                )
+            logbook_reports.append(
+                {
+                    **fa_report_document_data,
+                    "integration_datetime_utc": now,
+                }
             )
 
-    logbook_reports = pd.DataFrame(columns=pd.Index(reports_defaults))
-    logbook_raw_messages = pd.DataFrame(columns=pd.Index(raw))
-    if len(logbook_reports_list) > 0:
-        logbook_reports = (
-            pd.concat(logbook_reports_list, axis=1)
-            .T.sort_values("operation_datetime_utc")
-            .drop_duplicates(subset=["report_id"])
-        )
-    if len(logbook_raw_messages_list) > 0:
-        logbook_raw_messages = pd.concat(
-            logbook_raw_messages_list, axis=1
-        ).T.drop_duplicates(subset=["operation_number"])
-
     return {
         "logbook_reports": logbook_reports,
         "logbook_raw_messages": logbook_raw_messages,
         "batch_generated_errors": batch_generated_errors,
     }
+
+
+def batch_parse(fa_report_message_strings: List[str], n_workers: int = None) -> dict:
+    """Parses a list of FLUX messages and returns a dictionnary with the information
+    extracted from the messages. Messages are parsed in parallel in `n_workers`
+    processes.
+
+    Args:
+        flux_fa_report_message_strings (List[str]): list of FLUX xml documents, some of
+          which may be BASE64 encoded
+        n_workers (int, optional): number of worker processes. Defaults to
+          `LOGBOOK_PARSING_WORKERS`.
+
+    Returns:
+        dict : dictionnary with 3 elemements:
+
+          - logbook_reports pd.DataFrame: Dataframe with parsed data, with
+            `datetime64` datetime columns and json strings in the `value` column
+          - logbook_raw_messages (pd.DataFrame):  Dataframe with the original xml
+            messages
+          - batch_generated_errors (boolean): `True` if an error occurred during the
+            treatment of one or more of the messages
+    """
+    parsed = parse_in_parallel(
+        parse_messages,
+        fa_report_message_strings,
+        n_workers=n_workers,
+    )
+
+    logbook_reports = parsed["logbook_reports"].to_dataframe()
+    logbook_raw_messages = parsed["logbook_raw_messages"].to_dataframe()
+
+    if len(logbook_reports) > 0:
+        logbook_reports = logbook_reports.sort_values(
+            "operation_datetime_utc"
+        ).drop_duplicates(subset=["report_id"])
+
+    return {
+        "logbook_reports": logbook_reports,
+        "logbook_raw_messages": logbook_raw_messages.drop_duplicates(
+            subset=["operation_number"]
+        ),
+        "batch_generated_errors": parsed["batch_generated_errors"],
+    }
@@ -6,7 +6,7 @@ from src.pipeline.parsers.flux.childless_parsers import (
     parse_ras,
     parse_spe,
 )
-from src.pipeline.parsers.flux.utils import NS_FLUX, get_element, get_text
+from src.pipeline.parsers.flux.utils import get_element, get_elements, get_text
 from src.pipeline.parsers.utils import tagged_children, try_float
 
 
@@ -203,11 +203,11 @@ def parse_pno(pno):
         zone_data = complete_ras(zone_data)
 
     if "SpecifiedFACatch" in children:
-        catch_onboard = pno.findall(
-            ".//ram:SpecifiedFACatch[ram:TypeCode='ONBOARD']", NS_FLUX
+        catch_onboard = get_elements(
+            pno, ".//ram:SpecifiedFACatch[ram:TypeCode='ONBOARD']"
         )
-        catch_to_land = pno.findall(
-            ".//ram:SpecifiedFACatch[ram:TypeCode='UNLOADED']", NS_FLUX
+        catch_to_land = get_elements(
+            pno, ".//ram:SpecifiedFACatch[ram:TypeCode='UNLOADED']"
         )
         catch_onboard = [parse_spe(spe) for spe in catch_onboard]
         catch_to_land = [parse_spe(spe) for spe in catch_to_land]
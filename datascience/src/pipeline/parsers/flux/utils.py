@@ -1,6 +1,17 @@
 import logging
 import xml.etree.ElementTree as ET
 from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+from typing import Iterator, List, Tuple
+from xml.etree.ElementTree import ParseError
+
+from config import FLUX_XML_BACKEND
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # pragma: no cover
+    lxml_etree = None
 
 NS_FLUX = {
     "": "urn:un:unece:uncefact:data:standard:FLUXFAReportMessage:3",
@@ -13,6 +24,154 @@ NS_FLUX = {
 }
 
 
+# XPath does not support default namespaces
+NS_FLUX_XPATH = {prefix: uri for prefix, uri in NS_FLUX.items() if prefix}
+
+
+def get_xml_backend() -> str:
+    """Returns the xml backend used to parse FLUX messages : "lxml" if it is the
+    configured `FLUX_XML_BACKEND` and lxml is installed, "stdlib" otherwise."""
+    if FLUX_XML_BACKEND == "lxml":
+        if lxml_etree is not None:
+            return "lxml"
+        logging.warning("lxml is not installed, falling back to xml.etree.")
+    elif FLUX_XML_BACKEND != "stdlib":
+        logging.warning(
+            f"Unknown FLUX xml backend {FLUX_XML_BACKEND}, falling back to xml.etree."
+        )
+    return "stdlib"
+
+
+XML_BACKEND = get_xml_backend()
+
+XML_PARSE_ERRORS = (
+    (ParseError, lxml_etree.XMLSyntaxError) if lxml_etree is not None else ParseError
+)
+
+
+@lru_cache(maxsize=None)
+def _get_lxml_parser():
+    # The encoding is forced, like with xml.etree which ignores the encoding
+    # declaration of `str` inputs. Comments and processing instructions are removed
+    # so that all children of elements are elements.
+    return lxml_etree.XMLParser(
+        encoding="utf-8",
+        remove_comments=True,
+        remove_pis=True,
+        resolve_entities=False,
+        huge_tree=True,
+    )
+
+
+def parse_xml_string(xml_string: str, backend: str = None):
+    """Parses a string into an xml element, with the given backend.
+
+    Args:
+        xml_string (str): xml document
+        backend (str, optional): "lxml" or "stdlib". Defaults to `XML_BACKEND`.
+
+    Returns:
+        Element: root element of the document, either a `lxml.etree._Element` or a
+        `xml.etree.ElementTree.Element` depending on the backend
+
+    Raises:
+        ParseError or lxml.etree.XMLSyntaxError: if the string is not valid xml. Both
+          are part of `XML_PARSE_ERRORS`.
+    """
+    backend = backend or XML_BACKEND
+    if backend == "lxml":
+        return lxml_etree.fromstring(xml_string.encode("utf-8"), _get_lxml_parser())
+    else:
+        return ET.fromstring(xml_string)
+
+
+def iterparse_xml_string(
+    xml_string: str, tags: Tuple[str], backend: str = None
+) -> Iterator[Tuple[str, ET.Element]]:
+    """Parses a string incrementally and yields elements whose tag is in `tags` as
+    soon as they are fully parsed. Elements are cleared after being yielded, so that
+    the memory used does not depend on the size of the document.
+
+    Args:
+        xml_string (str): xml document
+        tags (Tuple[str]): tags of the elements to yield, without namespace
+        backend (str, optional): "lxml" or "stdlib". Defaults to `XML_BACKEND`.
+
+    Yields:
+        Tuple[str, Element]: tag (without namespace) and element
+    """
+    backend = backend or XML_BACKEND
+    source = BytesIO(xml_string.encode("utf-8"))
+    if backend == "lxml":
+        events = lxml_etree.iterparse(
+            source,
+            events=("end",),
+            encoding="utf-8",
+            remove_comments=True,
+            remove_pis=True,
+            resolve_entities=False,
+            huge_tree=True,
+        )
+    else:
+        events = ET.iterparse(source, events=("end",))
+
+    for _, el in events:
+        tag = el.tag.split("}")[-1]
+        if tag in tags:
+            yield tag, el
+            el.clear()
+
+
+def get_xml_root_tag(xml_string: str, backend: str = None) -> str:
+    """Returns the tag (without namespace) of the root element of an xml document,
+    without parsing the rest of the document."""
+    backend = backend or XML_BACKEND
+    source = BytesIO(xml_string.encode("utf-8"))
+    if backend == "lxml":
+        events = lxml_etree.iterparse(
+            source, events=("start",), encoding="utf-8", resolve_entities=False
+        )
+    else:
+        events = ET.iterparse(source, events=("start",))
+    _, root = next(iter(events))
+    return root.tag.split("}")[-1]
+
+
+@lru_cache(maxsize=None)
+def _compile_xpath(xml_path: str, first_only: bool = False):
+    # libxml2 evaluates `descendant::` steps much faster than the equivalent `.//`
+    # and, for `get_element`, a `[1]` predicate on the last step avoids collecting
+    # matches that are not used.
+    if xml_path.startswith(".//"):
+        xml_path = "descendant::" + xml_path[3:]
+    if first_only:
+        xml_path += "[1]"
+    return lxml_etree.XPath(xml_path, namespaces=NS_FLUX_XPATH, smart_strings=False)
+
+
+def _is_lxml_element(xml_element) -> bool:
+    return lxml_etree is not None and isinstance(xml_element, lxml_etree._Element)
+
+
+def get_elements(xml_element: ET.Element, xml_path: str) -> List[ET.Element]:
+    """Returns all elements of `xml_element` that match the provided `xml_path`.
+
+    With lxml elements, `xml_path` is evaluated as a compiled XPath expression,
+    otherwise with `ElementTree.findall`. The paths used in the FLUX parsers use the
+    subset of XPath supported by `ElementTree` and must use namespace prefixes.
+
+    Args:
+        xml_element (ET.Element): xml element in which to search
+        xml_path (str): path describing the searched elements
+
+    Returns:
+        List[ET.Element]: elements of the input `xml_element` that match `xml_path`
+    """
+    if _is_lxml_element(xml_element):
+        return _compile_xpath(xml_path)(xml_element)
+    return xml_element.findall(xml_path, NS_FLUX)
+
+
 def get_element(xml_element: ET.Element, xml_path: str) -> ET.Element:
     """Returns the first element of `xml_element` that matches the provided `xml_path`.
 
@@ -23,6 +182,9 @@ def get_element(xml_element: ET.Element, xml_path: str) -> ET.Element:
     Returns:
         ET.Element: first element of the input `xml_element` that matches `xml_path`
     """
+    if _is_lxml_element(xml_element):
+        res = _compile_xpath(xml_path, first_only=True)(xml_element)
+        return res[0] if res else None
     return xml_element.find(xml_path, NS_FLUX)
 
 
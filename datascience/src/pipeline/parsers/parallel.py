@@ -0,0 +1,132 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Union
+
+from config import LOGBOOK_PARSING_CHUNK_SIZE, LOGBOOK_PARSING_WORKERS
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def get_parsing_pool(n_workers: int) -> ProcessPoolExecutor:
+    """Returns the process pool used to parse logbook messages, creating it on first
+    use. Flow runs each run in their own process, so the pool does not outlive a flow
+    run. `parse_in_parallel` shuts it down with `shutdown_parsing_pool` once messages
+    are parsed.
+
+    Worker processes are spawned rather than forked, since the flows calling parsers
+    run in threads.
+
+    Args:
+        n_workers (int): number of worker processes. If the existing pool does not
+          have this number of workers, it is replaced.
+
+    Returns:
+        ProcessPoolExecutor
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != n_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pool_workers = n_workers
+        return _pool
+
+
+def shutdown_parsing_pool():
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+        _pool = None
+        _pool_workers = None
+
+
+def _reset_after_fork():
+    # The pool's workers and management thread belong to the parent process
+    global _pool, _pool_workers, _pool_lock
+    _pool = None
+    _pool_workers = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def parse_in_parallel(
+    parse_messages: Callable[[List[str]], dict],
+    xml_messages: List[str],
+    n_workers: Union[int, None] = None,
+    chunk_size: Union[int, None] = None,
+) -> dict:
+    """Splits `xml_messages` in chunks and parses the chunks with `parse_messages` in
+    a pool of worker processes. Results are collected in the order of the input
+    messages, so the output is identical to that of `parse_messages(xml_messages)`.
+
+    Starting worker processes takes longer than parsing a few chunks of messages, so
+    messages are parsed in the current process when `n_workers` is 1 or when there
+    are fewer chunks of messages than `n_workers`. Otherwise, worker processes are
+    started and then shut down once all messages are parsed.
+
+    Args:
+        parse_messages (Callable[[List[str]], dict]): module level function (so that
+          it can be pickled) that parses a list of messages and returns a `dict` with
+          `logbook_reports` and `logbook_raw_messages` `ColumnAccumulator` and a
+          `batch_generated_errors` boolean.
+        xml_messages (List[str]): messages to parse
+        n_workers (int, optional): number of worker processes. Defaults to
+          `LOGBOOK_PARSING_WORKERS`.
+        chunk_size (int, optional): number of messages sent to a worker at a time.
+          Defaults to `LOGBOOK_PARSING_CHUNK_SIZE`.
+
+    Returns:
+        dict: `dict` with the same structure as the output of `parse_messages`
+    """
+    n_workers = n_workers or LOGBOOK_PARSING_WORKERS
+    chunk_size = chunk_size or LOGBOOK_PARSING_CHUNK_SIZE
+
+    chunks = [
+        xml_messages[i : i + chunk_size]
+        for i in range(0, len(xml_messages), chunk_size)
+    ]
+
+    if n_workers > 1 and len(chunks) >= n_workers:
+        try:
+            results = list(get_parsing_pool(n_workers).map(parse_messages, chunks))
+        except BrokenProcessPool:
+            logging.error(
+                "Logbook parsing pool broke down, parsing messages in main process."
+            )
+            results = list(map(parse_messages, chunks))
+        finally:
+            shutdown_parsing_pool()
+    else:
+        results = list(map(parse_messages, chunks))
+
+    # Parsing an empty list gives empty accumulators with the expected columns
+    res = parse_messages([])
+    logbook_reports = res["logbook_reports"]
+    logbook_raw_messages = res["logbook_raw_messages"]
+    batch_generated_errors = False
+
+    for result in results:
+        logbook_reports.extend(result["logbook_reports"])
+        logbook_raw_messages.extend(result["logbook_raw_messages"])
+        batch_generated_errors = batch_generated_errors or (
+            result["batch_generated_errors"]
+        )
+
+    return {
+        "logbook_reports": logbook_reports,
+        "logbook_raw_messages": logbook_raw_messages,
+        "batch_generated_errors": batch_generated_errors,
+    }
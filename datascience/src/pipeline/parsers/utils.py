@@ -1,6 +1,10 @@
 import logging
 from datetime import datetime
-from typing import Union
+from typing import Iterable, Union
+
+import pandas as pd
+
+from src.pipeline.processing import to_json
 
 
 def remove_namespace(tag: str):
@@ -99,3 +103,79 @@ def make_datetime_json_serializable(date: str, time: Union[str, None] = None):
         return dt.isoformat() + "Z"
     else:
         return None
+
+
+class ColumnAccumulator:
+    """Collects parsed rows as lists of column values, which is much cheaper than
+    building one `pd.Series` per row and concatenating them.
+
+    Rows may hold keys that are not in the initial `columns`: these are added as new
+    columns, after the existing ones, and filled with `None` for the rows appended
+    before. Rows that lack some of the columns get `None` values for these columns.
+
+    Values of `json_columns` are serialized to json text as rows are appended (a
+    missing value being serialized as `null`), and `datetime_columns` are converted
+    to `datetime64` in one go when the `DataFrame` is built. Other columns get the
+    dtype inferred by pandas.
+
+    Args:
+        columns (Iterable[str]): initial columns, in order.
+        datetime_columns (Iterable[str], optional): columns holding `datetime`
+          values. Defaults to ().
+        json_columns (Iterable[str], optional): columns whose values are serialized
+          to json. Must be part of `columns`. Defaults to ().
+    """
+
+    def __init__(
+        self,
+        columns: Iterable[str],
+        datetime_columns: Iterable[str] = (),
+        json_columns: Iterable[str] = (),
+    ):
+        self.columns = {column: [] for column in columns}
+        self.datetime_columns = list(datetime_columns)
+        self.json_columns = list(json_columns)
+        self.n_rows = 0
+
+        assert set(self.json_columns) <= set(self.columns)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def _add_column(self, column: str):
+        self.columns[column] = [None] * self.n_rows
+
+    def append(self, row: dict):
+        for column in row:
+            if column not in self.columns:
+                self._add_column(column)
+
+        for column, values in self.columns.items():
+            values.append(row.get(column))
+
+        for column in self.json_columns:
+            values = self.columns[column]
+            values[-1] = to_json(values[-1])
+
+        self.n_rows += 1
+
+    def extend(self, other: "ColumnAccumulator"):
+        """Appends the rows of another `ColumnAccumulator` with the same
+        `json_columns`."""
+        for column in other.columns:
+            if column not in self.columns:
+                self._add_column(column)
+
+        for column, values in self.columns.items():
+            if column in other.columns:
+                values.extend(other.columns[column])
+            else:
+                values.extend([None] * other.n_rows)
+        self.n_rows += other.n_rows
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Returns a `DataFrame` with a `RangeIndex`."""
+        df = pd.DataFrame(self.columns, columns=pd.Index(list(self.columns)))
+        for column in self.datetime_columns:
+            df[column] = pd.to_datetime(df[column]).astype("datetime64[ns]")
+        return df
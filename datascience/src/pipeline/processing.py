@@ -3,7 +3,7 @@ import logging
 import re
 from functools import partial
 from io import StringIO
-from typing import Any, Hashable, List, Union
+from typing import Any, Hashable, List, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -523,6 +523,144 @@ def prepare_df_for_loading(
     return df_
 
 
+def encode_keys(
+    left: pd.DataFrame, right: pd.DataFrame, keys: List[str]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes the values of the `keys` columns of two DataFrames into integer codes,
+    which are shared between the two DataFrames : equal values in a given column of
+    `left` and `right` are given the same code. Null values are encoded as -1.
+
+    Args:
+        left (pd.DataFrame): pandas DataFrame
+        right (pd.DataFrame): pandas DataFrame
+        keys (List[str]): columns to encode, which must be present in both DataFrames
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: integer codes of `left` and `right`, in arrays
+        of shape `(len(left), len(keys))` and `(len(right), len(keys))`
+    """
+    left_codes = np.empty((len(left), len(keys)), dtype=np.int64)
+    right_codes = np.empty((len(right), len(keys)), dtype=np.int64)
+
+    for i, key in enumerate(keys):
+        left_values, right_values = left[key].to_numpy(), right[key].to_numpy()
+        if left_values.dtype != right_values.dtype:
+            left_values = left_values.astype(object)
+            right_values = right_values.astype(object)
+        codes, _ = pd.factorize(np.concatenate([left_values, right_values]))
+        left_codes[:, i] = codes[: len(left)]
+        right_codes[:, i] = codes[len(left) :]
+
+    return left_codes, right_codes
+
+
+def _combine_codes(codes: np.ndarray) -> np.ndarray:
+    """
+    Combines the non negative integer codes of several columns into a single integer
+    code per row, such that rows get the same code if and only if they have the same
+    codes in all columns.
+    """
+    res = codes[:, 0]
+    if len(res) == 0:
+        return res
+    for i in range(1, codes.shape[1]):
+        res = pd.factorize(res * (codes[:, i].max() + 1) + codes[:, i])[0]
+    return res
+
+
+def _match_codes(
+    left_codes: np.ndarray, right_codes: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the pairs of rows of `left_codes` and `right_codes` that have the same codes
+    in all columns and no negative (null) code.
+
+    Pairs are sorted by left row number, then by right row number, which is the order
+    of the rows in the result of `pd.merge(..., how="inner")`.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: left and right row numbers of the pairs
+    """
+    left_rows = np.flatnonzero((left_codes >= 0).all(axis=1))
+    right_rows = np.flatnonzero((right_codes >= 0).all(axis=1))
+
+    codes = _combine_codes(
+        np.concatenate([left_codes[left_rows], right_codes[right_rows]])
+    )
+    left_keys = codes[: len(left_rows)]
+    right_keys = codes[len(left_rows) :]
+
+    right_order = np.argsort(right_keys, kind="stable")
+    sorted_right_keys = right_keys[right_order]
+    starts = np.searchsorted(sorted_right_keys, left_keys, side="left")
+    counts = np.searchsorted(sorted_right_keys, left_keys, side="right") - starts
+
+    n_pairs = counts.sum()
+    offsets = np.arange(n_pairs) - np.repeat(np.cumsum(counts) - counts, counts)
+    right_match = right_order[np.repeat(starts, counts) + offsets]
+
+    return np.repeat(left_rows, counts), right_rows[right_match]
+
+
+def match_on_multiple_keys(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    or_join_keys: List[str],
+    and_join_keys: List[str] = None,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Finds the pairs of rows of `left` and `right` that match on the keys listed in
+    `or_join_keys` by decreasing order of priority, with the semantics of
+    `join_on_multiple_keys`.
+
+    Each key column is encoded only once into integer codes, and rows are then matched
+    on each key with a sorted search on these codes, which is much faster than
+    performing one `pd.merge` per key on DataFrames with tens of thousands of vessels.
+
+    Args:
+        left (pd.DataFrame): pandas DataFrame
+        right (pd.DataFrame): pandas DataFrame
+        or_join_keys (List[str]): list of column names to use as join keys, by
+          decreasing order of priority
+        and_join_keys (List[str], optional): list of column names to use as
+          additional join keys
+
+    Returns:
+        List[Tuple[np.ndarray, np.ndarray]]: for each key of `or_join_keys`, the left
+        and right row numbers of the pairs of rows matched on that key
+    """
+    and_join_keys = [] if and_join_keys is None else and_join_keys
+    left_codes, right_codes = encode_keys(
+        left, right, and_join_keys + list(or_join_keys)
+    )
+    and_cols = list(range(len(and_join_keys)))
+
+    matches = []
+    for i, or_join_key in enumerate(or_join_keys):
+        or_col = len(and_join_keys) + i
+        left_rows, right_rows = _match_codes(
+            left_codes[:, and_cols + [or_col]], right_codes[:, and_cols + [or_col]]
+        )
+
+        # Rows that were matched on a key of higher priority were already joined,
+        # and rows that have distinct values on a key of higher priority must not be
+        # joined : pairs are only kept if keys of higher priority are null on at
+        # least one side.
+        for j, previous_key in enumerate(or_join_keys[:i]):
+            if previous_key in and_join_keys or previous_key == or_join_key:
+                continue
+            previous_col = len(and_join_keys) + j
+            keep = (left_codes[left_rows, previous_col] < 0) | (
+                right_codes[right_rows, previous_col] < 0
+            )
+            left_rows, right_rows = left_rows[keep], right_rows[keep]
+
+        matches.append((left_rows, right_rows))
+
+    return matches
+
+
 def join_on_multiple_keys(
     left: pd.DataFrame,
     right: pd.DataFrame,
@@ -545,6 +683,10 @@ def join_on_multiple_keys(
     right MUST match on their highest priority non null key (which come first in the
     list) but MIGHT not match on lower priority keys (which come later in the list).
 
+    Key columns are encoded once into integer codes and rows are matched with sorted
+    searches on these codes (see `match_on_multiple_keys`). The rows matched on each
+    key are sorted by row number in `left`, then by row number in `right`.
+
     During each of the joins on the individual keys, non-joining key pairs and, if any,
     columns common to both left and right DataFrames, are coalesced (from left to
     right) if `coalesce_common_columns` is `True` (the default).
@@ -587,55 +729,29 @@ def join_on_multiple_keys(
         pd.DataFrame: result of join operation
     """
 
-    joins = []
-    left = left.copy(deep=True)
-    right = right.copy(deep=True)
-    common_columns = set.intersection(set(left.columns), set(right.columns))
-    keys_already_joined = set()
     and_join_keys = [] if and_join_keys is None else and_join_keys
+    common_columns = set.intersection(set(left.columns), set(right.columns))
     left_cols = list(left)
     right_cols = list(right)
+    right_only_cols = [col for col in right_cols if col not in common_columns]
 
-    # Number rows for future use
-    if how in ("left", "outer"):
-        left_id = get_unused_col_name("left_row_number", left)
-        left[left_id] = range(len(left))
+    matches = match_on_multiple_keys(left, right, or_join_keys, and_join_keys)
 
-    if how in ("right", "outer"):
-        right_id = get_unused_col_name("right_row_number", right)
-        right[right_id] = range(len(right))
-
-    # Attempt to perform the join successively on each key
-    for or_join_key in or_join_keys:
-        join_keys = and_join_keys + [or_join_key]
-
-        right_with_keys = right.dropna(subset=join_keys)
-        left_with_keys = left.dropna(subset=join_keys)
-
-        join = pd.merge(
-            left_with_keys,
-            right_with_keys,
-            on=join_keys,
-            how="inner",
-            suffixes=("_left", "_right"),
-        )
-
-        columns_to_merge = common_columns - set(join_keys)
-
-        for column_to_merge in columns_to_merge:
-            [l, r] = [f"{column_to_merge}_left", f"{column_to_merge}_right"]
+    joins = []
+    for or_join_key, (left_rows, right_rows) in zip(or_join_keys, matches):
+        join_keys = set(and_join_keys + [or_join_key])
+        join_left = left.iloc[left_rows].reset_index(drop=True)
+        join_right = right.iloc[right_rows].reset_index(drop=True)
 
-            if column_to_merge in keys_already_joined:
-                join = join[(join[r].isna()) | (join[l].isna())]
+        join = pd.concat([join_left, join_right[right_only_cols]], axis=1)
 
+        for column_to_merge in common_columns - join_keys:
             if coalesce_common_columns:
-                join[column_to_merge] = coalesce(join[[l, r]])
-            else:
-                join[column_to_merge] = join[l]
-
-            join = join.drop(columns=[l, r])
-
-        keys_already_joined.add(or_join_key)
+                left_values = join_left[column_to_merge].to_numpy(dtype=object)
+                right_values = join_right[column_to_merge].to_numpy(dtype=object)
+                values = np.where(pd.isna(left_values), right_values, left_values)
+                values[pd.isna(values)] = None
+                join[column_to_merge] = pd.Series(values, dtype=object)
 
         joins.append(join)
 
@@ -644,10 +760,16 @@ def join_on_multiple_keys(
 
     # Add unmatched rows if performing left, right or outer joins
     if how in ("left", "outer"):
-        res = pd.concat([res, left.loc[~left[left_id].isin(res[left_id])]], axis=0)
+        matched_left_rows = np.concatenate([m[0] for m in matches])
+        left_unmatched = np.ones(len(left), dtype=bool)
+        left_unmatched[matched_left_rows] = False
+        res = pd.concat([res, left.loc[left_unmatched]], axis=0)
 
     if how in ("right", "outer"):
-        res = pd.concat([res, right.loc[~right[right_id].isin(res[right_id])]], axis=0)
+        matched_right_rows = np.concatenate([m[1] for m in matches])
+        right_unmatched = np.ones(len(right), dtype=bool)
+        right_unmatched[matched_right_rows] = False
+        res = pd.concat([res, right.loc[right_unmatched]], axis=0)
 
     res.index = np.arange(0, len(res))
 
@@ -695,25 +817,15 @@ def left_isin_right_by_decreasing_priority(
 
     assert list(left) == list(right)
 
-    left = left.copy(deep=True)
-    right = right.copy(deep=True)
-    cols = list(left)
-
-    id_col = get_unused_col_name("id", left)
-    left[id_col] = np.arange(len(left))
+    matches = match_on_multiple_keys(left, right, or_join_keys=list(left))
 
-    isin_right_col = get_unused_col_name("isin_right", right)
-    right[isin_right_col] = True
+    res = np.zeros(len(left), dtype=bool)
+    for left_rows, _ in matches:
+        res[left_rows] = True
 
-    res = join_on_multiple_keys(left, right, or_join_keys=cols, how="left")
-    res = (
-        res.drop_duplicates(subset=[id_col])
-        .sort_values(id_col)[isin_right_col]
-        .fillna(False)
+    return pd.Series(
+        res, index=left.index, name=get_unused_col_name("isin_right", right)
     )
-    res.index = left.index
-
-    return res
 
 
 def drop_duplicates_by_decreasing_priority(
@@ -884,16 +996,24 @@ def back_propagate_ones(arr: np.array, steps: int) -> np.array:
         >>> back_propagate_ones(arr, 1)
         array([nan,  0.,  1.,  1.,  0.,  1.,  1.,  1.,  1.,  1.])
     """
-    if steps == 0:
-        return arr
-    else:
-        previous_step = back_propagate_ones(np.append(arr[1:], np.nan), steps - 1)
-        tmp = np.concatenate((arr[:, None], previous_step[:, None]), axis=1)
-
-        ones = np.equal(tmp, 1).any(axis=1)
-        nans = np.isnan(tmp).any(axis=1)
-        res = np.where((nans & (~ones)), np.nan, ones)
-        return res
+    n = len(arr)
+    idx = np.arange(n)
+
+    # Index of the next `1.0` and of the next `np.nan` at or after each element (or a
+    # sentinel index beyond reach if there is none), computed with a reversed
+    # cumulative minimum instead of shifting the array `steps` times.
+    next_one = np.where(arr == 1, idx, n + steps)
+    next_one = np.minimum.accumulate(next_one[::-1])[::-1]
+
+    next_nan = np.where(np.isnan(arr), idx, n + steps)
+    next_nan = np.minimum.accumulate(next_nan[::-1])[::-1]
+
+    res = np.where(
+        next_one - idx <= steps,
+        1.0,
+        np.where((next_nan - idx <= steps) | (idx + steps >= n), np.nan, 0.0),
+    )
+    return res
 
 
 def rows_belong_to_sequence(
@@ -912,6 +1032,9 @@ def rows_belong_to_sequence(
     before the beginning and after the end of the array are not known and might be
     needed to determine the result.
 
+    The computation is done in O(n) whatever the `window_length`, see
+    `values_belong_to_sequence`.
+
     Args:
         arr (np.array): 2D numpy array
         row (np.array): 1D numpy array with the same length as the number of columns in
@@ -946,36 +1069,90 @@ def rows_belong_to_sequence(
         >>> rows_belong_to_sequence(arr, row, 2)
         array([nan,  0.,  0.,  1.,  1., 0.])
     """
-    ends_of_sequences = array_equals_row_on_window(
-        arr,
-        row,
-        window_length=window_length,
-    )
+    matches = (arr == row).all(axis=1)
+    return values_belong_to_sequence(matches, window_length=window_length)
 
-    rows_known = back_propagate_ones(ends_of_sequences, steps=window_length - 1)
 
-    # To test if rows at the beginning and at the end of the array could possibly
-    # belong to a sequence `row` exceeding the boundaries of the array, we add rows to
-    # the array and test again
-    extended_arr = np.concatenate(
-        (
-            row * np.ones((window_length - 1, len(row))),
-            arr,
-            row * np.ones((window_length - 1, len(row))),
-        )
-    )
+def values_belong_to_sequence(
+    values: np.array,
+    window_length: int,
+    group_starts: Union[None, np.array] = None,
+) -> np.array:
+    """
+    Tests whether each element of an input 1D boolean array belongs to a sequence of
+    at least `window_length` consecutive `True` values, and returns the result as a
+    float array with the same length as the input array.
+
+    The semantics are the same as those of `rows_belong_to_sequence`, `values` being
+    the result of the comparison of each row with the reference `row`: elements of
+    sequences of `True` values that are shorter than `window_length` but which start
+    at the beginning or end at the end of the array may belong to a longer sequence
+    exceeding the boundaries of the array, and evaluate to `np.nan`.
 
-    ends_of_sequences_extended = array_equals_row_on_window(
-        extended_arr,
-        row,
-        window_length=window_length,
+    If `group_starts` is given, the array is considered to be the concatenation of
+    several independent arrays (typically the positions of several vessels) and the
+    result is the same as if each group had been evaluated separately.
+
+    The computation is done in O(n), with a constant number of array allocations,
+    based on the start and end of each sequence of `True` values.
+
+    Args:
+        values (np.array): 1D boolean array
+        window_length (int): minimum number of consecutive `True` values for the
+          result to be `True`
+        group_starts (np.array, optional): 1D boolean array, `True` at the first
+          element of each group. If not given, all values are considered to belong to
+          the same group. Defaults to None.
+
+    Returns:
+        np.array: 1D float array of the same length as the input array, with values
+        `0.0`, `1.0` and `np.nan`
+
+    Examples:
+        >>> values_belong_to_sequence(np.array([True, True, False, True, True]), 2)
+        array([1., 1., 0., 1., 1.])
+        >>> values_belong_to_sequence(
+        ...     np.array([True, False, False, True, True, False]), 2
+        ... )
+        array([nan,  0.,  0.,  1.,  1., 0.])
+    """
+    values = np.asarray(values, dtype=bool)
+    n = len(values)
+    res = np.zeros(n)
+
+    if n == 0:
+        return res
+
+    if group_starts is None:
+        group_starts = np.zeros(n, dtype=bool)
+        group_starts[0] = True
+
+    group_ends = np.empty(n, dtype=bool)
+    group_ends[:-1] = group_starts[1:]
+    group_ends[-1] = True
+
+    # Sequences of `True` values start at elements that are `True` and either follow
+    # a `False` value or start a group, and end symmetrically.
+    sequence_starts = values.copy()
+    sequence_starts[1:] &= ~values[:-1] | group_starts[1:]
+    sequence_ends = values.copy()
+    sequence_ends[:-1] &= ~values[1:] | group_ends[:-1]
+
+    sequence_starts_idx = np.flatnonzero(sequence_starts)
+    sequence_ends_idx = np.flatnonzero(sequence_ends)
+    sequence_lengths = sequence_ends_idx - sequence_starts_idx + 1
+    sequence_is_truncated = (
+        group_starts[sequence_starts_idx] | group_ends[sequence_ends_idx]
     )
 
-    rows_maybe = back_propagate_ones(
-        ends_of_sequences_extended, steps=window_length - 1
-    )[window_length - 1 : -(window_length - 1)]
+    sequence_res = np.where(
+        sequence_lengths >= window_length,
+        1.0,
+        np.where(sequence_is_truncated, np.nan, 0.0),
+    )
 
-    res = np.where(np.isnan(rows_known) & rows_maybe.astype(bool), np.nan, rows_maybe)
+    sequence_numbers = np.cumsum(sequence_starts) - 1
+    res[values] = sequence_res[sequence_numbers[values]]
 
     return res
 
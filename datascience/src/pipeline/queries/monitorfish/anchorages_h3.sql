@@ -0,0 +1,3 @@
+SELECT
+    h3
+FROM public.anchorages
@@ -0,0 +1,2 @@
+SELECT version
+FROM public.anchorages_version
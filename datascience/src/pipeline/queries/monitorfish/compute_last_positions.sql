@@ -18,6 +18,7 @@ WITH last_n_minutes_positions AS (
             ORDER BY date_time DESC, id DESC) AS rk
     FROM positions
     WHERE date_time > CURRENT_TIMESTAMP - make_interval(mins => :minutes)
+    AND id > :min_position_id
     AND date_time < CURRENT_TIMESTAMP + INTERVAL '1 day'
     AND (internal_reference_number IS NOT NULL OR 
          external_reference_number IS NOT NULL OR
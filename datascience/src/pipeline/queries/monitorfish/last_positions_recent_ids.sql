@@ -0,0 +1,3 @@
+SELECT id
+FROM last_positions
+WHERE id > (SELECT MAX(id) FROM last_positions) - :id_overlap
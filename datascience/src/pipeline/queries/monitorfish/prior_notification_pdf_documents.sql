@@ -0,0 +1,8 @@
+SELECT
+    report_id,
+    content_hash,
+    pdf_document
+FROM prior_notification_pdf_documents
+WHERE
+    report_id IN :report_ids
+    AND content_hash IS NOT NULL
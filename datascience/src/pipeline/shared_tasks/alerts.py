@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List
+from typing import List, Union
 
 import pandas as pd
 import prefect
@@ -239,26 +239,36 @@ def filter_silenced_alerts(
 
 
 @task(checkpoint=False)
-def load_alerts(alerts: pd.DataFrame, alert_config_name: str):
+def load_alerts(alerts: pd.DataFrame, alert_config_name: Union[str, List[str]]):
     """
     Updates the `pending_alerts` that have the specified `alert_config_name` by:
 
     - deleting alerts in the `pending_alerts`table of the specified `alert_config_name`
     - inserting alerts of the `alerts` dataframe into the `pending_alerts` table
 
+    Both operations are run in a single transaction.
+
     Args:
         alerts (pd.DataFrame): Alerts to load into the `pending_alerts` table
-        alert_config_name (str): Name that uniquely identifies the set of parameters
-          used for the flow run
+        alert_config_name (Union[str, List[str]]): Name that uniquely identifies the
+          set of parameters used for the flow run, or list of such names when alerts
+          of several configurations are loaded together
     """
 
+    alert_config_names = (
+        alert_config_name
+        if isinstance(alert_config_name, list)
+        else [alert_config_name]
+    )
+
     try:
-        assert alert_config_name and isinstance(alert_config_name, str)
+        assert alert_config_names
+        assert all(name and isinstance(name, str) for name in alert_config_names)
     except AssertionError:
         raise ValueError(
             (
-                "alert_config_name must be a non null `str`, "
-                f"got {alert_config_name} instead."
+                "alert_config_name must be a non null `str` or a non empty list of "
+                f"non null `str`, got {alert_config_name} instead."
             )
         )
 
@@ -282,7 +292,7 @@ def load_alerts(alerts: pd.DataFrame, alert_config_name: str):
         delete_rows(
             table=table,
             id_column="alert_config_name",
-            ids_to_delete=[alert_config_name],
+            ids_to_delete=alert_config_names,
             connection=connection,
             logger=logger,
         )
@@ -2,8 +2,8 @@ import pandas as pd
 from prefect import task
 
 from config import ANCHORAGES_H3_CELL_RESOLUTION
-from src.pipeline.generic_tasks import extract
-from src.pipeline.helpers.spatial import get_h3_indices
+from src.pipeline.helpers.anchorages import anchorages_index
+from src.pipeline.helpers.spatial import get_h3_cells
 from src.pipeline.processing import get_first_non_null_column_name
 
 
@@ -17,6 +17,9 @@ def tag_positions_at_port(positions: pd.DataFrame) -> pd.DataFrame:
     latitude-longitude position matches that of a port or anchor area, then `is_at_port`
     will be `True`.
 
+    The referential of ports and anchor areas is queried with the h3 cells of the
+    positions, or held in memory by `anchorages_index` for large numbers of positions.
+
     Additionnally, if a `is_on_land` boolean column is present in the input DataFrame,
     positions with `is_on_land` = True will have `is_at_port` = True regardless of the
     latitude-longitude position. The `is_on_land` column is dropped after being taken
@@ -36,24 +39,13 @@ def tag_positions_at_port(positions: pd.DataFrame) -> pd.DataFrame:
         positions["is_at_port"] = False
 
     else:
-        positions["h3"] = get_h3_indices(
-            positions,
-            lat="latitude",
-            lon="longitude",
+        h3_cells = get_h3_cells(
+            positions["latitude"].values.astype(float),
+            positions["longitude"].values.astype(float),
             resolution=ANCHORAGES_H3_CELL_RESOLUTION,
         )
 
-        h3_indices_at_port = set(
-            extract(
-                db_name="monitorfish_remote",
-                query_filepath="monitorfish/h3_is_anchorage.sql",
-                params={"h3_cells": tuple(positions.h3)},
-            )["h3"]
-        )
-
-        positions["is_at_port"] = positions.h3.isin(h3_indices_at_port)
-
-        positions = positions.drop(columns=["h3"])
+        positions["is_at_port"] = anchorages_index.is_anchorage(h3_cells)
 
         if "is_on_land" in positions:
             positions["is_at_port"] = positions[["is_at_port", "is_on_land"]].any(
@@ -4,29 +4,109 @@ import os
 import pathlib
 import shutil
 import sys
-from io import StringIO
-from typing import Sequence, Union
+import threading
+import time
+from io import BytesIO, StringIO
+from typing import List, Sequence, Union
 
 import geoalchemy2
+import pandas as pd
 import sqlalchemy
 from sqlalchemy import MetaData, Table, func, select
 from sqlalchemy.exc import InvalidRequestError
 
+from config import TABLE_REFLECTION_CACHE_TTL_SECONDS
+from src.pipeline.binary_copy import df_to_pgcopy_binary
+
 # ***************************** Database operations utils *****************************
 
 
+class TableReflectionCache:
+    """In-memory cache of reflected sqlalchemy `Table` objects, to avoid reflecting
+    the same tables from the database on every flow run.
+
+    Tables are cached per database (identified by the engine's URL), schema and table
+    name, and expire after `ttl_seconds`. Entries can also be invalidated explicitly,
+    for instance after running migrations.
+
+    Instances are thread-safe and can be shared between the tasks of flows run with
+    `LocalDaskExecutor`.
+
+    Args:
+        ttl_seconds (float): time to live of cached tables, in seconds
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Union[sqlalchemy.Table, None]:
+        """Returns the cached `Table` for `key`, or `None` if there is no such
+        table or if it has expired."""
+        with self._lock:
+            entry = self._tables.get(key)
+            if entry is None:
+                return None
+
+            table, cached_at = entry
+            if time.monotonic() - cached_at > self.ttl_seconds:
+                del self._tables[key]
+                return None
+            return table
+
+    def set(self, key: tuple, table: sqlalchemy.Table):
+        with self._lock:
+            self._tables[key] = (table, time.monotonic())
+
+    def invalidate(self, table_name: str = None, schema: str = None):
+        """Removes tables from the cache. With no arguments, the whole cache is
+        emptied.
+
+        Args:
+            table_name (str, optional): if given, only tables with this name are
+              removed. Defaults to None.
+            schema (str, optional): if given, only tables in this schema are removed.
+              Defaults to None.
+        """
+        with self._lock:
+            self._tables = {
+                (url, table_schema, name): entry
+                for (url, table_schema, name), entry in self._tables.items()
+                if not (
+                    (table_name is None or name == table_name)
+                    and (schema is None or table_schema == schema)
+                )
+            }
+
+
+table_reflection_cache = TableReflectionCache(
+    ttl_seconds=TABLE_REFLECTION_CACHE_TTL_SECONDS
+)
+
+
 def get_table(
     table_name: str,
     schema: str,
     conn: sqlalchemy.engine.Connectable,
     logger: logging.Logger,
+    use_cache: bool = True,
 ) -> sqlalchemy.Table:
     """Performs reflection to get a sqlalchemy Table object with metadata reflecting
     the table found in the databse. Returns resulting Table object.
 
+    Reflected tables are cached in `table_reflection_cache` and reused in subsequent
+    calls, unless `use_cache` is `False`.
+
     If the table is not found in the database, raises an error.
     """
 
+    key = (conn.engine.url, schema, table_name)
+    if use_cache:
+        table = table_reflection_cache.get(key)
+        if table is not None:
+            return table
+
     meta = MetaData(schema=schema)
     meta.bind = conn
     try:
@@ -50,6 +130,8 @@ def get_table(
         )
         raise
 
+    table_reflection_cache.set(key, table)
+
     return table
 
 
@@ -106,6 +188,127 @@ def delete_rows(
         logger.info(f"Rows after deletion: {n}.")
 
 
+def create_staging_table(
+    table: sqlalchemy.Table,
+    connection: sqlalchemy.engine.base.Connection,
+) -> sqlalchemy.Table:
+    """Creates an empty temporary table with the same columns as `table`, which is
+    dropped at the end of the current transaction. Returns the corresponding
+    `Table` object.
+
+    Args:
+        table (sqlalchemy.Table): table to copy the columns of
+        connection (sqlalchemy.engine.base.Connection): database connection
+
+    Returns:
+        sqlalchemy.Table: the temporary table
+    """
+    staging_table = Table(
+        f"{table.name}_staging",
+        MetaData(),
+        *(sqlalchemy.Column(c.name, c.type) for c in table.columns),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP",
+    )
+    # The table is qualified with `pg_temp` so that a permanent table with the same
+    # name is never dropped
+    connection.execute(
+        sqlalchemy.text(f'DROP TABLE IF EXISTS pg_temp."{staging_table.name}"')
+    )
+    staging_table.create(connection)
+    return staging_table
+
+
+def apply_diff(
+    table: sqlalchemy.Table,
+    staging_table: sqlalchemy.Table,
+    columns: List[str],
+    key_columns: List[str],
+    connection: sqlalchemy.engine.base.Connection,
+    logger: logging.Logger,
+):
+    """Makes the contents of `table` equal to those of `staging_table` by deleting,
+    updating and inserting only the rows that differ between the two tables.
+
+    Rows are matched by the hash of their `key_columns`, which are compared null-safe,
+    and updated only if the hash of their `columns` differ. If the keys are not unique
+    in `staging_table`, rows cannot be matched and the contents of `table` are
+    replaced by those of `staging_table` instead.
+
+    To avoid scanning `table` on every load, the uniqueness of its keys is not
+    checked : they must be unique, which is the case if it is only loaded with data
+    that has unique keys.
+
+    Args:
+        table (sqlalchemy.Table): table to update
+        staging_table (sqlalchemy.Table): table with the new contents of `table`
+        columns (List[str]): columns to compare and update. Other columns of `table`
+          are left untouched by updates and take their default value in inserts.
+        key_columns (List[str]): columns that identify rows
+        connection (sqlalchemy.engine.base.Connection): database connection
+        logger (logging.Logger): logger
+    """
+
+    def row_hash(t: sqlalchemy.Table, cols: List[str]):
+        # ROW(...)::text is never null, even if all values are null
+        return func.md5(
+            sqlalchemy.cast(func.row(*(t.c[c] for c in cols)), sqlalchemy.Text)
+        )
+
+    duplicate_keys = (
+        select(row_hash(staging_table, key_columns))
+        .group_by(row_hash(staging_table, key_columns))
+        .having(func.count() > 1)
+    )
+
+    if connection.execute(select(duplicate_keys.exists())).scalar():
+        logger.warning(
+            f"Keys {key_columns} are not unique, replacing all rows of {table.name}."
+        )
+        delete(table, connection, logger)
+        connection.execute(
+            table.insert().from_select(
+                columns, select(*(staging_table.c[c] for c in columns))
+            )
+        )
+        return
+
+    target_keys = row_hash(table, key_columns)
+    staging_keys = row_hash(staging_table, key_columns)
+
+    deleted = connection.execute(
+        table.delete().where(target_keys.not_in(select(staging_keys)))
+    ).rowcount
+
+    updated_columns = [c for c in columns if c not in key_columns]
+    if updated_columns:
+        updated = connection.execute(
+            table.update()
+            .values({c: staging_table.c[c] for c in updated_columns})
+            .where(
+                target_keys == staging_keys,
+                row_hash(table, columns) != row_hash(staging_table, columns),
+            )
+        ).rowcount
+    else:
+        updated = 0
+
+    inserted = connection.execute(
+        table.insert().from_select(
+            columns,
+            select(*(staging_table.c[c] for c in columns)).where(
+                staging_keys.not_in(select(target_keys))
+            ),
+        )
+    ).rowcount
+
+    if logger:
+        logger.info(
+            f"Deleted {deleted}, updated {updated} and inserted {inserted} rows "
+            f"in {table.name}."
+        )
+
+
 def psql_insert_copy(table, conn, keys, data_iter):
     """
     Execute SQL statement inserting data
@@ -136,6 +339,51 @@ def psql_insert_copy(table, conn, keys, data_iter):
         cur.copy_expert(sql=sql, file=s_buf)
 
 
+def psql_insert_copy_binary(
+    df: pd.DataFrame,
+    table: sqlalchemy.Table,
+    connection: sqlalchemy.engine.base.Connection,
+    jsonb_columns: List[str] = None,
+    handle_array_conversion_errors: bool = True,
+    value_on_array_conversion_error: Union[str, None] = "{}",
+):
+    """Inserts the rows of a DataFrame into a table using Postgresql's binary
+    `COPY` format. Contrary to `psql_insert_copy`, values do not need to be
+    serialized as strings beforehand : each column is encoded according to the type
+    of the table column of the same name. See `binary_copy.df_to_pgcopy_binary`.
+
+    Args:
+        df (pd.DataFrame): data to insert. All columns must exist in the table.
+        table (sqlalchemy.Table): reflected table to insert the data into
+        connection (sqlalchemy.engine.base.Connection): database connection
+        jsonb_columns (List[str], optional): `json` or `jsonb` columns whose values
+          are python objects to serialize. Other `json` or `jsonb` columns must
+          contain json strings. Defaults to None.
+        handle_array_conversion_errors (bool): whether to handle or raise upon
+          values that are not list-like in array columns. Defaults to True.
+        value_on_array_conversion_error (Union[str, None]): '{}' or None, the
+          value to load when such errors are handled. Defaults to '{}'.
+    """
+    data = df_to_pgcopy_binary(
+        df,
+        table,
+        jsonb_columns=jsonb_columns,
+        handle_array_conversion_errors=handle_array_conversion_errors,
+        value_on_array_conversion_error=value_on_array_conversion_error,
+    )
+
+    columns = ", ".join('"{}"'.format(k) for k in df.columns)
+    if table.schema:
+        table_name = f'"{table.schema}"."{table.name}"'
+    else:
+        table_name = f'"{table.name}"'
+
+    dbapi_conn = connection.connection
+    with dbapi_conn.cursor() as cur:
+        sql = "COPY {} ({}) FROM STDIN WITH BINARY".format(table_name, columns)
+        cur.copy_expert(sql=sql, file=BytesIO(data))
+
+
 def move(
     src_fp: pathlib.Path, dest_dirpath: pathlib.Path, if_exists: str = "raise"
 ) -> None:
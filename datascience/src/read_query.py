@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pathlib import Path
 from typing import Union
 
@@ -11,6 +12,22 @@ from config import QUERIES_LOCATION
 from .db_config import create_engine
 
 
+@lru_cache(maxsize=None)
+def read_saved_query_file(sql_filepath: Union[str, Path]) -> str:
+    """Returns the contents of a saved .sql file. Files are read only once per process
+    and then cached.
+
+    Args:
+        sql_filepath (str): path to .sql file, starting from the saved queries folder.
+          example : 'ocan/nav_fr_peche.sql'
+
+    Returns:
+        str: SQL query
+    """
+    with open(QUERIES_LOCATION / sql_filepath, "r") as sql_file:
+        return sql_file.read()
+
+
 def read_saved_query(
     sql_filepath: Union[str, Path],
     *,
@@ -71,9 +88,7 @@ def read_saved_query(
     Returns:
         Union[pd.DataFrame, gpd.DataFrame]: Query results
     """
-    sql_filepath = QUERIES_LOCATION / sql_filepath
-    with open(sql_filepath, "r") as sql_file:
-        query = text(sql_file.read())
+    query = text(read_saved_query_file(sql_filepath))
 
     return read_query(
         query,
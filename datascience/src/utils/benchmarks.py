@@ -0,0 +1,574 @@
+"""
+Micro-benchmarks of performance-sensitive functions of the pipeline, to be run
+manually, for instance in a notebook :
+
+    >>> from src.utils.benchmarks import benchmark_rows_belong_to_sequence
+    >>> benchmark_rows_belong_to_sequence()
+"""
+
+import os
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from time import perf_counter
+from timeit import timeit
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+import requests
+
+from config import TEST_DATA_LOCATION
+from src.pipeline.helpers.backend_api import ApiRequest, BackendApiClient
+from src.pipeline.helpers.emails import SmtpConnectionPool
+from src.pipeline.parsers.ers import ers
+from src.pipeline.parsers.flux import flux
+from src.pipeline.processing import (
+    array_equals_row_on_window,
+    coalesce,
+    drop_duplicates_by_decreasing_priority,
+    get_unused_col_name,
+    join_on_multiple_keys,
+    left_isin_right_by_decreasing_priority,
+    rows_belong_to_sequence,
+)
+from src.utils.local_servers import LocalHttpServer, LocalSmtpServer
+
+
+def _back_propagate_ones_recursive(arr: np.array, steps: int) -> np.array:
+    """
+    Former recursive implementation of `back_propagate_ones`, kept as a reference.
+    """
+    if steps == 0:
+        return arr
+    else:
+        previous_step = _back_propagate_ones_recursive(
+            np.append(arr[1:], np.nan), steps - 1
+        )
+        tmp = np.concatenate((arr[:, None], previous_step[:, None]), axis=1)
+
+        ones = np.equal(tmp, 1).any(axis=1)
+        nans = np.isnan(tmp).any(axis=1)
+        res = np.where((nans & (~ones)), np.nan, ones)
+        return res
+
+
+def rows_belong_to_sequence_reference(
+    arr: np.array, row: np.array, window_length: int
+) -> np.array:
+    """
+    Former implementation of `rows_belong_to_sequence`, based on sliding windows and
+    recursive back propagation, kept as a reference.
+    """
+    ends_of_sequences = array_equals_row_on_window(
+        arr,
+        row,
+        window_length=window_length,
+    )
+
+    rows_known = _back_propagate_ones_recursive(
+        ends_of_sequences, steps=window_length - 1
+    )
+
+    extended_arr = np.concatenate(
+        (
+            row * np.ones((window_length - 1, len(row))),
+            arr,
+            row * np.ones((window_length - 1, len(row))),
+        )
+    )
+
+    ends_of_sequences_extended = array_equals_row_on_window(
+        extended_arr,
+        row,
+        window_length=window_length,
+    )
+
+    rows_maybe = _back_propagate_ones_recursive(
+        ends_of_sequences_extended, steps=window_length - 1
+    )[window_length - 1 : -(window_length - 1)]
+
+    res = np.where(np.isnan(rows_known) & rows_maybe.astype(bool), np.nan, rows_maybe)
+
+    return res
+
+
+def join_on_multiple_keys_reference(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    or_join_keys: list,
+    how: str = "inner",
+    and_join_keys: list = None,
+    coalesce_common_columns: bool = True,
+):
+    """
+    Former implementation of `join_on_multiple_keys`, based on one `pd.merge` per
+    key, kept as a reference.
+    """
+
+    joins = []
+    left = left.copy(deep=True)
+    right = right.copy(deep=True)
+    common_columns = set.intersection(set(left.columns), set(right.columns))
+    keys_already_joined = set()
+    and_join_keys = [] if and_join_keys is None else and_join_keys
+    left_cols = list(left)
+    right_cols = list(right)
+
+    # Number rows for future use
+    if how in ("left", "outer"):
+        left_id = get_unused_col_name("left_row_number", left)
+        left[left_id] = range(len(left))
+
+    if how in ("right", "outer"):
+        right_id = get_unused_col_name("right_row_number", right)
+        right[right_id] = range(len(right))
+
+    # Attempt to perform the join successively on each key
+    for or_join_key in or_join_keys:
+        join_keys = and_join_keys + [or_join_key]
+
+        right_with_keys = right.dropna(subset=join_keys)
+        left_with_keys = left.dropna(subset=join_keys)
+
+        join = pd.merge(
+            left_with_keys,
+            right_with_keys,
+            on=join_keys,
+            how="inner",
+            suffixes=("_left", "_right"),
+        )
+
+        columns_to_merge = common_columns - set(join_keys)
+
+        for column_to_merge in columns_to_merge:
+            [l, r] = [f"{column_to_merge}_left", f"{column_to_merge}_right"]
+
+            if column_to_merge in keys_already_joined:
+                join = join[(join[r].isna()) | (join[l].isna())]
+
+            if coalesce_common_columns:
+                join[column_to_merge] = coalesce(join[[l, r]])
+            else:
+                join[column_to_merge] = join[l]
+
+            join = join.drop(columns=[l, r])
+
+        keys_already_joined.add(or_join_key)
+
+        joins.append(join)
+
+    # Concatenate all join results
+    res = pd.concat(joins, axis=0)
+
+    # Add unmatched rows if performing left, right or outer joins
+    if how in ("left", "outer"):
+        res = pd.concat([res, left.loc[~left[left_id].isin(res[left_id])]], axis=0)
+
+    if how in ("right", "outer"):
+        res = pd.concat([res, right.loc[~right[right_id].isin(res[right_id])]], axis=0)
+
+    res.index = np.arange(0, len(res))
+
+    columns_order = left_cols + [col for col in right_cols if col not in left_cols]
+    res = res[columns_order]
+
+    return res
+
+
+def left_isin_right_by_decreasing_priority_reference(
+    left: pd.DataFrame, right: pd.DataFrame
+) -> pd.Series:
+    """
+    Former implementation of `left_isin_right_by_decreasing_priority`, kept as a
+    reference.
+    """
+
+    assert list(left) == list(right)
+
+    left = left.copy(deep=True)
+    right = right.copy(deep=True)
+    cols = list(left)
+
+    id_col = get_unused_col_name("id", left)
+    left[id_col] = np.arange(len(left))
+
+    isin_right_col = get_unused_col_name("isin_right", right)
+    right[isin_right_col] = True
+
+    res = join_on_multiple_keys_reference(left, right, or_join_keys=cols, how="left")
+    res = (
+        res.drop_duplicates(subset=[id_col])
+        .sort_values(id_col)[isin_right_col]
+        .fillna(False)
+    )
+    res.index = left.index
+
+    return res
+
+
+def benchmark_rows_belong_to_sequence(
+    n_rows: int = 100000,
+    window_lengths: Iterable[int] = (2, 3, 5, 10, 20),
+    number: int = 10,
+) -> pd.DataFrame:
+    """
+    Compares the execution time of `rows_belong_to_sequence` with that of its former
+    implementation, on random arrays similar to the ones used in fishing activity
+    detection.
+
+    Args:
+        n_rows (int): number of rows of the test arrays. Defaults to 100000.
+        window_lengths (Iterable[int]): window lengths to test. Defaults to
+          (2, 3, 5, 10, 20).
+        number (int): number of executions of each function. Defaults to 10.
+
+    Returns:
+        pd.DataFrame: mean execution time of each implementation in milliseconds, by
+        window length
+    """
+    rng = np.random.default_rng(seed=0)
+    arr = np.concatenate(
+        (
+            (rng.random(n_rows) < 0.2)[:, None],
+            (rng.random(n_rows) < 0.7)[:, None],
+        ),
+        axis=1,
+    )
+    row = np.array([False, True])
+
+    res = []
+    for window_length in window_lengths:
+        assert np.array_equal(
+            rows_belong_to_sequence(arr, row, window_length),
+            rows_belong_to_sequence_reference(arr, row, window_length),
+            equal_nan=True,
+        )
+
+        res.append(
+            {
+                "window_length": window_length,
+                "reference_ms": 1000
+                * timeit(
+                    lambda: rows_belong_to_sequence_reference(arr, row, window_length),
+                    number=number,
+                )
+                / number,
+                "current_ms": 1000
+                * timeit(
+                    lambda: rows_belong_to_sequence(arr, row, window_length),
+                    number=number,
+                )
+                / number,
+            }
+        )
+
+    res = pd.DataFrame(res).set_index("window_length")
+    res["speedup"] = res.reference_ms / res.current_ms
+    return res
+
+
+def benchmark_logbook_parsing(repeats: int = 100, n_workers: int = 1) -> pd.DataFrame:
+    """
+    Measures the throughput of `ers.batch_parse` and `flux.batch_parse` on the xml
+    test fixtures, each repeated `repeats` times.
+
+    Args:
+        repeats (int): number of times the test fixtures are repeated in the batch of
+          messages to parse. Defaults to 100.
+        n_workers (int): number of parsing processes. Defaults to 1.
+
+    Returns:
+        pd.DataFrame: number of messages and reports parsed, duration in seconds and
+        throughput in messages per second, by transmission format
+    """
+    xml_files_location = TEST_DATA_LOCATION / "logbook/xml_files"
+    fixtures = {
+        "ERS": (ers.batch_parse, [xml_files_location / "ers"]),
+        "FLUX": (
+            flux.batch_parse,
+            [
+                xml_files_location / "flux/business",
+                xml_files_location / "flux/business_BASE64",
+            ],
+        ),
+    }
+
+    res = []
+    for transmission_format, (batch_parse, directories) in fixtures.items():
+        xml_messages = []
+        for directory in directories:
+            for filename in sorted(os.listdir(directory)):
+                with open(directory / filename) as f:
+                    xml_messages.append(f.read())
+        xml_messages = xml_messages * repeats
+
+        start = perf_counter()
+        parsed = batch_parse(xml_messages, n_workers=n_workers)
+        duration = perf_counter() - start
+
+        res.append(
+            {
+                "transmission_format": transmission_format,
+                "messages": len(xml_messages),
+                "reports": len(parsed["logbook_reports"]),
+                "seconds": duration,
+                "messages_per_second": len(xml_messages) / duration,
+            }
+        )
+
+    return pd.DataFrame(res).set_index("transmission_format")
+
+
+def make_vessels_identifiers(
+    n_vessels: int, null_share: float = 0.2, seed: int = 0
+) -> pd.DataFrame:
+    """
+    Generates random vessels' identifiers (vessel_id, cfr, ircs and
+    external_immatriculation) similar to the ones found in positions and logbook data,
+    with a share of null values in each identifier.
+
+    Args:
+        n_vessels (int): number of rows
+        null_share (float): share of null values in each identifier column.
+          Defaults to 0.2.
+        seed (int): random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: DataFrame of vessels' identifiers
+    """
+    rng = np.random.default_rng(seed=seed)
+    ids = rng.permutation(n_vessels)
+
+    def with_nulls(values: np.ndarray) -> np.ndarray:
+        values = values.astype(object)
+        values[rng.random(n_vessels) < null_share] = None
+        return values
+
+    return pd.DataFrame(
+        {
+            "vessel_id": pd.Series(with_nulls(ids), dtype=float),
+            "cfr": with_nulls(np.array([f"FRA{i:09d}" for i in ids])),
+            "ircs": with_nulls(np.array([f"F{i:06d}" for i in ids])),
+            "external_immatriculation": with_nulls(
+                np.array([f"AB{i:06d}" for i in ids])
+            ),
+        }
+    )
+
+
+def benchmark_join_on_multiple_keys(
+    n_vessels: int = 50000, number: int = 3
+) -> pd.DataFrame:
+    """
+    Compares the execution time of `join_on_multiple_keys`,
+    `left_isin_right_by_decreasing_priority` and
+    `drop_duplicates_by_decreasing_priority` with that of their former
+    implementation, on random vessels' identifiers at the scale of the fleet.
+
+    Args:
+        n_vessels (int): number of vessels in each DataFrame. Defaults to 50000.
+        number (int): number of executions of each function. Defaults to 3.
+
+    Returns:
+        pd.DataFrame: mean execution time of each implementation in milliseconds, by
+        function
+    """
+    vessel_id_cols = ["vessel_id", "cfr", "ircs", "external_immatriculation"]
+    left = make_vessels_identifiers(n_vessels, seed=0).assign(
+        latitude=np.linspace(-90, 90, n_vessels)
+    )
+    right = make_vessels_identifiers(n_vessels, seed=1).assign(
+        risk_factor=np.linspace(1, 4, n_vessels)
+    )
+    duplicated = pd.concat([left, right], ignore_index=True)
+
+    def drop_duplicates_reference(df, subset):
+        first_key_not_null = df.dropna(subset=[subset[0]]).drop_duplicates(
+            subset=[subset[0]]
+        )
+        if len(subset) == 1:
+            return first_key_not_null
+        first_key_null = drop_duplicates_reference(
+            df[df[subset[0]].isna()], subset=subset[1:]
+        )
+        first_key_null = first_key_null[
+            ~left_isin_right_by_decreasing_priority_reference(
+                first_key_null[subset], first_key_not_null[subset]
+            )
+        ]
+        return pd.concat([first_key_not_null, first_key_null])
+
+    functions = {
+        "join_on_multiple_keys": (
+            lambda: join_on_multiple_keys_reference(
+                left, right, or_join_keys=vessel_id_cols, how="left"
+            ),
+            lambda: join_on_multiple_keys(
+                left, right, or_join_keys=vessel_id_cols, how="left"
+            ),
+        ),
+        "left_isin_right_by_decreasing_priority": (
+            lambda: left_isin_right_by_decreasing_priority_reference(
+                left[vessel_id_cols], right[vessel_id_cols]
+            ),
+            lambda: left_isin_right_by_decreasing_priority(
+                left[vessel_id_cols], right[vessel_id_cols]
+            ),
+        ),
+        "drop_duplicates_by_decreasing_priority": (
+            lambda: drop_duplicates_reference(duplicated, subset=vessel_id_cols),
+            lambda: drop_duplicates_by_decreasing_priority(
+                duplicated, subset=vessel_id_cols
+            ),
+        ),
+    }
+
+    res = []
+    for function_name, (reference, current) in functions.items():
+        pd.testing.assert_frame_equal(
+            pd.DataFrame(reference()), pd.DataFrame(current())
+        )
+
+        res.append(
+            {
+                "function": function_name,
+                "reference_ms": 1000 * timeit(reference, number=number) / number,
+                "current_ms": 1000 * timeit(current, number=number) / number,
+            }
+        )
+
+    res = pd.DataFrame(res).set_index("function")
+    res["speedup"] = res.reference_ms / res.current_ms
+    return res
+
+
+def benchmark_smtp_sending(
+    n_messages: int = 200, n_threads: int = 4, latency: float = 0.005
+) -> pd.DataFrame:
+    """
+    Compares the throughput of sending messages on a new SMTP connection for each
+    message with that of sending them through a `SmtpConnectionPool`, from
+    `n_threads` threads like in flows run with a `LocalDaskExecutor`, to a
+    `LocalSmtpServer`.
+
+    Args:
+        n_messages (int): number of messages to send. Defaults to 200.
+        n_threads (int): number of sending threads. Defaults to 4.
+        latency (float): simulated latency of the SMTP server, in seconds. Defaults
+          to 0.005.
+
+    Returns:
+        pd.DataFrame: number of connections opened, duration in seconds and
+        throughput in messages per second, by sending method
+    """
+    msg = EmailMessage()
+    msg["From"] = "monitorfish@test.email"
+    msg["To"] = "someone@test.email"
+    msg["Subject"] = "Benchmark"
+    msg.set_content("<p>Benchmark</p>", subtype="html")
+
+    def send_with_new_connection(port: int):
+        with smtplib.SMTP(host="127.0.0.1", port=port) as server:
+            server.send_message(msg)
+
+    res = []
+    for method in ("new_connection", "pool"):
+        with LocalSmtpServer(latency=latency) as smtp_server:
+            if method == "pool":
+                pool = SmtpConnectionPool(
+                    "127.0.0.1", smtp_server.port, max_connections=n_threads
+                )
+
+                def send(_):
+                    pool.send_message(msg)
+
+            else:
+
+                def send(_):
+                    send_with_new_connection(smtp_server.port)
+
+            start = perf_counter()
+            with ThreadPoolExecutor(n_threads) as executor:
+                list(executor.map(send, range(n_messages)))
+            duration = perf_counter() - start
+
+            if method == "pool":
+                pool.close()
+
+            assert len(smtp_server.messages) == n_messages
+
+            res.append(
+                {
+                    "method": method,
+                    "connections": smtp_server.connections,
+                    "seconds": duration,
+                    "messages_per_second": n_messages / duration,
+                }
+            )
+
+    return pd.DataFrame(res).set_index("method")
+
+
+def benchmark_backend_api_requests(
+    n_requests: int = 500, max_concurrent_requests: int = 8, latency: float = 0.005
+) -> pd.DataFrame:
+    """
+    Compares the throughput of sending requests one by one with `requests.put`, as
+    beacon malfunctions updates used to be sent, with that of sending them in a batch
+    with a `BackendApiClient`, to a `LocalHttpServer`.
+
+    Args:
+        n_requests (int): number of requests to send. Defaults to 500.
+        max_concurrent_requests (int): maximum number of requests in flight of the
+          client. Defaults to 8.
+        latency (float): simulated latency of the server, in seconds. Defaults to
+          0.005.
+
+    Returns:
+        pd.DataFrame: number of connections opened, duration in seconds and
+        throughput in requests per second, by sending method
+    """
+    res = []
+    for method in ("one_by_one", "batch"):
+        with LocalHttpServer(latency=latency) as http_server:
+            api_requests = [
+                ApiRequest(
+                    method="PUT",
+                    url=f"{http_server.url}/beacon_malfunctions/{i}",
+                    json={"stage": "ARCHIVED"},
+                    item_id=i,
+                )
+                for i in range(n_requests)
+            ]
+
+            start = perf_counter()
+            if method == "batch":
+                client = BackendApiClient(
+                    api_key="key", max_concurrent_requests=max_concurrent_requests
+                )
+                results = client.send_batch(api_requests)
+                client.close()
+                assert all(r.ok for r in results)
+            else:
+                for api_request in api_requests:
+                    r = requests.put(
+                        url=api_request.url,
+                        json=api_request.json,
+                        headers={"X-API-KEY": "key"},
+                    )
+                    r.raise_for_status()
+            duration = perf_counter() - start
+
+            assert len(http_server.requests) == n_requests
+
+            res.append(
+                {
+                    "method": method,
+                    "connections": http_server.connections,
+                    "seconds": duration,
+                    "requests_per_second": n_requests / duration,
+                }
+            )
+
+    return pd.DataFrame(res).set_index("method")
@@ -0,0 +1,136 @@
+"""
+Stub servers listening on localhost, used to measure the throughput of the
+pipeline's network clients in tests and benchmarks without the actual servers.
+"""
+
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from typing import Iterable
+
+
+class LocalSmtpServer:
+    """
+    Minimal SMTP server listening on localhost, which accepts all messages and keeps
+    count of connections and received messages, to measure the throughput of message
+    sending without a mail server :
+
+        >>> with LocalSmtpServer(latency=0.005) as server:
+        ...     smtplib.SMTP("localhost", server.port).send_message(msg)
+
+    Args:
+        latency (float): delay in seconds before each reply of the server, to
+          simulate network latency. Defaults to 0.
+    """
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.connections = 0
+        self.messages = []
+        self._lock = threading.Lock()
+
+        smtp_server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, *lines: str):
+                sleep(smtp_server.latency)
+                self.wfile.write("".join(f"{line}\r\n" for line in lines).encode())
+
+            def handle(self):
+                with smtp_server._lock:
+                    smtp_server.connections += 1
+                self.reply("220 localhost")
+                while line := self.rfile.readline():
+                    command = line[:4].upper()
+                    if command == b"EHLO":
+                        self.reply("250-localhost", "250 8BITMIME")
+                    elif command == b"DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        data = []
+                        while (line := self.rfile.readline()) not in (b".\r\n", b""):
+                            data.append(line)
+                        with smtp_server._lock:
+                            smtp_server.messages.append(b"".join(data))
+                        self.reply("250 OK")
+                    elif command == b"QUIT":
+                        self.reply("221 Bye")
+                        break
+                    else:
+                        self.reply("250 OK")
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class LocalHttpServer:
+    """
+    Stub HTTP server listening on localhost, which answers all requests with an empty
+    200 response, or a 500 response for paths in `failing_paths`, and records the
+    requests received, to measure the throughput of API clients without a backend :
+
+        >>> with LocalHttpServer(latency=0.005) as server:
+        ...     requests.put(f"{server.url}/beacon_malfunctions/1")
+
+    Args:
+        latency (float): delay in seconds before each response of the server, to
+          simulate network latency and processing time. Defaults to 0.
+        failing_paths (Iterable[str]): paths of the requests to answer with a 500
+          response. Defaults to ().
+    """
+
+    def __init__(self, latency: float = 0, failing_paths: Iterable[str] = ()):
+        self.latency = latency
+        self.failing_paths = set(failing_paths)
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        http_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with http_server._lock:
+                    http_server.connections += 1
+
+            def handle_request(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                with http_server._lock:
+                    http_server.requests.append((self.command, self.path, body))
+                sleep(http_server.latency)
+                status = 500 if self.path in http_server.failing_paths else 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_GET = do_POST = do_PUT = handle_request
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
@@ -19,6 +19,7 @@ from config import (
     TEST_DATA_LOCATION,
 )
 from src.db_config import create_engine
+from src.pipeline.utils import table_reflection_cache
 
 migrations_folders = [
     ROOT_DIRECTORY
@@ -201,6 +202,9 @@ def create_tables(set_environment_variables, start_remote_database_container):
                 f"Error message is: {result.output}"
             )
 
+    # Tables reflected before migrations are outdated
+    table_reflection_cache.invalidate()
+
 
 @pytest.fixture()
 def reset_test_data(create_tables):
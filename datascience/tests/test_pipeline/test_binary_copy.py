@@ -0,0 +1,297 @@
+import datetime
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import (
+    REAL,
+    TIMESTAMP,
+    VARCHAR,
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    Integer,
+    MetaData,
+    Numeric,
+    Table,
+)
+from sqlalchemy.dialects.postgresql import (
+    ARRAY,
+    BYTEA,
+    DOUBLE_PRECISION,
+    ENUM,
+    INTERVAL,
+    JSONB,
+)
+
+from src.pipeline.binary_copy import (
+    PGCOPY_HEADER,
+    PGCOPY_TRAILER,
+    df_to_pgcopy_binary,
+    encode_column,
+)
+from src.pipeline.processing import df_values_to_psql_arrays
+
+
+def parse_pgcopy_binary(data: bytes) -> list:
+    """Reads binary COPY data into a list of rows, each row being a list of the
+    binary representations of the row's fields, `None` for null values."""
+    assert data.startswith(PGCOPY_HEADER)
+    assert data.endswith(PGCOPY_TRAILER)
+    data = data[len(PGCOPY_HEADER) : -len(PGCOPY_TRAILER)]
+
+    rows = []
+    i = 0
+    while i < len(data):
+        (n_fields,) = struct.unpack(">h", data[i : i + 2])
+        i += 2
+        row = []
+        for _ in range(n_fields):
+            (length,) = struct.unpack(">i", data[i : i + 4])
+            i += 4
+            if length == -1:
+                row.append(None)
+            else:
+                row.append(data[i : i + length])
+                i += length
+        rows.append(row)
+    return rows
+
+
+def encoded_values(s: pd.Series, column_type, **kwargs) -> list:
+    encoding = encode_column(s, column_type, **kwargs)
+    payload = encoding.payload.tobytes()
+    res = []
+    i = 0
+    for length in encoding.lengths:
+        if length == -1:
+            res.append(None)
+        else:
+            res.append(payload[i : i + length])
+            i += length
+    return res
+
+
+@pytest.fixture
+def table() -> Table:
+    return Table(
+        "some_table",
+        MetaData(schema="public"),
+        Column("id", Integer),
+        Column("vessel_name", VARCHAR(100)),
+        Column("latitude", DOUBLE_PRECISION),
+        Column("datetime_utc", TIMESTAMP),
+        Column("emission_period", INTERVAL),
+        Column("segments", ARRAY(VARCHAR(50))),
+        Column("gear_onboard", JSONB),
+        Column("is_at_port", Boolean),
+    )
+
+
+def test_encode_integers():
+    s = pd.Series([1, np.nan, -2.0], name="n")
+    assert encoded_values(s, Integer()) == [
+        b"\x00\x00\x00\x01",
+        None,
+        b"\xff\xff\xff\xfe",
+    ]
+    assert encoded_values(pd.Series([3], dtype="Int64"), BigInteger()) == [
+        b"\x00\x00\x00\x00\x00\x00\x00\x03",
+    ]
+
+
+def test_encode_floats():
+    s = pd.Series([1.5, None], name="x")
+    assert encoded_values(s, DOUBLE_PRECISION()) == [struct.pack(">d", 1.5), None]
+    assert encoded_values(s, REAL()) == [struct.pack(">f", 1.5), None]
+
+
+def test_encode_booleans():
+    s = pd.Series([True, None, False], name="b")
+    assert encoded_values(s, Boolean()) == [b"\x01", None, b"\x00"]
+
+
+def test_encode_timestamps_and_dates():
+    s = pd.Series(
+        [datetime.datetime(2000, 1, 1, 0, 0, 1), None, datetime.datetime(1999, 12, 31)]
+    )
+    assert encoded_values(s, TIMESTAMP()) == [
+        struct.pack(">q", 1000000),
+        None,
+        struct.pack(">q", -86400000000),
+    ]
+    assert encoded_values(s, Date()) == [
+        struct.pack(">i", 0),
+        None,
+        struct.pack(">i", -1),
+    ]
+
+    # Timezone-aware datetimes keep their local time in `timestamp` columns and are
+    # converted to UTC in `timestamptz` columns
+    s = pd.Series([pd.Timestamp("2000-01-01 02:00:00+02:00")])
+    assert encoded_values(s, TIMESTAMP()) == [struct.pack(">q", 7200000000)]
+    assert encoded_values(s, TIMESTAMP(timezone=True)) == [struct.pack(">q", 0)]
+
+
+def test_encode_intervals():
+    s = pd.Series(
+        [pd.Timedelta(hours=36, microseconds=5), None, pd.Timedelta(hours=-1)]
+    )
+    assert encoded_values(s, INTERVAL()) == [
+        struct.pack(">qii", 12 * 3600 * 1000000 + 5, 1, 0),
+        None,
+        struct.pack(">qii", 23 * 3600 * 1000000, -1, 0),
+    ]
+
+
+def test_encode_texts_and_enums():
+    s = pd.Series(["Île", None, 5])
+    assert encoded_values(s, VARCHAR()) == [
+        "Île".encode("utf-8"),
+        None,
+        b"5",
+    ]
+    assert encoded_values(s[:2], ENUM("Île", name="some_enum")) == [
+        "Île".encode("utf-8"),
+        None,
+    ]
+
+
+def test_encode_bytea():
+    s = pd.Series([b"\x59\xc1", None])
+    assert encoded_values(s, BYTEA()) == [b"\x59\xc1", None]
+
+
+def test_encode_json():
+    s = pd.Series([{"a": [1, 2]}, None], name="j")
+    assert encoded_values(s, JSONB(), jsonb_columns=["j"]) == [
+        b'\x01{"a": [1, 2]}',
+        b"\x01null",
+    ]
+
+    # Columns that are not listed in `jsonb_columns` must contain json strings
+    s = pd.Series(['{"a": [1, 2]}', None], name="k")
+    assert encoded_values(s, JSONB(), jsonb_columns=["j"]) == [
+        b'\x01{"a": [1, 2]}',
+        None,
+    ]
+
+
+def test_encode_arrays():
+    s = pd.Series([["a ", "", "bc"], None, [], np.array(["d"]), "not a list"])
+    empty_varchar_array = struct.pack(">iii", 0, 0, 1043)
+    assert encoded_values(s, ARRAY(VARCHAR(50))) == [
+        struct.pack(">iiiii", 1, 0, 1043, 2, 1)
+        + struct.pack(">i", 1)
+        + b"a"
+        + struct.pack(">i", 2)
+        + b"bc",
+        empty_varchar_array,
+        empty_varchar_array,
+        struct.pack(">iiiii", 1, 0, 1043, 1, 1) + struct.pack(">i", 1) + b"d",
+        empty_varchar_array,
+    ]
+
+    assert (
+        encoded_values(s, ARRAY(VARCHAR(50)), value_on_array_conversion_error=None)[-1]
+        == empty_varchar_array
+    )
+
+    with pytest.raises(ValueError):
+        encoded_values(s, ARRAY(VARCHAR(50)), handle_array_conversion_errors=False)
+
+    s = pd.Series([[1, 2], []])
+    assert encoded_values(s, ARRAY(Integer)) == [
+        struct.pack(">iiiii", 1, 0, 23, 2, 1) + struct.pack(">iiii", 4, 1, 4, 2),
+        struct.pack(">iii", 0, 0, 23),
+    ]
+
+
+@pytest.mark.parametrize("value_on_error", ["{}", None])
+def test_encode_arrays_handles_nulls_like_csv_serialization(value_on_error):
+    s = pd.Series([["a"], None, np.nan, "not a list"], name="segments")
+
+    csv_values = df_values_to_psql_arrays(
+        s.to_frame(), handle_errors=True, value_on_error=value_on_error
+    ).segments.tolist()
+    binary_values = encoded_values(
+        s, ARRAY(VARCHAR(50)), value_on_array_conversion_error=value_on_error
+    )
+
+    # Null cells and values that are not list-likes are loaded as empty arrays
+    empty_varchar_array = struct.pack(">iii", 0, 0, 1043)
+    assert csv_values == ["{a}", "{}", "{}", "{}"]
+    assert binary_values[1:] == [empty_varchar_array] * 3
+
+    # Null cells do not raise
+    s = pd.Series([["a"], None], name="segments")
+    assert df_values_to_psql_arrays(
+        s.to_frame(), handle_errors=False
+    ).segments.tolist() == ["{a}", "{}"]
+    binary_values = encoded_values(
+        s, ARRAY(VARCHAR(50)), handle_array_conversion_errors=False
+    )
+    assert binary_values[1] == empty_varchar_array
+
+
+def test_encode_unsupported_type_raises():
+    with pytest.raises(ValueError):
+        encode_column(pd.Series([1.0], name="x"), Numeric())
+
+
+def test_df_to_pgcopy_binary(table):
+    df = pd.DataFrame(
+        {
+            "vessel_name": ["VESSEL A", None],
+            "id": [1, 2],
+            "latitude": [45.5, np.nan],
+            "datetime_utc": [datetime.datetime(2000, 1, 2), pd.NaT],
+            "emission_period": [pd.Timedelta(minutes=10), None],
+            "segments": [["NWW01", "SWW"], None],
+            "gear_onboard": [[{"gear": "OTB", "mesh": 80.0}], None],
+            "is_at_port": [False, True],
+        }
+    )
+
+    data = df_to_pgcopy_binary(df, table, jsonb_columns=["gear_onboard"])
+
+    rows = parse_pgcopy_binary(data)
+    assert rows == [
+        [
+            b"VESSEL A",
+            struct.pack(">i", 1),
+            struct.pack(">d", 45.5),
+            struct.pack(">q", 86400000000),
+            struct.pack(">qii", 600000000, 0, 0),
+            struct.pack(">iiiii", 1, 0, 1043, 2, 1)
+            + struct.pack(">i", 5)
+            + b"NWW01"
+            + struct.pack(">i", 3)
+            + b"SWW",
+            b'\x01[{"gear": "OTB", "mesh": 80.0}]',
+            b"\x00",
+        ],
+        [
+            None,
+            struct.pack(">i", 2),
+            None,
+            None,
+            None,
+            struct.pack(">iii", 0, 0, 1043),
+            b"\x01null",
+            b"\x01",
+        ],
+    ]
+
+
+def test_df_to_pgcopy_binary_with_empty_dataframe(table):
+    df = pd.DataFrame(columns=["id", "vessel_name"])
+    assert df_to_pgcopy_binary(df, table) == PGCOPY_HEADER + PGCOPY_TRAILER
+
+
+def test_df_to_pgcopy_binary_raises_on_unknown_column(table):
+    df = pd.DataFrame({"id": [1], "unknown_column": ["a"]})
+    with pytest.raises(ValueError):
+        df_to_pgcopy_binary(df, table)
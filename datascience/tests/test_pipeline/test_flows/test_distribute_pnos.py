@@ -36,11 +36,13 @@ from src.pipeline.flows.distribute_pnos import (
     extract_pno_units_ports_and_segments_subscriptions,
     extract_pno_units_targeting_vessels,
     extract_pnos_to_generate,
+    extract_previous_pdf_documents,
     extract_species_names,
     fetch_control_units_contacts,
     flow,
     get_email_body_template,
     get_html_for_pdf_template,
+    get_pdf_content_hash,
     get_sms_template,
     load_pno_pdf_documents,
     load_prior_notification_sent_messages,
@@ -1749,6 +1751,93 @@ def test_render_pno_2_pdf(
     assert isinstance(pno.generation_datetime_utc, datetime)
 
 
+@patch("src.pipeline.flows.distribute_pnos.render_pdf_in_pool")
+def test_render_pno_reuses_unchanged_pdf_documents(
+    mock_render_pdf_in_pool,
+    html_for_pdf_template,
+    pre_rendered_pno_1,
+    email_body_template,
+    sms_template,
+):
+    mock_render_pdf_in_pool.return_value = b"New PDF document"
+
+    pno = render_pno.run(
+        pno=pre_rendered_pno_1,
+        html_for_pdf_template=html_for_pdf_template,
+        email_body_template=email_body_template,
+        sms_template=sms_template,
+    )
+    assert pno.pdf_document == b"New PDF document"
+    assert pno.pdf_document_content_hash == get_pdf_content_hash(pno.html_for_pdf)
+    mock_render_pdf_in_pool.assert_called_once()
+
+    # Unchanged PNOs are not rendered again
+    mock_render_pdf_in_pool.reset_mock()
+    reused_pno = render_pno.run(
+        pno=pre_rendered_pno_1,
+        html_for_pdf_template=html_for_pdf_template,
+        email_body_template=email_body_template,
+        sms_template=sms_template,
+        previous_pdf_documents={
+            "11": (pno.pdf_document_content_hash, b"Previous PDF document")
+        },
+    )
+    assert reused_pno.pdf_document == b"Previous PDF document"
+    assert reused_pno.pdf_document_content_hash == pno.pdf_document_content_hash
+    assert reused_pno.html_email_body == pno.html_email_body
+    assert reused_pno.sms_content == pno.sms_content
+    mock_render_pdf_in_pool.assert_not_called()
+
+    # Changed PNOs are
+    changed_pno = render_pno.run(
+        pno=dataclasses.replace(pre_rendered_pno_1, note="Updated note"),
+        html_for_pdf_template=html_for_pdf_template,
+        email_body_template=email_body_template,
+        sms_template=sms_template,
+        previous_pdf_documents={
+            "11": (pno.pdf_document_content_hash, b"Previous PDF document")
+        },
+    )
+    assert changed_pno.pdf_document == b"New PDF document"
+    assert changed_pno.pdf_document_content_hash != pno.pdf_document_content_hash
+    mock_render_pdf_in_pool.assert_called_once()
+
+
+def test_extract_previous_pdf_documents(reset_test_data):
+    pnos = [
+        RenderedPno(
+            report_id=report_id,
+            vessel_id=66,
+            cfr="XXX999999999",
+            vessel_name="THE BOAT",
+            is_verified=True,
+            is_being_sent=False,
+            trip_segments=[],
+            port_locode="FRBOL",
+            source=PnoSource.LOGBOOK,
+            generation_datetime_utc=datetime(2020, 5, 6, 8, 52, 42),
+            pdf_document=pdf_document,
+            pdf_document_content_hash=content_hash,
+        )
+        for report_id, pdf_document, content_hash in [
+            ("existing-report-id", b"PDF 1", "hash_1"),
+            ("new-report-id", b"PDF 2", "hash_2"),
+            ("other-report-id", b"PDF 3", "hash_3"),
+        ]
+    ]
+    load_pno_pdf_documents.run(pnos)
+
+    res = extract_previous_pdf_documents.run(
+        pd.DataFrame({"report_id": ["existing-report-id", "new-report-id", "12"]})
+    )
+
+    # Documents generated without content hash, like '12', are not returned
+    assert res == {
+        "existing-report-id": ("hash_1", b"PDF 1"),
+        "new-report-id": ("hash_2", b"PDF 2"),
+    }
+
+
 def test_load_pno_pdf_documents(reset_test_data):
     # Setup
     test_filepaths = [
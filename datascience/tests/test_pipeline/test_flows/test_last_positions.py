@@ -3,23 +3,33 @@ from unittest.mock import patch
 
 import pandas as pd
 import pytest
+from sqlalchemy import text
 
-from config import default_risk_factors
+from config import LAST_POSITIONS_INCREMENTAL_ID_OVERLAP, default_risk_factors
+from src.db_config import create_engine
 from src.pipeline.flows.last_positions import (
     compute_emission_period,
     concatenate,
+    concatenate_changed,
     drop_duplicates,
+    drop_outdated_updates,
+    drop_processed_positions,
     drop_unchanged_new_last_positions,
     estimate_current_positions,
     extract_beacon_malfunctions,
     extract_last_positions,
     extract_previous_last_positions,
+    extract_recent_last_positions_ids,
     extract_reportings,
     extract_risk_factors,
     flow,
+    get_min_position_id,
+    get_vessels_to_refresh,
+    is_up_to_date,
     join,
     load_last_positions,
     split,
+    upsert_last_positions,
     validate_action,
 )
 from src.read_query import read_query
@@ -60,6 +70,26 @@ def test_extract_risk_factors(reset_test_data):
     ]
     assert risk_factors.notnull().all().all()
 
+    vessels = pd.DataFrame(
+        {
+            "vessel_id": [None, 1.0],
+            "cfr": ["ABC000542519", None],
+            "ircs": [None, None],
+            "external_immatriculation": [None, "UNKNOWN"],
+        }
+    )
+    risk_factors = extract_risk_factors.run(vessels)
+    assert sorted(risk_factors.vessel_id.tolist()) == [1, 2]
+
+    risk_factors = extract_risk_factors.run(vessels.iloc[:0])
+    assert len(risk_factors) == 0
+    assert list(risk_factors)[:4] == [
+        "vessel_id",
+        "cfr",
+        "ircs",
+        "external_immatriculation",
+    ]
+
 
 def test_extract_previous_last_positions(reset_test_data):
     previous_last_positions = extract_previous_last_positions.run()
@@ -73,6 +103,59 @@ def test_extract_last_positions(reset_test_data):
     last_positions = extract_last_positions.run(minutes=35)
     assert last_positions.shape == (3, 21)
 
+    last_positions = extract_last_positions.run(minutes=35, min_position_id=13639642)
+    assert last_positions.shape == (2, 21)
+    assert set(last_positions.id) == {13640935, 13740935}
+
+
+def test_extract_recent_last_positions_ids(reset_test_data):
+    assert extract_recent_last_positions_ids.run("update") == set()
+    assert extract_recent_last_positions_ids.run("replace") == set()
+    assert extract_recent_last_positions_ids.run("incremental") == {123456789}
+
+    e = create_engine("monitorfish_remote")
+    with e.begin() as con:
+        con.execute(text("DELETE FROM last_positions WHERE id = 123456789"))
+    assert extract_recent_last_positions_ids.run("incremental") == {13740935}
+
+    with e.begin() as con:
+        con.execute(text("DELETE FROM last_positions"))
+    assert extract_recent_last_positions_ids.run("incremental") == set()
+
+
+def test_get_min_position_id():
+    assert get_min_position_id.run(set()) == 0
+    assert (
+        get_min_position_id.run({12, 123456789})
+        == 123456789 - LAST_POSITIONS_INCREMENTAL_ID_OVERLAP
+    )
+    assert get_min_position_id.run({12}) == 0
+
+
+def test_drop_processed_positions():
+    last_positions = pd.DataFrame({"id": [1, 2, 3], "cfr": ["A", "B", "C"]})
+    pd.testing.assert_frame_equal(
+        drop_processed_positions.run(last_positions, {2, 4}),
+        last_positions.iloc[[0, 2]],
+    )
+    pd.testing.assert_frame_equal(
+        drop_processed_positions.run(last_positions, set()), last_positions
+    )
+
+
+def test_is_up_to_date():
+    last_positions = pd.DataFrame({"id": [1]})
+    assert is_up_to_date.run("incremental", last_positions.iloc[:0])
+    assert not is_up_to_date.run("incremental", last_positions)
+    assert not is_up_to_date.run("update", last_positions.iloc[:0])
+    assert not is_up_to_date.run("replace", last_positions.iloc[:0])
+
+
+def test_get_vessels_to_refresh():
+    last_positions = pd.DataFrame({"vessel_id": [1]})
+    assert get_vessels_to_refresh.run("incremental", last_positions) is last_positions
+    assert get_vessels_to_refresh.run("update", last_positions) is None
+
 
 def test_extract_beacon_malfunctions(reset_test_data):
     malfunctions = extract_beacon_malfunctions.run()
@@ -162,9 +245,53 @@ def test_load_last_positions(reset_test_data):
     load_last_positions.run(last_positions_to_load)
 
 
+def test_upsert_last_positions(reset_test_data):
+    initial_last_positions = read_query(
+        "SELECT * FROM last_positions ORDER BY id;", db="monitorfish_remote"
+    )
+    previous_last_positions = initial_last_positions[
+        ["id", "cfr", "ircs", "external_immatriculation"]
+    ].assign(vessel_id=None)
+
+    moved_vessel_last_position = initial_last_positions[
+        initial_last_positions.external_immatriculation == "RO237719"
+    ].assign(
+        id=13640935,
+        vessel_id=None,
+        last_position_datetime_utc=datetime(2021, 12, 5, 11, 52, 32),
+    )
+
+    upsert_last_positions.run(
+        moved_vessel_last_position.iloc[:0], previous_last_positions
+    )
+    pd.testing.assert_frame_equal(
+        read_query(
+            "SELECT * FROM last_positions ORDER BY id;", db="monitorfish_remote"
+        ),
+        initial_last_positions,
+    )
+
+    upsert_last_positions.run(moved_vessel_last_position, previous_last_positions)
+    final_last_positions = read_query(
+        "SELECT * FROM last_positions ORDER BY id;", db="monitorfish_remote"
+    )
+
+    assert len(final_last_positions) == 4
+    assert set(final_last_positions.id) == {
+        13641745,
+        13640935,
+        123456789,
+        13740935,
+    }
+    assert final_last_positions.loc[
+        final_last_positions.id == 13640935, "last_position_datetime_utc"
+    ].tolist() == [datetime(2021, 12, 5, 11, 52, 32)]
+
+
 def test_validate_action():
     assert validate_action.run("update") == "update"
     assert validate_action.run("replace") == "replace"
+    assert validate_action.run("incremental") == "incremental"
     with pytest.raises(ValueError):
         validate_action.run("unknown_option")
 
@@ -346,6 +473,27 @@ def test_split():
     )
 
 
+def test_drop_outdated_updates():
+    last_positions_to_update = pd.DataFrame(
+        {
+            "cfr": ["A", "B", "C"],
+            "last_position_datetime_utc_new": [
+                datetime(2021, 10, 1, 21, 52, 10),
+                datetime(2021, 10, 1, 18, 52, 10),
+                datetime(2021, 10, 1, 20, 16, 10),
+            ],
+            "last_position_datetime_utc_previous": [
+                datetime(2021, 10, 1, 20, 52, 10),
+                datetime(2021, 10, 1, 19, 52, 10),
+                datetime(2021, 10, 1, 20, 16, 10),
+            ],
+        }
+    )
+
+    res = drop_outdated_updates.run(last_positions_to_update)
+    pd.testing.assert_frame_equal(res, last_positions_to_update.iloc[[0, 2]])
+
+
 def test_compute_emission_period():
     last_positions_to_update = pd.DataFrame(
         {
@@ -432,6 +580,36 @@ def test_concatenate():
     assert last_positions.equals(expected_last_positions)
 
 
+def test_concatenate_changed():
+    new_vessels_last_positions = pd.DataFrame(
+        {"vessel_id": ["D"], "some": [1], "more": ["d"], "data": [2.36]}
+    )
+
+    updated_last_positions = pd.DataFrame(
+        {
+            "vessel_id": ["E", "F"],
+            "some": [1, 2],
+            "more": ["e", "f"],
+            "data": [None, 21.256],
+        }
+    )
+
+    expected_last_positions = pd.DataFrame(
+        {
+            "vessel_id": ["D", "E", "F"],
+            "some": [1, 1, 2],
+            "more": ["d", "e", "f"],
+            "data": [2.36, None, 21.256],
+        }
+    )
+
+    last_positions = concatenate_changed.run(
+        new_vessels_last_positions, updated_last_positions
+    )
+
+    pd.testing.assert_frame_equal(last_positions, expected_last_positions)
+
+
 @patch("src.pipeline.flows.last_positions.datetime")
 def test_estimate_current_positions(mock_datetime):
     mock_datetime.utcnow = lambda: datetime(2021, 10, 1, 10, 0, 0)
@@ -649,3 +827,123 @@ def test_last_positions_flow_updates_last_positions_when_action_is_update(
         ]
         == 13640935
     ).all()
+
+
+def test_last_positions_flow_updates_moved_vessels_when_action_is_incremental(
+    reset_test_data,
+):
+    # Remove the row with the highest position id, so that the high-water mark is
+    # the position 13740935 (ZZTOPACDC).
+    e = create_engine("monitorfish_remote")
+    with e.begin() as con:
+        con.execute(text("DELETE FROM last_positions WHERE id = 123456789"))
+
+    initial_last_positions = read_query(
+        "SELECT * FROM last_positions ORDER BY id;", db="monitorfish_remote"
+    )
+
+    flow.schedule = None
+    state = flow.run(action="incremental", minutes=1440)
+    assert state.is_successful()
+
+    final_last_positions = read_query(
+        "SELECT * FROM last_positions ORDER BY id;", db="monitorfish_remote"
+    )
+
+    # Positions above the high-water mark are a new vessel (OHMYGOSH) and late
+    # positions of RO237719, which are older than its known last position and must
+    # not replace it.
+    assert len(initial_last_positions) == 3
+    assert len(final_last_positions) == 4
+    assert set(final_last_positions.external_immatriculation) == {
+        "AS761555",
+        "RO237719",
+        "OHMYGOSH",
+        "ZZTOPACDC",
+    }
+    assert set(final_last_positions.id) == {
+        13641745,
+        13638407,
+        13740935,
+        13786523,
+    }
+
+    pd.testing.assert_frame_equal(
+        final_last_positions[final_last_positions.id != 13786523].reset_index(
+            drop=True
+        ),
+        initial_last_positions,
+    )
+
+
+def test_last_positions_flow_processes_positions_committed_after_the_high_water_mark(
+    reset_test_data,
+):
+    # The high-water mark is the position 13740935 (ZZTOPACDC). A position of
+    # AS761555 with a lower id is committed after the mark has moved past it.
+    e = create_engine("monitorfish_remote")
+    with e.begin() as con:
+        con.execute(text("DELETE FROM last_positions WHERE id = 123456789"))
+        con.execute(
+            text(
+                "INSERT INTO positions ("
+                "    id, internal_reference_number, external_reference_number, "
+                "    ircs, vessel_name, flag_state, latitude, longitude, speed, "
+                "    course, date_time, position_type, is_manual"
+                ") VALUES ("
+                "    13740000, 'ABC000055481', 'AS761555', 'IL2468', "
+                "    'PLACE SPECTACLE SUBIR', 'NL', 53.5, 5.6, 2, 12, "
+                "    (NOW() AT TIME ZONE 'UTC')::TIMESTAMP - INTERVAL '5 minutes', "
+                "    'VMS', false"
+                ")"
+            )
+        )
+
+    assert 13740000 > 13740935 - LAST_POSITIONS_INCREMENTAL_ID_OVERLAP
+
+    flow.schedule = None
+    state = flow.run(action="incremental", minutes=1440)
+    assert state.is_successful()
+
+    final_last_positions = read_query(
+        "SELECT * FROM last_positions ORDER BY id;", db="monitorfish_remote"
+    )
+
+    assert (
+        final_last_positions.loc[
+            final_last_positions.external_immatriculation == "AS761555", "id"
+        ]
+        == 13740000
+    ).all()
+
+
+def test_last_positions_flow_skips_incremental_runs_without_new_positions(
+    reset_test_data,
+):
+    flow.schedule = None
+    state = flow.run(action="incremental", minutes=1440)
+    assert state.is_successful()
+
+    initial_last_positions = read_query(
+        "SELECT * FROM last_positions ORDER BY id;", db="monitorfish_remote"
+    )
+
+    # All positions were processed by the first run
+    state = flow.run(action="incremental", minutes=1440)
+    assert state.is_successful()
+    assert state.result[flow.get_tasks("is_up_to_date")[0]].result
+    for task_name in (
+        "extract_previous_last_positions",
+        "extract_risk_factors",
+        "extract_pending_alerts",
+        "extract_reportings",
+        "extract_beacon_malfunctions",
+        "upsert_last_positions",
+    ):
+        for task in flow.get_tasks(task_name):
+            assert state.result[task].is_skipped()
+
+    final_last_positions = read_query(
+        "SELECT * FROM last_positions ORDER BY id;", db="monitorfish_remote"
+    )
+    pd.testing.assert_frame_equal(initial_last_positions, final_last_positions)
@@ -1,5 +1,5 @@
-from copy import deepcopy
 from unittest.mock import patch
+from zipfile import ZipFile
 
 import pandas as pd
 import pytest
@@ -8,12 +8,13 @@ from config import TEST_DATA_LOCATION
 from src.pipeline.flows.logbook import (
     LogbookTransmissionFormat,
     LogbookZippedFileType,
-    clean,
-    extract_xmls_from_zipfile,
+    clean_parsed_batch,
     extract_zipfiles,
     flow,
     get_logbook_zipped_file_type,
-    parse_xmls,
+    iter_logbook_batches,
+    iter_xml_messages,
+    parse_xml_messages,
 )
 from tests.mocks import mock_check_flow_not_running
 
@@ -116,7 +117,7 @@ def test_extract_zipfiles_handles_flux_ers3_and_unexpected_files(mock_move):
     }
 
 
-def test_extract_xmls_from_ers3_zipfile():
+def test_iter_xml_messages_from_ers3_zipfile():
     TEST_DIRECTORY = ZIPFILES_TEST_DATA_LOCATION / "test_extract_xmls"
     dummy_ERS3_zipfile = {
         "full_name": "ERS3_JBE123456789012.zip",
@@ -126,13 +127,11 @@ def test_extract_xmls_from_ers3_zipfile():
         "transmission_format": LogbookTransmissionFormat.ERS,
     }
 
-    xmls = extract_xmls_from_zipfile.run(dummy_ERS3_zipfile)
-    expected_xmls = deepcopy(dummy_ERS3_zipfile)
-    expected_xmls["xml_messages"] = ["This is an ERS3 message."]
-    assert xmls == expected_xmls
+    xml_messages = iter_xml_messages(dummy_ERS3_zipfile)
+    assert list(xml_messages) == ["This is an ERS3 message."]
 
 
-def test_extract_xmls_from_ers3_ack_zipfile():
+def test_iter_xml_messages_from_ers3_ack_zipfile():
     TEST_DIRECTORY = ZIPFILES_TEST_DATA_LOCATION / "test_extract_xmls"
     dummy_ERS3_ACK_zipfile = {
         "full_name": "ERS3_ACK_JBE123456789012.zip",
@@ -142,14 +141,11 @@ def test_extract_xmls_from_ers3_ack_zipfile():
         "transmission_format": LogbookTransmissionFormat.ERS,
     }
 
-    xmls = extract_xmls_from_zipfile.run(dummy_ERS3_ACK_zipfile)
+    xml_messages = iter_xml_messages(dummy_ERS3_ACK_zipfile)
+    assert list(xml_messages) == ["This is an ERS3_ACK message."]
 
-    expected_xmls = deepcopy(dummy_ERS3_ACK_zipfile)
-    expected_xmls["xml_messages"] = ["This is an ERS3_ACK message."]
-    assert xmls == expected_xmls
 
-
-def test_extract_xmls_from_un_zipfile():
+def test_iter_xml_messages_from_un_zipfile():
     TEST_DIRECTORY = ZIPFILES_TEST_DATA_LOCATION / "test_extract_xmls"
     dummy_UN_zipfile = {
         "full_name": "UN_JBE123456789012.zip",
@@ -159,14 +155,11 @@ def test_extract_xmls_from_un_zipfile():
         "transmission_format": LogbookTransmissionFormat.FLUX,
     }
 
-    xmls = extract_xmls_from_zipfile.run(dummy_UN_zipfile)
-
-    expected_xmls = deepcopy(dummy_UN_zipfile)
-    expected_xmls["xml_messages"] = ["This is a UN message."]
-    assert xmls == expected_xmls
+    xml_messages = iter_xml_messages(dummy_UN_zipfile)
+    assert list(xml_messages) == ["This is a UN message."]
 
 
-def test_parse_xmls_parses_ers3_files():
+def test_parse_xml_messages_parses_ers3_files():
 
     xml_messages = []
     with open(XML_FILES_TEST_DATA_LOCATION / "ers/OOE20200324042000.xml") as f:
@@ -174,38 +167,24 @@ def test_parse_xmls_parses_ers3_files():
     with open(XML_FILES_TEST_DATA_LOCATION / "ers/FAC20211018001928.xml") as f:
         xml_messages.append(f.read())
 
-    zipfile = {
-        "full_name": "zipfile_name.zip",
-        "input_dir": "smome/input/dir",
-        "treated_dir": "some/treated/dir",
-        "error_dir": "some/error/dir",
-        "transmission_format": LogbookTransmissionFormat.ERS,
-        "xml_messages": xml_messages,
-    }
-
-    parsed_zipfile = parse_xmls.run(zipfile)
+    parsed_batch = parse_xml_messages(xml_messages, LogbookTransmissionFormat.ERS)
 
-    assert set(parsed_zipfile) == {
-        "full_name",
-        "input_dir",
-        "treated_dir",
-        "error_dir",
-        "transmission_format",
+    assert set(parsed_batch) == {
         "logbook_reports",
         "logbook_raw_messages",
         "batch_generated_errors",
     }
 
-    assert len(parsed_zipfile["logbook_raw_messages"]) == 2
-    assert len(parsed_zipfile["logbook_reports"]) == 5
+    assert len(parsed_batch["logbook_raw_messages"]) == 2
+    assert len(parsed_batch["logbook_reports"]) == 5
     assert (
-        parsed_zipfile["logbook_reports"]["transmission_format"]
+        parsed_batch["logbook_reports"]["transmission_format"]
         == LogbookTransmissionFormat.ERS.value
     ).all()
-    assert not parsed_zipfile["batch_generated_errors"]
+    assert not parsed_batch["batch_generated_errors"]
 
 
-def test_parse_xmls_parses_flux_files():
+def test_parse_xml_messages_parses_flux_files():
 
     xml_messages = []
     with open(
@@ -223,40 +202,24 @@ def test_parse_xmls_parses_flux_files():
     ) as f:
         xml_messages.append(f.read())
 
-    zipfile = {
-        "full_name": "zipfile_name.zip",
-        "input_dir": "smome/input/dir",
-        "treated_dir": "some/treated/dir",
-        "error_dir": "some/error/dir",
-        "transmission_format": LogbookTransmissionFormat.FLUX,
-        "xml_messages": xml_messages,
-    }
-
-    parsed_zipfile = parse_xmls.run(zipfile)
+    parsed_batch = parse_xml_messages(xml_messages, LogbookTransmissionFormat.FLUX)
 
-    assert set(parsed_zipfile) == {
-        "full_name",
-        "input_dir",
-        "treated_dir",
-        "error_dir",
-        "transmission_format",
+    assert set(parsed_batch) == {
         "logbook_reports",
         "logbook_raw_messages",
         "batch_generated_errors",
     }
 
-    assert len(parsed_zipfile["logbook_raw_messages"]) == 2
-    assert len(parsed_zipfile["logbook_reports"]) == 2
+    assert len(parsed_batch["logbook_raw_messages"]) == 2
+    assert len(parsed_batch["logbook_reports"]) == 2
     assert (
-        parsed_zipfile["logbook_reports"]["transmission_format"]
+        parsed_batch["logbook_reports"]["transmission_format"]
         == LogbookTransmissionFormat.FLUX.value
     ).all()
-    assert not parsed_zipfile["batch_generated_errors"]
-
+    assert not parsed_batch["batch_generated_errors"]
 
-def test_clean():
-    assert clean.run(None) is None
 
+def test_clean_parsed_batch():
     logbook_reports = pd.DataFrame(
         {
             "operation_number": [1, 1, 2, 3, 4, 5, 6],
@@ -285,39 +248,59 @@ def test_clean():
         }
     )
 
-    zipfile = {
-        "full_name": "dummy.zip",
-        "input_dir": "dummy_input_dir",
-        "treated_dir": "dummy_treated_dir",
-        "error_dir": "dummy_error_dir",
-        "transmission_format": LogbookTransmissionFormat.ERS,
+    parsed_batch = {
         "logbook_reports": logbook_reports,
         "logbook_raw_messages": logbook_raw_messages,
         "batch_generated_errors": False,
     }
 
-    expected_cleaned_zipfile = {
-        "full_name": "dummy.zip",
-        "input_dir": "dummy_input_dir",
-        "treated_dir": "dummy_treated_dir",
-        "error_dir": "dummy_error_dir",
-        "transmission_format": LogbookTransmissionFormat.ERS,
-        "logbook_reports": expected_cleaned_logbook_reports,
-        "logbook_raw_messages": expected_cleaned_logbook_raw_messages,
-        "batch_generated_errors": False,
-    }
+    cleaned_batch = clean_parsed_batch(parsed_batch, LogbookTransmissionFormat.ERS)
+
+    pd.testing.assert_frame_equal(
+        cleaned_batch.pop("logbook_reports"), expected_cleaned_logbook_reports
+    )
+    pd.testing.assert_frame_equal(
+        cleaned_batch.pop("logbook_raw_messages"),
+        expected_cleaned_logbook_raw_messages,
+    )
+    assert cleaned_batch == {"batch_generated_errors": False}
 
-    cleaned_zipfile = clean.run(zipfile)
+    # FLUX messages are not cleaned
+    cleaned_batch = clean_parsed_batch(parsed_batch, LogbookTransmissionFormat.FLUX)
+    pd.testing.assert_frame_equal(cleaned_batch["logbook_reports"], logbook_reports)
 
-    logbook_reports = cleaned_zipfile.pop("logbook_reports")
-    expected_logbook_reports = expected_cleaned_zipfile.pop("logbook_reports")
-    pd.testing.assert_frame_equal(logbook_reports, expected_logbook_reports)
 
-    logbook_raw_messages = cleaned_zipfile.pop("logbook_raw_messages")
-    expected_logbook_raw_messages = expected_cleaned_zipfile.pop("logbook_raw_messages")
-    pd.testing.assert_frame_equal(logbook_raw_messages, expected_logbook_raw_messages)
+def test_iter_logbook_batches(tmp_path):
+    xml_filenames = [
+        "OOE20200324042000.xml",
+        "FAC20211018001928.xml",
+        "empty_message.xml",
+        "OOF20200306070900.xml",
+        "OOF20200321016003.xml",
+    ]
 
-    assert cleaned_zipfile == expected_cleaned_zipfile
+    with ZipFile(tmp_path / "ERS3_JBE202101123000.zip", "w") as zipobj:
+        for xml_filename in xml_filenames:
+            zipobj.write(XML_FILES_TEST_DATA_LOCATION / "ers" / xml_filename)
+
+    zipfile = {
+        "full_name": "ERS3_JBE202101123000.zip",
+        "input_dir": tmp_path,
+        "treated_dir": tmp_path / "treated",
+        "error_dir": tmp_path / "error",
+        "transmission_format": LogbookTransmissionFormat.ERS,
+    }
+
+    batches = iter_logbook_batches(zipfile, batch_size=2)
+    batches = list(batches)
+
+    assert len(batches) == 3
+    assert [len(b["logbook_raw_messages"]) for b in batches] == [2, 1, 1]
+    assert [b["batch_generated_errors"] for b in batches] == [False, True, False]
+    assert (
+        batches[0]["logbook_reports"]["transmission_format"]
+        == LogbookTransmissionFormat.ERS.value
+    ).all()
 
 
 @patch("src.pipeline.flows.logbook.move")
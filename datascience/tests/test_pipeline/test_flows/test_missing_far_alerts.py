@@ -6,6 +6,7 @@ import pytest
 from geoalchemy2 import Geometry
 from prefect.engine.signals import TRIGGERFAIL
 from sqlalchemy import BOOLEAN, FLOAT, TIMESTAMP, VARCHAR, Column, MetaData, Table
+from sqlalchemy.dialects import postgresql
 
 from src.pipeline.exceptions import MonitorfishHealthError
 from src.pipeline.flows.missing_far_alerts import (
@@ -233,6 +234,54 @@ def test_make_positions_at_sea_query():
 
     assert query_string == expected_query_string
 
+    # Test with aggregation by day
+
+    query = make_positions_at_sea_query.run(
+        positions_table=positions_table,
+        facade_areas_table=facade_areas_table,
+        from_date=from_date,
+        to_date=to_date,
+        aggregate_by_day=True,
+    )
+
+    query_string = str(
+        query.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+    expected_query_string = (
+        "SELECT DISTINCT ON ("
+        "positions.internal_reference_number, "
+        "positions.external_reference_number, "
+        "positions.ircs, "
+        "date_trunc('day', positions.date_time)) "
+        "positions.internal_reference_number AS cfr, "
+        "positions.external_reference_number AS external_immatriculation, "
+        "positions.ircs, "
+        "positions.vessel_name, "
+        "positions.flag_state, "
+        "positions.date_time, "
+        "positions.latitude, "
+        "positions.longitude, "
+        "facades.facade "
+        "\nFROM positions "
+        "LEFT OUTER JOIN facades "
+        "ON ST_Intersects(positions.geometry, facades.geometry) "
+        "\nWHERE "
+        "positions.date_time >= '2020-12-04 12:23:00' AND "
+        "positions.date_time < '2020-12-05 12:23:00' AND "
+        "positions.internal_reference_number IS NOT NULL AND "
+        "NOT positions.is_at_port "
+        "ORDER BY "
+        "positions.internal_reference_number, "
+        "positions.external_reference_number, "
+        "positions.ircs, "
+        "date_trunc('day', positions.date_time), "
+        "positions.date_time DESC"
+    )
+
+    assert query_string == expected_query_string
+
 
 def test_extract_vessels_that_emitted_fars(reset_test_data):
 
@@ -313,6 +362,34 @@ def test_get_vessels_at_sea(positions_at_sea):
     assert len(vessels_at_sea_4_days) == 0
 
 
+def test_get_vessels_at_sea_with_positions_aggregated_by_day(positions_at_sea):
+    # Last position of each vessel on each day, as queried with `aggregate_by_day`
+    positions_by_day = (
+        positions_at_sea.sort_values("date_time", ascending=False)
+        .groupby(["cfr", positions_at_sea.date_time.dt.floor("D")])
+        .head(1)
+        .reset_index(drop=True)
+    )
+    assert len(positions_by_day) == 4
+
+    for min_days in range(1, 5):
+        pd.testing.assert_frame_equal(
+            get_vessels_at_sea.run(positions_by_day, min_days=min_days),
+            get_vessels_at_sea.run(positions_at_sea, min_days=min_days),
+        )
+
+
+def test_get_vessels_at_sea_excludes_positions_with_null_identifiers(
+    positions_at_sea,
+):
+    positions_at_sea.loc[7, "ircs"] = None
+    vessels_at_sea = get_vessels_at_sea.run(positions_at_sea, min_days=1)
+    assert vessels_at_sea.cfr.tolist() == ["A"]
+
+    vessels_at_sea = get_vessels_at_sea.run(positions_at_sea.head(0), min_days=1)
+    assert len(vessels_at_sea) == 0
+
+
 def test_concat():
     df1 = pd.DataFrame(
         {
@@ -1,10 +1,12 @@
 from datetime import datetime, timedelta
 from unittest.mock import patch
 
+import geopandas as gpd
 import pandas as pd
 import pytest
 import pytz
 from geoalchemy2 import Geometry
+from shapely.geometry import box
 from sqlalchemy import (
     BOOLEAN,
     FLOAT,
@@ -21,14 +23,21 @@ from src.db_config import create_engine
 from src.pipeline.flows.position_alerts import (
     ZonesTable,
     alert_has_gear_parameters,
+    compute_positions_in_alert,
     extract_current_gears,
     filter_on_gears,
     flow,
     get_alert_type_zones_table,
     get_vessels_in_alert,
+    load_zones_index,
+    make_alert_configs,
     make_fishing_gears_query,
     make_positions_in_alert_query,
+    make_recent_positions_query,
+    validate_engine,
+    zones_index_cache,
 )
+from src.pipeline.helpers.spatial import ZonesIndex
 from src.read_query import read_query
 from tests.mocks import mock_check_flow_not_running, mock_datetime_utcnow
 
@@ -227,6 +236,241 @@ def test_make_positions_in_alert_query():
     assert query == expected_query
 
 
+def test_make_recent_positions_query():
+    meta = MetaData()
+    positions_table = Table(
+        "positions",
+        meta,
+        Column("id", Integer),
+        Column("internal_reference_number", VARCHAR),
+        Column("external_reference_number", VARCHAR),
+        Column("ircs", VARCHAR),
+        Column("vessel_name", VARCHAR),
+        Column("flag_state", VARCHAR),
+        Column("date_time", TIMESTAMP),
+        Column("latitude", FLOAT),
+        Column("longitude", FLOAT),
+        Column("is_fishing", BOOLEAN),
+    )
+
+    query = make_recent_positions_query(
+        positions_table,
+        start_date=datetime(2021, 1, 1),
+        end_date=datetime(2021, 1, 2),
+    )
+    query_string = str(query.compile(compile_kwargs={"literal_binds": True}))
+
+    expected_query_string = (
+        "SELECT positions.id, "
+        "positions.internal_reference_number AS cfr, "
+        "positions.external_reference_number AS external_immatriculation, "
+        "positions.ircs, "
+        "positions.vessel_name, "
+        "positions.flag_state, "
+        "positions.date_time, "
+        "positions.latitude, "
+        "positions.longitude, "
+        "positions.is_fishing \n"
+        "FROM positions \n"
+        "WHERE positions.date_time > '2021-01-01 00:00:00' "
+        "AND positions.date_time < '2021-01-02 00:00:00' "
+        "AND (positions.internal_reference_number IS NOT NULL "
+        "OR positions.external_reference_number IS NOT NULL "
+        "OR positions.ircs IS NOT NULL)"
+    )
+
+    assert query_string == expected_query_string
+
+
+@patch("src.pipeline.flows.position_alerts.read_query")
+def test_load_zones_index_only_loads_configured_zones(mock_read_query):
+    zones_index_cache.invalidate()
+    mock_read_query.return_value = gpd.GeoDataFrame(
+        {"value": ["0-3"], "geometry": [box(0, 0, 1, 1)]}, geometry="geometry"
+    )
+
+    table = Table(
+        "n_miles_to_shore_areas_subdivided",
+        MetaData(),
+        Column("miles_to_shore", VARCHAR),
+        Column("geometry", Geometry),
+    )
+    zones_table = ZonesTable(
+        table=table, geometry_column="geometry", filter_column="miles_to_shore"
+    )
+
+    zones_index = load_zones_index(zones_table, ["0-3"])
+    query = mock_read_query.call_args.args[0]
+    query_string = str(query.compile(compile_kwargs={"literal_binds": True}))
+    assert query_string.endswith(
+        "WHERE n_miles_to_shore_areas_subdivided.miles_to_shore IN ('0-3')"
+    )
+    assert zones_index.values.tolist() == ["0-3"]
+
+    # Indexes are loaded once per set of zones
+    assert load_zones_index(zones_table, ["0-3", "0-3"]) is zones_index
+    assert mock_read_query.call_count == 1
+
+    load_zones_index(zones_table)
+    query = mock_read_query.call_args.args[0]
+    assert "WHERE" not in str(query)
+    assert mock_read_query.call_count == 2
+
+    zones_index_cache.invalidate()
+
+
+def test_compute_positions_in_alert():
+    positions = pd.DataFrame(
+        {
+            "id": [1, 2, 3, 4, 5, 6],
+            "cfr": ["A", "B", "C", "D", "E", None],
+            "external_immatriculation": [None, None, None, None, None, "F"],
+            "ircs": [None, None, None, None, None, None],
+            "vessel_name": ["a", "b", "c", "d", "e", "f"],
+            "flag_state": ["FR", "FR", "ES", None, "FR", "FR"],
+            "date_time": [datetime.utcnow() - timedelta(hours=h) for h in range(6)],
+            "latitude": [0.5, 1.5, 0.5, 0.5, 5.0, 2.0],
+            "longitude": [0.5, 1.5, 0.5, 0.5, 5.0, 2.0],
+            "is_fishing": [True, True, False, True, True, True],
+        }
+    )
+
+    zones_index = ZonesIndex(
+        [box(0, 0, 1, 1), box(1, 1, 2, 2), box(0, 0, 2, 2)], ["0-3", "3-6", "0-6"]
+    )
+    facades_index = ZonesIndex([box(0, 0, 1, 1), box(-1, -1, 3, 3)], ["NAMO", "MED"])
+
+    res = compute_positions_in_alert.run(
+        positions,
+        zones_index=zones_index,
+        facades_index=facades_index,
+        only_fishing_positions=False,
+    )
+    assert res.id.tolist() == [1, 2, 3, 4, 6]
+    assert res.facade.tolist() == ["NAMO", "MED", "NAMO", "NAMO", "MED"]
+    assert res.columns.tolist() == (
+        positions.drop(columns=["is_fishing"]).columns.tolist() + ["facade"]
+    )
+
+    res = compute_positions_in_alert.run(
+        positions,
+        zones_index=zones_index,
+        facades_index=facades_index,
+        only_fishing_positions=True,
+        hours_from_now=3,
+    )
+    assert res.id.tolist() == [1, 2]
+
+    res = compute_positions_in_alert.run(
+        positions,
+        zones_index=zones_index,
+        facades_index=facades_index,
+        only_fishing_positions=False,
+        zones=["3-6"],
+        except_flag_states=["ES"],
+    )
+    assert res.id.tolist() == [2, 6]
+
+    res = compute_positions_in_alert.run(
+        positions,
+        zones_index=zones_index,
+        facades_index=facades_index,
+        only_fishing_positions=False,
+        zones=["0-3"],
+        flag_states=["ES"],
+    )
+    assert res.id.tolist() == [3]
+
+    res = compute_positions_in_alert.run(
+        positions.head(0),
+        zones_index=zones_index,
+        facades_index=facades_index,
+        only_fishing_positions=True,
+    )
+    assert len(res) == 0
+    assert "facade" in res.columns
+
+
+def test_make_alert_configs():
+    alert_configs = make_alert_configs.run(
+        alert_type="THREE_MILES_TRAWLING_ALERT",
+        alert_config_name="ALERTE_1",
+        zones=["0-3"],
+        fishing_gear_categories=["Chaluts"],
+    )
+    assert alert_configs == {
+        "alert_type": ["THREE_MILES_TRAWLING_ALERT"],
+        "alert_config_name": ["ALERTE_1"],
+        "zones": [["0-3"]],
+        "hours_from_now": [8],
+        "only_fishing_positions": [True],
+        "flag_states": [None],
+        "except_flag_states": [None],
+        "fishing_gears": [None],
+        "fishing_gear_categories": [["Chaluts"]],
+        "include_vessels_unknown_gear": [True],
+    }
+
+    alert_configs = make_alert_configs.run(
+        alert_configs=[
+            {
+                "alert_type": "THREE_MILES_TRAWLING_ALERT",
+                "alert_config_name": "ALERTE_1",
+                "zones": ["0-3"],
+            },
+            {
+                "alert_type": "TWELVE_MILES_FISHING_ALERT",
+                "alert_config_name": "ALERTE_2",
+                "hours_from_now": 4,
+                "flag_states": ["ES"],
+            },
+        ],
+        # Ignored in batch mode
+        alert_type="FRENCH_EEZ_FISHING_ALERT",
+    )
+    assert alert_configs["alert_type"] == [
+        "THREE_MILES_TRAWLING_ALERT",
+        "TWELVE_MILES_FISHING_ALERT",
+    ]
+    assert alert_configs["zones"] == [["0-3"], None]
+    assert alert_configs["hours_from_now"] == [8, 4]
+    assert alert_configs["flag_states"] == [None, ["ES"]]
+
+    with pytest.raises(ValueError):
+        make_alert_configs.run(alert_configs=[])
+
+    with pytest.raises(ValueError):
+        make_alert_configs.run(
+            alert_configs=[{"alert_type": "FRENCH_EEZ_FISHING_ALERT"}]
+        )
+
+    with pytest.raises(ValueError):
+        make_alert_configs.run(
+            alert_configs=[
+                {
+                    "alert_type": "FRENCH_EEZ_FISHING_ALERT",
+                    "alert_config_name": "ALERTE_1",
+                    "unknown_parameter": 1,
+                }
+            ]
+        )
+
+    with pytest.raises(ValueError):
+        make_alert_configs.run(
+            alert_configs=[
+                {"alert_type": "FRENCH_EEZ_FISHING_ALERT", "alert_config_name": "A"},
+                {"alert_type": "TWELVE_MILES_FISHING_ALERT", "alert_config_name": "A"},
+            ]
+        )
+
+
+def test_validate_engine():
+    assert validate_engine.run("sql") == "sql"
+    assert validate_engine.run("local") == "local"
+    with pytest.raises(ValueError):
+        validate_engine.run("postgis")
+
+
 def test_make_fishing_gears_query():
     meta = MetaData()
     fishing_gears_table = Table(
@@ -369,6 +613,15 @@ def test_filter_on_gears():
         check_like=True,
     )
 
+    unfiltered_positions_in_alert = filter_on_gears.run(
+        positions_in_alert,
+        current_gears,
+        gear_codes,
+        include_vessels_unknown_gear,
+        must_filter_on_gears=False,
+    )
+    assert unfiltered_positions_in_alert is positions_in_alert
+
 
 def test_get_vessels_in_alert():
     now = datetime(2020, 1, 1, 0, 0, 0)
@@ -479,7 +732,10 @@ def test_flow_deletes_existing_pending_alerts_of_matching_config_name(reset_test
     assert pending_alerts.iloc[0, 0] == 0
 
 
-def test_flow_inserts_new_pending_alerts(reset_test_data):
+@pytest.mark.parametrize("engine", ["sql", "local"])
+def test_flow_inserts_new_pending_alerts(reset_test_data, engine):
+    zones_index_cache.invalidate()
+
     # We delete the silenced alerts first
     e = create_engine("monitorfish_remote")
     with e.begin() as connection:
@@ -509,6 +765,7 @@ def test_flow_inserts_new_pending_alerts(reset_test_data):
         fishing_gears=fishing_gears,
         fishing_gear_categories=fishing_gear_categories,
         include_vessels_unknown_gear=include_vessels_unknown_gear,
+        engine=engine,
     )
 
     assert state.is_successful()
@@ -633,6 +890,75 @@ def test_flow_inserts_new_pending_alerts(reset_test_data):
     ).all()
 
 
+@pytest.mark.parametrize("engine", ["sql", "local"])
+def test_flow_evaluates_several_alert_configs(reset_test_data, engine):
+    zones_index_cache.invalidate()
+
+    e = create_engine("monitorfish_remote")
+    with e.begin() as connection:
+        connection.execute(text("DELETE FROM silenced_alerts;"))
+
+    alert_configs = [
+        {
+            "alert_type": "THREE_MILES_TRAWLING_ALERT",
+            "alert_config_name": "ALERTE_1",
+            "zones": ["0-3", "3-6"],
+            "hours_from_now": 48,
+            "only_fishing_positions": False,
+        },
+        {
+            "alert_type": "THREE_MILES_TRAWLING_ALERT",
+            "alert_config_name": "ALERTE_2",
+            "zones": ["0-3", "3-6"],
+            "hours_from_now": 48,
+            "only_fishing_positions": False,
+            "flag_states": ["NL"],
+        },
+        {
+            "alert_type": "THREE_MILES_TRAWLING_ALERT",
+            "alert_config_name": "ALERTE_3",
+            "zones": ["0-3"],
+            "only_fishing_positions": True,
+            "fishing_gears": ["LLS"],
+            "include_vessels_unknown_gear": False,
+        },
+    ]
+
+    flow.schedule = None
+    state = flow.run(alert_configs=alert_configs, engine=engine)
+    assert state.is_successful()
+
+    batch_pending_alerts = read_query(
+        "SELECT * FROM pending_alerts ORDER BY alert_config_name, vessel_id",
+        db="monitorfish_remote",
+    )
+
+    # Pending alerts of each configuration are the same as when configurations are
+    # evaluated separately
+    assert batch_pending_alerts.alert_config_name.value_counts().to_dict() == {
+        "ALERTE_1": 5,
+        "ALERTE_2": 1,
+    }
+    assert batch_pending_alerts.loc[
+        batch_pending_alerts.alert_config_name == "ALERTE_2",
+        "internal_reference_number",
+    ].tolist() == ["ABC000055481"]
+
+    for alert_config in alert_configs:
+        state = flow.run(**alert_config, engine=engine)
+        assert state.is_successful()
+
+    pending_alerts = read_query(
+        "SELECT * FROM pending_alerts ORDER BY alert_config_name, vessel_id",
+        db="monitorfish_remote",
+    )
+
+    pd.testing.assert_frame_equal(
+        pending_alerts.drop(columns=["id", "creation_date"]),
+        batch_pending_alerts.drop(columns=["id", "creation_date"]),
+    )
+
+
 def test_flow_inserts_new_pending_alerts_without_silenced_alerts(reset_test_data):
     now = pytz.utc.localize(datetime.utcnow())
 
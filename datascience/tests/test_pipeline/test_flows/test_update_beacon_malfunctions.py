@@ -3,6 +3,7 @@ from unittest.mock import patch
 
 import pandas as pd
 import pytest
+import requests_mock
 from prefect.engine.signals import TRIGGERFAIL
 
 from config import BEACON_MALFUNCTIONS_ENDPOINT
@@ -10,11 +11,12 @@ from src.pipeline.entities.beacon_malfunctions import (
     BeaconMalfunctionNotificationType,
     BeaconStatus,
 )
-from src.pipeline.exceptions import MonitorfishHealthError
+from src.pipeline.exceptions import BackendApiError, MonitorfishHealthError
 from src.pipeline.flows.update_beacon_malfunctions import (
     BeaconMalfunctionStage,
     BeaconMalfunctionVesselStatus,
     EndOfMalfunctionReason,
+    check_api_results,
     extract_known_malfunctions,
     extract_last_positions,
     extract_satellite_operators_statuses,
@@ -24,9 +26,11 @@ from src.pipeline.flows.update_beacon_malfunctions import (
     get_last_emissions_of_vessels_that_should_emit,
     get_new_malfunctions,
     load_new_beacon_malfunctions,
+    make_beacon_malfunction_update,
     prepare_new_beacon_malfunctions,
-    update_beacon_malfunction,
+    update_beacon_malfunctions,
 )
+from src.pipeline.helpers.backend_api import ApiRequest
 from src.read_query import read_query
 from tests.mocks import (
     extract_satellite_operators_statuses_mock_factory,
@@ -680,78 +684,74 @@ def test_load_new_beacon_malfunctions(reset_test_data):
     )
 
 
-@patch("src.pipeline.flows.update_beacon_malfunctions.requests")
 @patch(
     "src.pipeline.flows.update_beacon_malfunctions.BEACON_MALFUNCTIONS_ENDPOINT",
     "dummy/end/point/",
 )
-def test_update_beacon_malfunction_raises_when_both_stage_and_status_are_supplied(
-    mock_requests,
-):
+def test_update_beacon_malfunction_raises_when_both_stage_and_status_are_supplied():
     malfunction_id_to_update = 25
     with pytest.raises(ValueError):
-        update_beacon_malfunction.run(
+        make_beacon_malfunction_update(
             malfunction_id_to_update,
             new_stage=BeaconMalfunctionStage.FOUR_HOUR_REPORT,
             new_vessel_status=BeaconMalfunctionVesselStatus.AT_SEA,
         )
 
 
-@patch("src.pipeline.flows.update_beacon_malfunctions.requests")
 @patch(
     "src.pipeline.flows.update_beacon_malfunctions.BEACON_MALFUNCTIONS_ENDPOINT",
     "dummy/end/point/",
 )
-def test_update_beacon_malfunction_raises_when_reason_is_missing(mock_requests):
+def test_update_beacon_malfunction_raises_when_reason_is_missing():
     malfunction_id_to_update = 25
     with pytest.raises(ValueError):
-        update_beacon_malfunction.run(
+        make_beacon_malfunction_update(
             malfunction_id_to_update,
             new_stage=BeaconMalfunctionStage.END_OF_MALFUNCTION,
         )
 
 
-@patch("src.pipeline.flows.update_beacon_malfunctions.requests")
 @patch(
     "src.pipeline.flows.update_beacon_malfunctions.BEACON_MALFUNCTIONS_ENDPOINT",
     "dummy/end/point/",
 )
-def test_update_beacon_malfunction_updates_status(mock_requests):
+def test_update_beacon_malfunction_updates_status():
     malfunction_id_to_update = 25
-    update_beacon_malfunction.run(
+    api_request = make_beacon_malfunction_update(
         malfunction_id_to_update,
         new_vessel_status=BeaconMalfunctionVesselStatus.AT_SEA,
     )
-    mock_requests.put.assert_called_once_with(
+    assert api_request == ApiRequest(
+        method="PUT",
         url=f"dummy/end/point/{malfunction_id_to_update}",
         json={"vesselStatus": "AT_SEA"},
         headers={
             "Accept": "application/json, text/plain",
             "Content-Type": "application/json;charset=UTF-8",
-            "X-API-KEY": "backend_api_key",
         },
+        item_id=malfunction_id_to_update,
     )
 
 
-@patch("src.pipeline.flows.update_beacon_malfunctions.requests")
 @patch(
     "src.pipeline.flows.update_beacon_malfunctions.BEACON_MALFUNCTIONS_ENDPOINT",
     "dummy/end/point/",
 )
-def test_update_beacon_malfunction_updates_stage(mock_requests):
+def test_update_beacon_malfunction_updates_stage():
     malfunction_id_to_update = 25
-    update_beacon_malfunction.run(
+    api_request = make_beacon_malfunction_update(
         malfunction_id_to_update,
         new_stage=BeaconMalfunctionStage.FOUR_HOUR_REPORT,
     )
-    mock_requests.put.assert_called_once_with(
+    assert api_request == ApiRequest(
+        method="PUT",
         url=f"dummy/end/point/{malfunction_id_to_update}",
         json={"stage": "FOUR_HOUR_REPORT"},
         headers={
             "Accept": "application/json, text/plain",
             "Content-Type": "application/json;charset=UTF-8",
-            "X-API-KEY": "backend_api_key",
         },
+        item_id=malfunction_id_to_update,
     )
 
 
@@ -776,21 +776,19 @@ def test_update_beacon_malfunction_updates_stage(mock_requests):
         ),
     ],
 )
-@patch("src.pipeline.flows.update_beacon_malfunctions.requests")
 @patch(
     "src.pipeline.flows.update_beacon_malfunctions.BEACON_MALFUNCTIONS_ENDPOINT",
     "dummy/end/point/",
 )
-def test_update_beacon_malfunction_updates_stage_and_reason(
-    mock_requests, stage, reason
-):
+def test_update_beacon_malfunction_updates_stage_and_reason(stage, reason):
     malfunction_id_to_update = 25
-    update_beacon_malfunction.run(
+    api_request = make_beacon_malfunction_update(
         malfunction_id_to_update,
         new_stage=stage,
         end_of_malfunction_reason=reason,
     )
-    mock_requests.put.assert_called_once_with(
+    assert api_request == ApiRequest(
+        method="PUT",
         url=f"dummy/end/point/{malfunction_id_to_update}",
         json={
             "stage": stage.value,
@@ -799,20 +797,19 @@ def test_update_beacon_malfunction_updates_stage_and_reason(
         headers={
             "Accept": "application/json, text/plain",
             "Content-Type": "application/json;charset=UTF-8",
-            "X-API-KEY": "backend_api_key",
         },
+        item_id=malfunction_id_to_update,
     )
 
 
-@patch("src.pipeline.flows.update_beacon_malfunctions.requests")
 @patch(
     "src.pipeline.flows.update_beacon_malfunctions.BEACON_MALFUNCTIONS_ENDPOINT",
     "dummy/end/point/",
 )
-def test_update_beacon_malfunction_raises_if_no_stage_and_no_status(mock_requests):
+def test_update_beacon_malfunction_raises_if_no_stage_and_no_status():
     malfunction_id_to_update = 25
     with pytest.raises(ValueError):
-        update_beacon_malfunction.run(
+        make_beacon_malfunction_update(
             malfunction_id_to_update,
             new_stage=None,
             new_vessel_status=None,
@@ -826,7 +823,8 @@ def test_update_beacon_malfunctions_flow_doesnt_create_malfunctions_if_never_emi
         "SELECT * FROM beacon_malfunctions", db="monitorfish_remote"
     )
     flow.schedule = None
-    with patch("src.pipeline.flows.update_beacon_malfunctions.requests"):
+    with requests_mock.Mocker() as m:
+        m.put(requests_mock.ANY)
         state = flow.run(
             max_hours_without_emission_at_sea=6, max_hours_without_emission_at_port=24
         )
@@ -870,9 +868,8 @@ def test_update_beacon_malfunctions_flow_moves_malfunctions_to_end_of_malfunctio
     ).iloc[0, 0]
 
     flow.schedule = None
-    with patch(
-        "src.pipeline.flows.update_beacon_malfunctions.requests"
-    ) as mock_requests:
+    with requests_mock.Mocker() as m:
+        m.put(requests_mock.ANY)
         state = flow.run(
             max_hours_without_emission_at_sea=12,
             max_hours_without_emission_at_port=24,
@@ -902,34 +899,54 @@ def test_update_beacon_malfunctions_flow_moves_malfunctions_to_end_of_malfunctio
         [beacon_malfunction_id_to_archive],
         [],
     )
-    assert mock_requests.put.call_count == 2
+    assert m.call_count == 2
+
+    sent_requests = {r.url: r for r in m.request_history}
+    for r in sent_requests.values():
+        assert r.method == "PUT"
+        assert r.headers["X-API-KEY"] == "backend_api_key"
+        assert r.headers["Content-Type"] == "application/json;charset=UTF-8"
+
+    assert sent_requests[
+        BEACON_MALFUNCTIONS_ENDPOINT
+        + f"{beacon_malfunction_id_to_move_to_end_of_malfunction}"
+    ].json() == {
+        "stage": "END_OF_MALFUNCTION",
+        "endOfBeaconMalfunctionReason": "RESUMED_TRANSMISSION",
+    }
 
-    mock_requests.put.assert_any_call(
-        url=BEACON_MALFUNCTIONS_ENDPOINT
-        + f"{beacon_malfunction_id_to_move_to_end_of_malfunction}",
-        json={
-            "stage": "END_OF_MALFUNCTION",
-            "endOfBeaconMalfunctionReason": "RESUMED_TRANSMISSION",
-        },
-        headers={
-            "Accept": "application/json, text/plain",
-            "Content-Type": "application/json;charset=UTF-8",
-            "X-API-KEY": "backend_api_key",
-        },
-    )
+    assert sent_requests[
+        BEACON_MALFUNCTIONS_ENDPOINT + f"{beacon_malfunction_id_to_archive}"
+    ].json() == {
+        "stage": "ARCHIVED",
+        "endOfBeaconMalfunctionReason": "BEACON_DEACTIVATED_OR_UNEQUIPPED",
+    }
 
-    mock_requests.put.assert_any_call(
-        url=BEACON_MALFUNCTIONS_ENDPOINT + f"{beacon_malfunction_id_to_archive}",
-        json={
-            "stage": "ARCHIVED",
-            "endOfBeaconMalfunctionReason": "BEACON_DEACTIVATED_OR_UNEQUIPPED",
-        },
-        headers={
-            "Accept": "application/json, text/plain",
-            "Content-Type": "application/json;charset=UTF-8",
-            "X-API-KEY": "backend_api_key",
-        },
-    )
+
+@patch(
+    "src.pipeline.flows.update_beacon_malfunctions.BEACON_MALFUNCTIONS_ENDPOINT",
+    "http://dummy/end/point/",
+)
+def test_update_beacon_malfunctions_reports_failures_per_malfunction():
+    with requests_mock.Mocker() as m:
+        m.put("http://dummy/end/point/1")
+        m.put("http://dummy/end/point/2", status_code=500)
+        m.put("http://dummy/end/point/3")
+        results = update_beacon_malfunctions.run(
+            [1, 2, 3],
+            new_stage=BeaconMalfunctionStage.ARCHIVED,
+            end_of_malfunction_reason=EndOfMalfunctionReason.RESUMED_TRANSMISSION,
+        )
+
+    assert m.call_count == 3
+    assert [res.request.item_id for res in results] == [1, 2, 3]
+    assert [res.ok for res in results] == [True, False, True]
+    assert results[1].status_code == 500
+
+    with pytest.raises(BackendApiError):
+        check_api_results.run([results, []])
+
+    check_api_results.run([[results[0], results[2]], []])
 
 
 def test_update_beacon_malfunctions_flow_inserts_new_malfunctions(reset_test_data):
@@ -942,7 +959,8 @@ def test_update_beacon_malfunctions_flow_inserts_new_malfunctions(reset_test_dat
     )
     flow.schedule = None
 
-    with patch("src.pipeline.flows.update_beacon_malfunctions.requests"):
+    with requests_mock.Mocker() as m:
+        m.put(requests_mock.ANY)
         state = flow.run(
             max_hours_without_emission_at_sea=6, max_hours_without_emission_at_port=1
         )
@@ -993,7 +1011,8 @@ def test_update_beacon_malfunctions_flow_inserts_new_malfunctions(reset_test_dat
         "SELECT * FROM beacon_malfunctions", db="monitorfish_remote"
     )
 
-    with patch("src.pipeline.flows.update_beacon_malfunctions.requests"):
+    with requests_mock.Mocker() as m:
+        m.put(requests_mock.ANY)
         state = flow.run(
             max_hours_without_emission_at_sea=6, max_hours_without_emission_at_port=1
         )
@@ -1024,7 +1043,8 @@ def test_flow_does_not_create_malfunctions_for_operators_that_are_not_up(
     )
     flow.schedule = None
 
-    with patch("src.pipeline.flows.update_beacon_malfunctions.requests"):
+    with requests_mock.Mocker() as m:
+        m.put(requests_mock.ANY)
         state = flow.run(
             max_hours_without_emission_at_sea=6, max_hours_without_emission_at_port=24
         )
@@ -0,0 +1,205 @@
+import logging
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from src.pipeline.generic_tasks import extract_batches, load
+from src.read_query import read_query
+
+
+def mock_read_saved_query(*args, chunksize=None, **kwargs):
+    return iter(
+        [
+            pd.DataFrame({"id": [1, 2], "facade": ["NAMO", "MED"]}),
+            pd.DataFrame({"id": [3], "facade": ["NAMO"]}),
+        ]
+    )
+
+
+@patch("src.pipeline.generic_tasks.read_saved_query")
+def test_extract_batches(mock_read_saved_query_):
+    mock_read_saved_query_.side_effect = mock_read_saved_query
+
+    batches = extract_batches(
+        "monitorfish_remote",
+        "monitorfish/some_query.sql",
+        batch_size=2,
+        dtypes={"id": float, "facade": "category"},
+        params={"a": 1},
+    )
+
+    # The query is not run until batches are consumed
+    mock_read_saved_query_.assert_not_called()
+
+    batches = list(batches)
+    mock_read_saved_query_.assert_called_once()
+    assert mock_read_saved_query_.call_args.kwargs["chunksize"] == 2
+    assert mock_read_saved_query_.call_args.kwargs["params"] == {"a": 1}
+
+    assert len(batches) == 2
+    pd.testing.assert_frame_equal(
+        batches[0],
+        pd.DataFrame(
+            {
+                "id": [1.0, 2.0],
+                "facade": pd.Categorical(["NAMO", "MED"]),
+            }
+        ),
+    )
+    pd.testing.assert_frame_equal(
+        batches[1],
+        pd.DataFrame({"id": [3.0], "facade": pd.Categorical(["NAMO"])}),
+    )
+
+
+@patch("src.pipeline.generic_tasks.read_saved_query")
+def test_extract_batches_as_arrow_record_batches(mock_read_saved_query_):
+    mock_read_saved_query_.side_effect = mock_read_saved_query
+
+    batches = list(
+        extract_batches(
+            "monitorfish_remote", "monitorfish/some_query.sql", output="arrow"
+        )
+    )
+
+    assert all(isinstance(batch, pa.RecordBatch) for batch in batches)
+    assert pa.Table.from_batches(batches).to_pydict() == {
+        "id": [1, 2, 3],
+        "facade": ["NAMO", "MED", "NAMO"],
+    }
+
+
+def test_extract_batches_raises_on_invalid_arguments():
+    with pytest.raises(ValueError):
+        extract_batches("monitorfish_remote", "some_query.sql", output="polars")
+
+    with pytest.raises(ValueError):
+        extract_batches(
+            "monitorfish_remote", "some_query.sql", backend="geopandas", output="arrow"
+        )
+
+    with pytest.raises(ValueError):
+        extract_batches("monitorfish_remote", "some_query.sql", batch_size=0)
+
+
+def test_generic_tasks_do_not_require_pyarrow():
+    # pyarrow is not installed in production images
+    code = (
+        "import sys; sys.modules['pyarrow'] = None; "
+        "import src.pipeline.generic_tasks"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+@pytest.mark.parametrize("copy_format", ["csv", "binary"])
+def test_load_batches(reset_test_data, copy_format):
+    batches = (
+        pd.DataFrame(
+            {
+                "id": [10 * i + 1, 10 * i + 2],
+                "species_code": [f"A{i}1", f"A{i}2"],
+                "species_name": [f"Species {i}1", None],
+            }
+        )
+        for i in range(3)
+    )
+
+    load(
+        batches,
+        table_name="species",
+        schema="public",
+        db_name="monitorfish_remote",
+        logger=logging.getLogger(),
+        how="replace",
+        copy_format=copy_format,
+    )
+
+    loaded_species = read_query(
+        "SELECT id, species_code, species_name FROM public.species ORDER BY id",
+        db="monitorfish_remote",
+    )
+
+    expected_loaded_species = pd.DataFrame(
+        {
+            "id": [1, 2, 11, 12, 21, 22],
+            "species_code": ["A01", "A02", "A11", "A12", "A21", "A22"],
+            "species_name": [
+                "Species 01",
+                None,
+                "Species 11",
+                None,
+                "Species 21",
+                None,
+            ],
+        }
+    )
+    pd.testing.assert_frame_equal(loaded_species, expected_loaded_species)
+
+
+def test_load_empty_iterator_replaces_table_contents(reset_test_data):
+    load(
+        iter([]),
+        table_name="species",
+        schema="public",
+        db_name="monitorfish_remote",
+        logger=logging.getLogger(),
+        how="replace",
+    )
+
+    loaded_species = read_query(
+        "SELECT id FROM public.species",
+        db="monitorfish_remote",
+    )
+    assert len(loaded_species) == 0
+
+
+@pytest.mark.parametrize("copy_format", ["csv", "binary"])
+def test_load_diff(reset_test_data, copy_format):
+    query = (
+        "SELECT id, species_code, species_name, xmin::text AS xmin "
+        "FROM public.species ORDER BY id"
+    )
+    initial_species = read_query(query, db="monitorfish_remote")
+
+    species = pd.DataFrame(
+        {
+            "id": [1, 3, 4],
+            "species_code": ["GHL", "SWO", "HKE"],
+            "species_name": ["Pou Hasse Caille", "Friture modifiée", None],
+        }
+    )
+
+    load(
+        species,
+        table_name="species",
+        schema="public",
+        db_name="monitorfish_remote",
+        logger=logging.getLogger(),
+        how="diff",
+        key_columns=["id"],
+        copy_format=copy_format,
+    )
+
+    loaded_species = read_query(query, db="monitorfish_remote")
+
+    pd.testing.assert_frame_equal(loaded_species.drop(columns=["xmin"]), species)
+
+    # The unchanged row was not rewritten
+    assert loaded_species.loc[0, "xmin"] == initial_species.loc[0, "xmin"]
+    assert loaded_species.loc[1, "xmin"] != initial_species.loc[2, "xmin"]
+
+
+def test_load_diff_requires_key_columns():
+    with pytest.raises(ValueError):
+        load(
+            pd.DataFrame({"id": [1]}),
+            table_name="species",
+            schema="public",
+            db_name="monitorfish_remote",
+            logger=logging.getLogger(),
+            how="diff",
+        )
@@ -0,0 +1,145 @@
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from src.pipeline.helpers.anchorages import AnchoragesIndex
+
+
+def mock_read_saved_query_factory(versions: list, anchorages: list):
+    """
+    Returns a mock of `read_saved_query` that returns successive versions of the
+    `anchorages` table and its successive h3 cells.
+    """
+    versions = iter(versions)
+    anchorages = iter(anchorages)
+
+    def mock_read_saved_query(sql_filepath, db, params=None):
+        assert db == "monitorfish_remote"
+        if sql_filepath == "monitorfish/anchorages_version.sql":
+            return pd.DataFrame({"version": [next(versions)]})
+        elif sql_filepath in (
+            "monitorfish/anchorages_h3.sql",
+            "monitorfish/h3_is_anchorage.sql",
+        ):
+            return pd.DataFrame({"h3": next(anchorages)})
+        else:
+            raise ValueError(f"Unexpected query {sql_filepath}")
+
+    return mock_read_saved_query
+
+
+def test_anchorages_index_contains():
+    index = AnchoragesIndex()
+
+    h3_cells = np.array(
+        [617422587756281855, 620680172713803775, 0, 617088291522215935],
+        dtype=np.uint64,
+    )
+
+    # Empty index
+    np.testing.assert_array_equal(
+        index.contains(h3_cells), np.array([False, False, False, False])
+    )
+
+    index.h3_cells = np.array([617088291522215935, 617422587756281855], dtype=np.uint64)
+    np.testing.assert_array_equal(
+        index.contains(h3_cells), np.array([True, False, False, True])
+    )
+    np.testing.assert_array_equal(
+        index.contains(np.array([], dtype=np.uint64)), np.array([], dtype=bool)
+    )
+
+
+@patch("src.pipeline.helpers.anchorages.read_saved_query")
+def test_anchorages_index_refresh_only_reloads_on_new_versions(mock_read_saved_query):
+    mock_read_saved_query.side_effect = mock_read_saved_query_factory(
+        versions=[1, 1, 2],
+        anchorages=[
+            ["89d19541dbbffff", "89186928383ffff"],
+            ["8900510a463ffff"],
+        ],
+    )
+
+    index = AnchoragesIndex()
+
+    # First call loads the index
+    res = index.refresh()
+    assert res is index
+    assert index.version == 1
+    np.testing.assert_array_equal(
+        index.h3_cells,
+        np.array([617422587756281855, 620680172713803775], dtype=np.uint64),
+    )
+    assert mock_read_saved_query.call_count == 2
+
+    # Unchanged table : only the version is queried
+    index.refresh()
+    assert index.version == 1
+    assert mock_read_saved_query.call_count == 3
+
+    # Modified table : the index is reloaded
+    index.refresh()
+    assert index.version == 2
+    np.testing.assert_array_equal(
+        index.h3_cells, np.array([616998717985390591], dtype=np.uint64)
+    )
+    assert mock_read_saved_query.call_count == 5
+
+
+@patch("src.pipeline.helpers.anchorages.ANCHORAGES_INDEX_MIN_H3_CELLS", 3)
+@patch("src.pipeline.helpers.anchorages.read_saved_query")
+def test_anchorages_index_is_anchorage_only_loads_for_large_inputs(
+    mock_read_saved_query,
+):
+    mock_read_saved_query.side_effect = mock_read_saved_query_factory(
+        versions=[1],
+        anchorages=[
+            ["89186928383ffff"],
+            ["89d19541dbbffff", "89186928383ffff"],
+        ],
+    )
+
+    index = AnchoragesIndex()
+
+    # Few distinct h3 cells : the h3 cells are queried, the index is not loaded
+    res = index.is_anchorage(
+        np.array(
+            [617422587756281855, 620680172713803775, 617422587756281855],
+            dtype=np.uint64,
+        )
+    )
+    np.testing.assert_array_equal(res, np.array([True, False, True]))
+    assert mock_read_saved_query.call_args.args[0] == "monitorfish/h3_is_anchorage.sql"
+    assert mock_read_saved_query.call_args.kwargs["params"] == {
+        "h3_cells": ("89186928383ffff", "89d19541dbbffff")
+    }
+    assert index.version is None
+
+    # Many distinct h3 cells : the index is loaded
+    res = index.is_anchorage(
+        np.array(
+            [617422587756281855, 620680172713803775, 0, 616998717985390591],
+            dtype=np.uint64,
+        )
+    )
+    np.testing.assert_array_equal(res, np.array([True, True, False, False]))
+    assert index.version == 1
+    assert mock_read_saved_query.call_count == 3
+
+
+def test_anchorages_index_loads_from_database(reset_test_data):
+    index = AnchoragesIndex().refresh()
+    assert index.version is not None
+    np.testing.assert_array_equal(
+        index.h3_cells, np.array([618003056084910079], dtype=np.uint64)
+    )
+
+
+def test_anchorages_index_queries_database(reset_test_data):
+    index = AnchoragesIndex()
+    np.testing.assert_array_equal(
+        index.is_anchorage(np.array([618003056084910079, 0], dtype=np.uint64)),
+        np.array([True, False]),
+    )
+    assert index.version is None
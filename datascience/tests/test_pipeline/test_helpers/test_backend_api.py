@@ -0,0 +1,48 @@
+import json
+
+from src.pipeline.helpers.backend_api import ApiRequest, BackendApiClient
+from src.utils.local_servers import LocalHttpServer
+
+
+def test_backend_api_client_send_batch():
+    with LocalHttpServer(failing_paths=["/items/3"]) as server:
+        client = BackendApiClient(api_key="key", max_concurrent_requests=4)
+        api_requests = [
+            ApiRequest(
+                method="PUT",
+                url=f"{server.url}/items/{i}",
+                json={"value": i},
+                item_id=i,
+            )
+            for i in range(10)
+        ]
+        results = client.send_batch(api_requests)
+        client.close()
+
+    assert [res.request.item_id for res in results] == list(range(10))
+    assert [res.ok for res in results] == [i != 3 for i in range(10)]
+    assert [res.status_code for res in results] == [
+        500 if i == 3 else 200 for i in range(10)
+    ]
+    assert results[3].error is not None
+
+    # All requests are sent, on at most 4 connections
+    assert sorted(
+        (method, path, json.loads(body)) for method, path, body in server.requests
+    ) == sorted(("PUT", f"/items/{i}", {"value": i}) for i in range(10))
+    assert server.connections <= 4
+
+
+def test_backend_api_client_reports_timeouts_and_connection_errors():
+    with LocalHttpServer(latency=0.5) as server:
+        client = BackendApiClient(api_key="key", timeout=0.05)
+        res = client.send(ApiRequest(method="PUT", url=f"{server.url}/items/1"))
+        assert not res.ok
+        assert res.status_code is None
+        assert res.error.startswith("ReadTimeout")
+
+    # The server is shut down
+    res = client.send(ApiRequest(method="PUT", url=f"{server.url}/items/1"))
+    assert not res.ok
+    assert res.error.startswith("ConnectionError")
+    client.close()
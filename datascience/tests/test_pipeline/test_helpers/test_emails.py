@@ -1,10 +1,15 @@
 import io
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from unittest.mock import call, patch
 
 from pypdf import PdfReader
-from pytest import fixture
+from pytest import fixture, raises
 
 from config import TEST_DATA_LOCATION
-from src.pipeline.helpers.emails import resize_pdf_to_A4
+from src.pipeline.helpers.emails import SmtpConnectionPool, resize_pdf_to_A4
+from src.utils.local_servers import LocalSmtpServer
 
 
 @fixture
@@ -30,3 +35,85 @@ def test_resize_pdf_to_A4(A3_pdf):
     assert A3_page.mediabox.height == 1190.551181
     assert resized_page.mediabox.width == 595.275591
     assert resized_page.mediabox.height == 841.889764
+
+
+@fixture
+def message() -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "monitorfish@test.email"
+    msg["To"] = "someone@test.email"
+    msg["Subject"] = "Test"
+    msg.set_content("Hello")
+    return msg
+
+
+def test_smtp_connection_pool_reuses_connections(message):
+    with LocalSmtpServer() as smtp_server:
+        pool = SmtpConnectionPool("127.0.0.1", smtp_server.port, max_connections=2)
+
+        with ThreadPoolExecutor(4) as executor:
+            send_errors = list(
+                executor.map(lambda _: pool.send_message(message), range(10))
+            )
+        pool.close()
+
+    assert send_errors == [{}] * 10
+    assert len(smtp_server.messages) == 10
+    assert 1 <= smtp_server.connections <= 2
+
+
+def test_smtp_connection_pool_reconnects(message):
+    with LocalSmtpServer() as smtp_server:
+        pool = SmtpConnectionPool("127.0.0.1", smtp_server.port, max_connections=1)
+        pool.send_message(message)
+
+        # Connections closed in the meantime are replaced
+        idle_connection, _ = pool._idle[0]
+        idle_connection.sock.shutdown(socket.SHUT_RDWR)
+        assert pool.send_message(message) == {}
+        assert smtp_server.connections == 2
+
+        # Connections left idle for too long are not reused
+        pool.max_idle_seconds = -1
+        assert pool.send_message(message) == {}
+        assert smtp_server.connections == 3
+        pool.close()
+
+    assert len(smtp_server.messages) == 3
+
+
+@patch("src.pipeline.helpers.emails.sleep")
+def test_smtp_connection_pool_retries_with_backoff(mock_sleep, message):
+    with LocalSmtpServer() as smtp_server:
+        pool = SmtpConnectionPool(
+            "127.0.0.1",
+            smtp_server.port,
+            max_attempts=4,
+            retry_backoff_seconds=0.5,
+        )
+        connect = pool._connect
+
+        with patch.object(
+            pool,
+            "_connect",
+            side_effect=[ConnectionRefusedError, ConnectionRefusedError, connect()],
+        ):
+            assert pool.send_message(message) == {}
+        pool.close()
+
+    assert mock_sleep.call_args_list == [call(0.5), call(1.0)]
+    assert len(smtp_server.messages) == 1
+
+
+@patch("src.pipeline.helpers.emails.sleep")
+def test_smtp_connection_pool_gives_up_after_max_attempts(mock_sleep, message):
+    pool = SmtpConnectionPool("127.0.0.1", 0, max_attempts=3, retry_backoff_seconds=0.5)
+
+    with patch.object(
+        pool, "_connect", side_effect=ConnectionRefusedError
+    ) as mock_connect:
+        with raises(ConnectionRefusedError):
+            pool.send_message(message)
+
+    assert mock_connect.call_count == 3
+    assert mock_sleep.call_args_list == [call(0.5), call(1.0)]
@@ -0,0 +1,62 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pypdf
+import pytest
+
+from src.pipeline.helpers.pdf_rendering import (
+    get_rendering_workers,
+    render_pdf,
+    render_pdf_in_pool,
+    shutdown_rendering_pool,
+)
+
+HTML = """
+<html>
+  <head><style>@page {{ size: 15.75cm 22.275cm; }}</style></head>
+  <body><p>Document {i}</p></body>
+</html>
+"""
+
+
+@pytest.fixture
+def rendering_pool():
+    yield
+    shutdown_rendering_pool()
+
+
+def test_render_pdf_with_zoom_renders_to_A4():
+    pdf = pypdf.PdfReader(io.BytesIO(render_pdf(HTML.format(i=1), zoom=21 / 15.75)))
+    assert len(pdf.pages) == 1
+    assert float(pdf.pages[0].mediabox.width) == pytest.approx(595.276, abs=0.01)
+    assert float(pdf.pages[0].mediabox.height) == pytest.approx(841.890, abs=0.01)
+
+
+def test_render_pdf_in_pool(rendering_pool):
+    htmls = [HTML.format(i=i) for i in range(6)]
+
+    with ThreadPoolExecutor(3) as executor:
+        pdfs = list(
+            executor.map(lambda html: render_pdf_in_pool(html, n_workers=2), htmls)
+        )
+
+    texts = [
+        pypdf.PdfReader(io.BytesIO(pdf)).pages[0].extract_text().strip() for pdf in pdfs
+    ]
+    assert texts == [f"Document {i}" for i in range(6)]
+
+    serial_pdf = render_pdf_in_pool(htmls[0], n_workers=1)
+    assert (
+        pypdf.PdfReader(io.BytesIO(serial_pdf)).pages[0].extract_text().strip()
+        == texts[0]
+    )
+
+
+@patch("src.pipeline.helpers.pdf_rendering.PDF_RENDERING_WORKERS", 4)
+def test_get_rendering_workers():
+    # Few documents are rendered in the current process
+    assert get_rendering_workers(0) == 1
+    assert get_rendering_workers(3) == 1
+    assert get_rendering_workers(4) == 4
+    assert get_rendering_workers(50) == 4
@@ -1,18 +1,29 @@
 from datetime import datetime, timedelta
 
+import h3
 import numpy as np
 import pandas as pd
 import pytest
+from shapely.geometry import box
 
 from src.pipeline.helpers.spatial import (
     Position,
     PositionRepresentation,
+    ZonesIndex,
+    compute_estimated_current_positions,
     compute_movement_metrics,
+    compute_step_distances,
     coordinate_to_dms,
     detect_fishing_activity,
     enrich_positions,
+    enrich_positions_by_group,
+    estimate_current_position,
+    get_group_starts,
+    get_h3_cells,
     get_h3_indices,
     get_step_distances,
+    h3_cells_to_strings,
+    haversine_distances,
     position_to_position_representation,
 )
 
@@ -44,6 +55,46 @@ def test_get_h3_indices():
     pd.testing.assert_series_equal(h3_cells, expected_h3_cells)
 
 
+def test_get_h3_indices_as_int():
+    df = pd.DataFrame(
+        {"lat": [45.0256, -45.6987], "lon": [1.2369, -1.2365]},
+        index=[1, 129],
+    )
+
+    h3_cells = get_h3_indices(df, lat="lat", lon="lon", resolution=9, as_int=True)
+
+    expected_h3_cells = pd.Series(
+        data=np.array([617422587756281855, 620680172713803775], dtype=np.uint64),
+        index=[1, 129],
+    )
+
+    pd.testing.assert_series_equal(h3_cells, expected_h3_cells)
+
+
+def test_get_h3_cells():
+    latitudes = np.array([45.0256, -45.6987, np.nan])
+    longitudes = np.array([1.2369, -1.2365, 1.2])
+
+    h3_cells = get_h3_cells(latitudes, longitudes, resolution=9)
+    expected_h3_cells = np.array(
+        [617422587756281855, 620680172713803775, 0], dtype=np.uint64
+    )
+    np.testing.assert_array_equal(h3_cells, expected_h3_cells)
+
+    h3_strings = h3_cells_to_strings(h3_cells)
+    expected_h3_strings = np.array(
+        ["89186928383ffff", "89d19541dbbffff", "0"], dtype=object
+    )
+    np.testing.assert_array_equal(h3_strings, expected_h3_strings)
+
+    # Test with empty arrays
+    h3_cells = get_h3_cells(np.array([]), np.array([]), resolution=9)
+    np.testing.assert_array_equal(h3_cells, np.array([], dtype=np.uint64))
+    np.testing.assert_array_equal(
+        h3_cells_to_strings(h3_cells), np.array([], dtype=object)
+    )
+
+
 def test_get_step_distances():
 
     positions = pd.DataFrame(
@@ -66,6 +117,124 @@ def test_get_step_distances():
     np.testing.assert_almost_equal(distances_4, expected_distances_4)
 
 
+def test_get_step_distances_by_group():
+    positions = pd.DataFrame(
+        {
+            "latitude": [45, 45.1, 45.2, 45.2, 45.0, 45.1],
+            "longitude": [-4, -4.5, -4, -4, -4, -4.5],
+            "cfr": ["A", "A", "A", None, None, "C"],
+            "ircs": ["a", "a", "a", "b", "b", "c"],
+        }
+    )
+
+    distances_1 = get_step_distances(positions, by=["cfr", "ircs"])
+    distances_2 = get_step_distances(positions, how="forward", unit="km", by="ircs")
+
+    expected_distances_1 = np.array(
+        [np.nan, 40822.56593944, 40756.43460827, np.nan, 22239.01039505, np.nan]
+    )
+    expected_distances_2 = np.array(
+        [40.82256593944, 40.75643460827, np.nan, 22.23901039505, np.nan, np.nan]
+    )
+
+    np.testing.assert_almost_equal(distances_1, expected_distances_1)
+    np.testing.assert_almost_equal(distances_2, expected_distances_2)
+
+
+def test_haversine_distances_match_h3_point_dist():
+    rng = np.random.default_rng(seed=42)
+    n = 1000
+    latitudes_1 = rng.uniform(-90, 90, n)
+    longitudes_1 = rng.uniform(-180, 180, n)
+    latitudes_2 = rng.uniform(-90, 90, n)
+    longitudes_2 = rng.uniform(-180, 180, n)
+
+    for unit in ("m", "km", "rads"):
+        distances = haversine_distances(
+            latitudes_1, longitudes_1, latitudes_2, longitudes_2, unit=unit
+        )
+        expected_distances = np.array(
+            [
+                h3.point_dist((lat1, lon1), (lat2, lon2), unit=unit)
+                for lat1, lon1, lat2, lon2 in zip(
+                    latitudes_1, longitudes_1, latitudes_2, longitudes_2
+                )
+            ]
+        )
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-9)
+
+    with pytest.raises(ValueError):
+        haversine_distances(latitudes_1, longitudes_1, latitudes_2, longitudes_2, "ft")
+
+
+def test_compute_estimated_current_positions_matches_estimate_current_position():
+    rng = np.random.default_rng(seed=0)
+    n = 200
+    latitudes = rng.uniform(-90, 90, n)
+    longitudes = rng.uniform(-180, 180, n)
+    courses = rng.uniform(0, 360, n)
+    speeds = rng.uniform(0, 15, n)
+    hours_since_last_position = rng.uniform(-1, 3, n)
+    courses[:10] = np.nan
+    speeds[10:20] = np.nan
+    latitudes[20:30] = np.nan
+
+    latitudes_res, longitudes_res = compute_estimated_current_positions(
+        latitudes,
+        longitudes,
+        courses,
+        speeds,
+        hours_since_last_position,
+        max_hours_since_last_position=2.0,
+    )
+
+    expected_res = np.array(
+        [
+            estimate_current_position(*args, max_hours_since_last_position=2.0)
+            for args in zip(
+                latitudes, longitudes, courses, speeds, hours_since_last_position
+            )
+        ],
+        dtype=float,
+    )
+
+    np.testing.assert_allclose(latitudes_res, expected_res[:, 0])
+    np.testing.assert_allclose(longitudes_res, expected_res[:, 1])
+    assert np.isnan(latitudes_res[:30]).all()
+    assert np.isnan(latitudes_res[hours_since_last_position > 2]).all()
+    assert np.isnan(latitudes_res[hours_since_last_position < 0]).all()
+
+    latitudes_res, longitudes_res = compute_estimated_current_positions(
+        [], [], [], [], []
+    )
+    assert len(latitudes_res) == len(longitudes_res) == 0
+
+
+def test_compute_step_distances():
+    latitudes = np.array([45, 45.1, 45.2, 45.2, 45.0])
+    longitudes = np.array([-4, -4.5, -4, -4, -4])
+    group_starts = get_group_starts(np.array([0, 0, 0, 1, 1]))
+
+    np.testing.assert_array_equal(
+        group_starts, np.array([True, False, False, True, False])
+    )
+
+    np.testing.assert_almost_equal(
+        compute_step_distances(latitudes, longitudes),
+        np.array([np.nan, 40822.56593944, 40756.43460827, 0.0, 22239.01039505]),
+    )
+
+    np.testing.assert_almost_equal(
+        compute_step_distances(
+            latitudes, longitudes, group_starts=group_starts, how="forward"
+        ),
+        np.array([40822.56593944, 40756.43460827, np.nan, 22239.01039505, np.nan]),
+    )
+
+    with pytest.raises(ValueError):
+        compute_step_distances(latitudes, longitudes, how="sideways")
+
+
 def test_compute_movement_metrics_on_port_exits_with_no_time_emitting_at_sea_data():
     positions = pd.DataFrame(
         data=[
@@ -803,6 +972,77 @@ def test_enrich_positions_empty_input():
     pd.testing.assert_frame_equal(res, expected_res, check_dtype=False)
 
 
+@pytest.mark.parametrize("minimum_consecutive_positions", [2, 3, 5])
+def test_enrich_positions_by_group_matches_enrich_positions_by_vessel(
+    minimum_consecutive_positions,
+):
+    rng = np.random.default_rng(seed=123)
+    n = 2000
+
+    positions = pd.DataFrame(
+        {
+            "cfr": rng.choice(["A", "B", "C", None], n),
+            "ircs": rng.choice(["a", "b", None], n),
+            "external_immatriculation": rng.choice(["aa", None], n),
+            "latitude": 45 + rng.normal(scale=0.05, size=n).cumsum(),
+            "longitude": -4 + rng.normal(scale=0.05, size=n).cumsum(),
+            "datetime_utc": (
+                datetime(2021, 10, 2)
+                + pd.to_timedelta(np.sort(rng.integers(0, 7 * 3600, n)), unit="s")
+            ),
+            "is_at_port": rng.random(n) < 0.2,
+            "time_emitting_at_sea": pd.to_timedelta(
+                np.where(rng.random(n) < 0.5, rng.integers(0, 600, n), np.nan),
+                unit="m",
+            ),
+        },
+        index=rng.permutation(n),
+    )
+
+    kwargs = dict(
+        minimum_time_of_emission_at_sea=np.timedelta64(60, "m"),
+        minimum_consecutive_positions=minimum_consecutive_positions,
+        min_fishing_speed_threshold=0.5,
+        max_fishing_speed_threshold=4.5,
+        return_floats=True,
+    )
+
+    res = enrich_positions_by_group(positions, **kwargs)
+
+    expected_res = positions.groupby(
+        ["cfr", "ircs", "external_immatriculation"], dropna=False, group_keys=False
+    ).apply(enrich_positions, **kwargs)
+
+    pd.testing.assert_frame_equal(res, expected_res.loc[positions.index])
+
+
+def test_enrich_positions_by_group_empty_input():
+    positions = pd.DataFrame(
+        columns=[
+            "cfr",
+            "ircs",
+            "external_immatriculation",
+            "latitude",
+            "longitude",
+            "datetime_utc",
+            "is_at_port",
+            "time_emitting_at_sea",
+        ]
+    )
+
+    res = enrich_positions_by_group(
+        positions, minimum_time_of_emission_at_sea=np.timedelta64(60, "m")
+    )
+
+    assert len(res) == 0
+    assert list(res) == list(positions) + [
+        "meters_from_previous_position",
+        "time_since_previous_position",
+        "average_speed",
+        "is_fishing",
+    ]
+
+
 def test_coordinate_to_dms():
     assert coordinate_to_dms(45.123) == (45, 7.379999999999853, 7, 23)
     assert coordinate_to_dms(-45.123) == (45, 7.379999999999853, 7, 23)
@@ -841,3 +1081,29 @@ def test_position_to_position_representation():
     with pytest.raises(ValueError):
         p = Position(latitude=2.123, longitude=-186.589)
         position_to_position_representation(p, representation_type="DMD")
+
+
+def test_zones_index():
+    zones_index = ZonesIndex(
+        [box(0, 0, 2, 2), None, box(1, 1, 3, 3)], ["zone_1", "zone_2", "zone_3"]
+    )
+    assert len(zones_index) == 3
+
+    points_idx, zones_idx = zones_index.intersects(
+        [1.5, 2.0, 5.0, np.nan, 0.0, 2.5], [1.5, 2.0, 5.0, 1.0, 1.0, 2.5]
+    )
+
+    # Points on the boundary of zones are in the zones, points with missing
+    # coordinates are not in any zone
+    np.testing.assert_array_equal(points_idx, [0, 0, 1, 1, 4, 5])
+    np.testing.assert_array_equal(zones_idx, [0, 2, 0, 2, 0, 2])
+    np.testing.assert_array_equal(
+        zones_index.values[zones_idx],
+        ["zone_1", "zone_3", "zone_1", "zone_3", "zone_1", "zone_3"],
+    )
+
+    points_idx, zones_idx = zones_index.intersects([], [])
+    assert len(points_idx) == len(zones_idx) == 0
+
+    with pytest.raises(ValueError):
+        ZonesIndex([box(0, 0, 1, 1)], [])
@@ -1,10 +1,13 @@
 import datetime
 import os
+from unittest.mock import patch
 
+import pandas as pd
 import pytest
 
 from config import TEST_DATA_LOCATION
-from src.pipeline.parsers.ers.ers import ERSParsingError, parse_xml_string
+from src.pipeline.parsers import parallel as parsers_parallel
+from src.pipeline.parsers.ers.ers import ERSParsingError, batch_parse, parse_xml_string
 
 XML_TEST_DATA_LOCATION = TEST_DATA_LOCATION / "logbook/xml_files/ers"
 
@@ -525,3 +528,45 @@ def test_multi_line_message():
 
     assert metadata == expected_metadata
     assert data_list == expected_data_list
+
+
+def test_batch_parse_in_parallel_gives_same_results_as_serial():
+    xml_messages = []
+    for filename in sorted(os.listdir(XML_TEST_DATA_LOCATION)):
+        with open(XML_TEST_DATA_LOCATION / filename, "r") as f:
+            xml_messages.append(f.read())
+
+    serial = batch_parse(xml_messages, n_workers=1)
+    with patch("src.pipeline.parsers.parallel.LOGBOOK_PARSING_CHUNK_SIZE", 4):
+        parallel = batch_parse(xml_messages, n_workers=2)
+
+    # The pool is shut down once messages are parsed
+    assert parsers_parallel._pool is None
+
+    # empty_message.xml cannot be parsed
+    assert serial["batch_generated_errors"]
+    assert parallel["batch_generated_errors"]
+    assert len(serial["logbook_raw_messages"]) == len(xml_messages) - 1
+
+    pd.testing.assert_frame_equal(
+        serial["logbook_raw_messages"], parallel["logbook_raw_messages"]
+    )
+    pd.testing.assert_frame_equal(
+        serial["logbook_reports"].drop(columns="integration_datetime_utc"),
+        parallel["logbook_reports"].drop(columns="integration_datetime_utc"),
+    )
+
+
+@patch("src.pipeline.parsers.parallel.get_parsing_pool")
+def test_batch_parse_parses_few_chunks_in_current_process(mock_get_parsing_pool):
+    xml_messages = []
+    for filename in sorted(os.listdir(XML_TEST_DATA_LOCATION)):
+        with open(XML_TEST_DATA_LOCATION / filename, "r") as f:
+            xml_messages.append(f.read())
+
+    n_chunks = -(-len(xml_messages) // 4)
+    with patch("src.pipeline.parsers.parallel.LOGBOOK_PARSING_CHUNK_SIZE", 4):
+        res = batch_parse(xml_messages, n_workers=n_chunks + 1)
+
+    mock_get_parsing_pool.assert_not_called()
+    assert len(res["logbook_raw_messages"]) == len(xml_messages) - 1
@@ -1,5 +1,6 @@
 import datetime
 import os
+from unittest.mock import patch
 
 import pandas as pd
 import pytest
@@ -11,6 +12,8 @@ from src.pipeline.parsers.flux.flux import (
     batch_parse,
     parse_fa_report_message_string,
 )
+from src.pipeline.parsers.flux.utils import get_xml_backend
+from src.pipeline.processing import to_json
 
 XML_TEST_DATA_LOCATION = TEST_DATA_LOCATION / "logbook/xml_files/flux"
 
@@ -44,7 +47,17 @@ def test_decode_flux_raises_flux_parsing_error():
         base64_decode(s)
 
 
-def test_batch_parse():
+@pytest.mark.parametrize("backend", ["lxml", "stdlib"])
+@pytest.mark.parametrize("streaming_threshold_bytes", [10000000, 0])
+def test_batch_parse(backend, streaming_threshold_bytes):
+    with patch("src.pipeline.parsers.flux.utils.XML_BACKEND", backend), patch(
+        "src.pipeline.parsers.flux.flux.FLUX_STREAMING_THRESHOLD_BYTES",
+        streaming_threshold_bytes,
+    ):
+        check_batch_parse()
+
+
+def check_batch_parse():
     base64_encoded_xml_files_location = XML_TEST_DATA_LOCATION / "business_BASE64"
     flux_file_list = []
     for filename in sorted(os.listdir(base64_encoded_xml_files_location)):
@@ -731,8 +744,49 @@ def test_batch_parse():
         ],
     )
 
+    # `value` is serialized to json text
+    expected_logbook_reports["value"] = expected_logbook_reports["value"].map(to_json)
+
     pd.testing.assert_frame_equal(
         logbook_reports.reset_index(drop=True),
         expected_logbook_reports.reset_index(drop=True),
         check_dtype=False,
     )
+
+
+@pytest.mark.parametrize("backend", ["lxml", "stdlib"])
+def test_parse_fa_report_message_string_streams_large_messages(backend):
+    with open(
+        XML_TEST_DATA_LOCATION
+        / "business/FLUX-FA-EU-710511 - Haul by haul recording reported daily.xml"
+    ) as f:
+        xml_string = f.read()
+
+    # Repeat the FAReportDocument element to make a message with several reports
+    start = xml_string.index("<rsm:FAReportDocument>")
+    end = xml_string.index("</rsm:FAReportDocument>") + len("</rsm:FAReportDocument>")
+    xml_string = xml_string[:end] + 3 * xml_string[start:end] + xml_string[end:]
+
+    with patch("src.pipeline.parsers.flux.utils.XML_BACKEND", backend):
+        operation_number, data = parse_fa_report_message_string(xml_string)
+        with patch("src.pipeline.parsers.flux.flux.FLUX_STREAMING_THRESHOLD_BYTES", 0):
+            streamed_operation_number, streamed_data = parse_fa_report_message_string(
+                xml_string
+            )
+
+    assert len(data) == 4
+    assert streamed_operation_number == operation_number
+    assert streamed_data == data
+
+
+def test_get_xml_backend():
+    with patch("src.pipeline.parsers.flux.utils.FLUX_XML_BACKEND", "lxml"):
+        assert get_xml_backend() == "lxml"
+        with patch("src.pipeline.parsers.flux.utils.lxml_etree", None):
+            assert get_xml_backend() == "stdlib"
+
+    with patch("src.pipeline.parsers.flux.utils.FLUX_XML_BACKEND", "stdlib"):
+        assert get_xml_backend() == "stdlib"
+
+    with patch("src.pipeline.parsers.flux.utils.FLUX_XML_BACKEND", "unknown"):
+        assert get_xml_backend() == "stdlib"
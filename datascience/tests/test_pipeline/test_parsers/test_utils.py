@@ -1,6 +1,12 @@
 from datetime import datetime
 
-from src.pipeline.parsers.utils import make_datetime, make_datetime_json_serializable
+import pandas as pd
+
+from src.pipeline.parsers.utils import (
+    ColumnAccumulator,
+    make_datetime,
+    make_datetime_json_serializable,
+)
 
 
 def test_make_datetime():
@@ -15,3 +21,51 @@ def test_make_datetime_json_serializable():
     assert (
         make_datetime_json_serializable("2020-01-05", "12:59") == "2020-01-05T12:59:00Z"
     )
+
+
+def test_column_accumulator():
+    acc = ColumnAccumulator(["a", "b"])
+    acc.append({"a": 1, "b": "x"})
+    acc.append({"a": 2, "c": {"k": "v"}})
+
+    other = ColumnAccumulator(["a"])
+    other.append({"a": 3, "d": None})
+    acc.extend(other)
+
+    assert len(acc) == 3
+    pd.testing.assert_frame_equal(
+        acc.to_dataframe(),
+        pd.DataFrame(
+            {
+                "a": [1, 2, 3],
+                "b": ["x", None, None],
+                "c": [None, {"k": "v"}, None],
+                "d": [None, None, None],
+            },
+        ),
+    )
+
+
+def test_column_accumulator_to_dataframe_with_no_rows():
+    df = ColumnAccumulator(["a", "b"]).to_dataframe()
+    assert list(df.columns) == ["a", "b"]
+    assert len(df) == 0
+
+
+def test_column_accumulator_with_datetime_and_json_columns():
+    acc = ColumnAccumulator(["d", "v"], datetime_columns=["d"], json_columns=["v"])
+    acc.append({"d": datetime(2020, 1, 5, 12, 59), "v": {"k": [1, None]}})
+    acc.append({"d": None})
+
+    pd.testing.assert_frame_equal(
+        acc.to_dataframe(),
+        pd.DataFrame(
+            {
+                "d": pd.to_datetime(["2020-01-05 12:59", None]),
+                "v": ['{"k": [1, null]}', "null"],
+            }
+        ),
+    )
+
+    df = ColumnAccumulator(["d"], datetime_columns=["d"]).to_dataframe()
+    assert df.dtypes["d"] == "datetime64[ns]"
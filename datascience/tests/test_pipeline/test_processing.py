@@ -31,8 +31,14 @@ from src.pipeline.processing import (
     rows_belong_to_sequence,
     to_json,
     to_pgarr,
+    values_belong_to_sequence,
     zeros_ones_to_bools,
 )
+from src.utils.benchmarks import (
+    join_on_multiple_keys_reference,
+    left_isin_right_by_decreasing_priority_reference,
+    rows_belong_to_sequence_reference,
+)
 
 
 def test_get_unused_col_name():
@@ -739,6 +745,52 @@ def test_left_isin_right_by_decreasing_priority():
     pd.testing.assert_series_equal(res, expected)
 
 
+def test_join_on_multiple_keys_matches_reference_implementation():
+    rng = np.random.default_rng(seed=0)
+    keys = ["vessel_id", "cfr", "ircs"]
+
+    def random_identifiers(n_rows):
+        df = pd.DataFrame(
+            {
+                "vessel_id": rng.integers(0, 4, n_rows).astype(float),
+                "cfr": [f"CFR{i}" for i in rng.integers(0, 4, n_rows)],
+                "ircs": [f"IRCS{i}" for i in rng.integers(0, 4, n_rows)],
+            }
+        )
+        return df.mask(rng.random(df.shape) < 0.3).astype(
+            {"cfr": object, "ircs": object}
+        )
+
+    for _ in range(10):
+        left = random_identifiers(rng.integers(0, 8)).assign(
+            left_row=lambda df: np.arange(len(df))
+        )
+        right = random_identifiers(rng.integers(0, 8)).assign(
+            right_row=lambda df: np.arange(len(df)) / 2
+        )
+
+        for how in ("inner", "left", "right", "outer"):
+            res = join_on_multiple_keys(left, right, or_join_keys=keys, how=how)
+            expected_res = join_on_multiple_keys_reference(
+                left, right, or_join_keys=keys, how=how
+            )
+            # Rows matched on one key with duplicates in both DataFrames may come in
+            # any order from `pd.merge`
+            pd.testing.assert_frame_equal(
+                res.sort_values(["left_row", "right_row"]).reset_index(drop=True),
+                expected_res.sort_values(["left_row", "right_row"]).reset_index(
+                    drop=True
+                ),
+            )
+
+        pd.testing.assert_series_equal(
+            left_isin_right_by_decreasing_priority(left[keys], right[keys]),
+            left_isin_right_by_decreasing_priority_reference(
+                left[keys], right[keys]
+            ).astype(bool),
+        )
+
+
 def test_drop_duplicates_by_decreasing_priority():
     df = pd.DataFrame(
         {
@@ -869,6 +921,49 @@ def test_rows_belong_to_sequence():
     np.testing.assert_array_equal(res, expected_res)
 
 
+def test_rows_belong_to_sequence_matches_reference_implementation():
+    rng = np.random.default_rng(seed=0)
+    row = np.array([False, True])
+
+    for _ in range(500):
+        n_rows = rng.integers(1, 30)
+        window_length = int(rng.integers(2, 8))
+        arr = rng.random((n_rows, 2)) < rng.random()
+
+        np.testing.assert_array_equal(
+            rows_belong_to_sequence(arr, row, window_length),
+            rows_belong_to_sequence_reference(arr, row, window_length),
+        )
+
+
+def test_values_belong_to_sequence():
+    nan = np.nan
+    values = np.array(
+        [True, True, False, True, True, True, False, True, False, False, True]
+    )
+
+    res = values_belong_to_sequence(values, 3)
+    expected_res = np.array([nan, nan, 0, 1, 1, 1, 0, 0, 0, 0, nan])
+    np.testing.assert_array_equal(res, expected_res)
+
+    res = values_belong_to_sequence(values, 1)
+    np.testing.assert_array_equal(res, values.astype(float))
+
+    # With groups, sequences are cut at the start of each group, and values at the
+    # start and end of each group are unknown
+    group_starts = np.array(
+        [True, False, False, False, True, False, False, False, True, False, False]
+    )
+    res = values_belong_to_sequence(values, 2, group_starts=group_starts)
+    expected_res = np.array([1, 1, 0, nan, 1, 1, 0, nan, 0, 0, nan])
+    np.testing.assert_array_equal(res, expected_res)
+
+    # Empty input
+    np.testing.assert_array_equal(
+        values_belong_to_sequence(np.array([], dtype=bool), 2), np.array([])
+    )
+
+
 def test_get_matched_groups():
     regex = re.compile(
         (
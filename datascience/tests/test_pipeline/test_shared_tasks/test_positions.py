@@ -1,24 +1,29 @@
 from unittest.mock import patch
 
 import pandas as pd
+import pytest
 
+from src.pipeline.helpers.anchorages import AnchoragesIndex
+from src.pipeline.helpers.spatial import h3_strings_to_cells
 from src.pipeline.shared_tasks.positions import (
     add_vessel_identifier,
     tag_positions_at_port,
 )
 
 
-@patch("src.pipeline.shared_tasks.positions.extract")
-def test_tag_positions_at_port(mock_extract):
-    mock_extract.return_value = pd.DataFrame(
-        {
-            "h3": [
-                "8900510a463ffff",
-                "892b2c359d3ffff",
-                "some_other_h3_cell",
-            ],
-        }
+@pytest.fixture
+def anchorages_index() -> AnchoragesIndex:
+    index = AnchoragesIndex()
+    index.h3_cells = h3_strings_to_cells(
+        ["8900510a463ffff", "892b2c359d3ffff", "89186928383ffff"]
     )
+    index.h3_cells.sort()
+    return index
+
+
+@patch("src.pipeline.shared_tasks.positions.anchorages_index")
+def test_tag_positions_at_port(mock_anchorages_index, anchorages_index):
+    mock_anchorages_index.is_anchorage.side_effect = anchorages_index.contains
 
     positions = pd.DataFrame(
         {
@@ -38,8 +43,8 @@ def test_tag_positions_at_port(mock_extract):
     )
 
 
-@patch("src.pipeline.shared_tasks.positions.extract")
-def test_tag_positions_at_port_empty_dataframe(mock_extract):
+@patch("src.pipeline.shared_tasks.positions.anchorages_index")
+def test_tag_positions_at_port_empty_dataframe(mock_anchorages_index):
     positions = pd.DataFrame(
         {
             "latitude": [],
@@ -49,8 +54,8 @@ def test_tag_positions_at_port_empty_dataframe(mock_extract):
 
     positions_with_is_at_port = tag_positions_at_port.run(positions)
 
-    # Query should not be run with empty list in WHERE condition
-    mock_extract.assert_not_called()
+    # Anchorages should not be queried when there are no positions
+    mock_anchorages_index.is_anchorage.assert_not_called()
 
     expected_positions_with_is_at_port = pd.DataFrame(
         columns=pd.Index(["latitude", "longitude", "is_at_port"])
@@ -63,17 +68,9 @@ def test_tag_positions_at_port_empty_dataframe(mock_extract):
     )
 
 
-@patch("src.pipeline.shared_tasks.positions.extract")
-def test_tag_positions_at_port_with_in_on_land(mock_extract):
-    mock_extract.return_value = pd.DataFrame(
-        {
-            "h3": [
-                "8900510a463ffff",
-                "892b2c359d3ffff",
-                "some_other_h3_cell",
-            ],
-        }
-    )
+@patch("src.pipeline.shared_tasks.positions.anchorages_index")
+def test_tag_positions_at_port_with_in_on_land(mock_anchorages_index, anchorages_index):
+    mock_anchorages_index.is_anchorage.side_effect = anchorages_index.contains
 
     positions = pd.DataFrame(
         {
@@ -1,10 +1,16 @@
+import logging
 import os
 import shutil
 import tempfile
 import unittest
 from pathlib import Path
+from unittest.mock import patch
 
-from src.pipeline.utils import move
+import sqlalchemy
+from sqlalchemy import text
+from sqlalchemy.exc import InvalidRequestError
+
+from src.pipeline.utils import TableReflectionCache, get_table, move
 
 
 class TestProcessingMethods(unittest.TestCase):
@@ -77,3 +83,61 @@ class TestProcessingMethods(unittest.TestCase):
             # Test if_exists argument
             with self.assertRaises(ValueError):
                 move(tmp_file_path, dest_dirpath, if_exists="unexpected")
+
+
+class TestGetTable(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = sqlalchemy.create_engine(
+            f"sqlite:///{Path(self.tmpdir.name) / 'test.db'}"
+        )
+        with self.engine.begin() as con:
+            con.execute(text("CREATE TABLE vessels (id INTEGER, cfr VARCHAR)"))
+
+        self.cache = TableReflectionCache(ttl_seconds=3600)
+        self.patcher = patch("src.pipeline.utils.table_reflection_cache", self.cache)
+        self.patcher.start()
+        self.logger = logging.getLogger()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def drop_vessels_table(self):
+        with self.engine.begin() as con:
+            con.execute(text("DROP TABLE vessels"))
+
+    def test_get_table_uses_cache(self):
+        table = get_table("vessels", None, self.engine, self.logger)
+        self.assertEqual(list(table.c.keys()), ["id", "cfr"])
+
+        self.drop_vessels_table()
+
+        # Cached table is returned, with an engine or a connection
+        self.assertIs(get_table("vessels", None, self.engine, self.logger), table)
+        with self.engine.connect() as con:
+            self.assertIs(get_table("vessels", None, con, self.logger), table)
+
+        # Unless reflection is forced
+        with self.assertRaises(InvalidRequestError):
+            get_table("vessels", None, self.engine, self.logger, use_cache=False)
+
+    def test_get_table_cache_invalidation(self):
+        get_table("vessels", None, self.engine, self.logger)
+        self.drop_vessels_table()
+
+        self.cache.invalidate(table_name="positions")
+        get_table("vessels", None, self.engine, self.logger)
+
+        self.cache.invalidate(table_name="vessels")
+        with self.assertRaises(InvalidRequestError):
+            get_table("vessels", None, self.engine, self.logger)
+
+    def test_get_table_cache_expiration(self):
+        self.cache.ttl_seconds = -1
+        get_table("vessels", None, self.engine, self.logger)
+        self.drop_vessels_table()
+
+        with self.assertRaises(InvalidRequestError):
+            get_table("vessels", None, self.engine, self.logger)